@@ -0,0 +1,193 @@
+"""
+Offline end-to-end benchmark for every agent in AGENT_TOOLS and plain chat.
+
+All chat models are replaced with `fake_llm.FakeChatModel`, which returns schema-valid canned output after a simulated
+delay, so the numbers measure our orchestration (prompt building, parsing, validation, Markdown rendering) on top of a
+known LLM latency, with no network access and no Azure quota.
+
+Reported per target:
+- end-to-end wall time (p50/p95) and CPU time of `invoke_agent_tool` / `chatbot_invoke`
+- per-stage LLM wall time from the instrumentation records, and the remaining orchestration overhead
+- peak traced memory and allocated blocks for one extra run under tracemalloc
+
+With --cassette the recorded responses of a tools.cassette file are replayed instead (optionally with their recorded
+timing), so output sizes match real GPT-4o responses; --cassette-mode auto records any missing prompt live.
+
+Usage:
+    python benchmarks/agents.py [--repeat 5] [--ttft-ms 400] [--per-token-ms 8] [--jitter 0.25]
+                                [--distribution lognormal] [--agents create_activity_list ...] [--json out.json]
+    python benchmarks/agents.py --cassette .cache/cassettes/agents.jsonl.gz [--cassette-mode replay] [--replay-timing]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+from typing import Any, Callable, Dict, List
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CHATBOT_DIR = os.path.join(REPO_ROOT, "chatbot")
+
+# Never touch the on-disk caches or metrics file from a benchmark run
+os.environ["RESPONSE_CACHE_ENABLED"] = "0"
+os.environ["SEMANTIC_CACHE_ENABLED"] = "0"
+os.environ["PIPELINE_CHECKPOINTS_ENABLED"] = "0"
+os.environ["LLM_METRICS_PATH"] = ""
+
+# Measure orchestration without client-side throttling or coalescing
+os.environ["LLM_RATE_LIMIT_ENABLED"] = "0"
+os.environ["LLM_COALESCING_ENABLED"] = "0"
+
+sys.path.insert(0, CHATBOT_DIR)
+
+from fake_llm import LatencyModel, fake_model_factory  # noqa: E402
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, round(pct / 100 * (len(ordered) - 1)))]
+
+
+def _measure(run: Callable[[], Any], records: Callable[[], List[Dict[str, Any]]]) -> Dict[str, Any]:
+    seen = len(records())
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    result = run()
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+
+    stages: Dict[str, float] = defaultdict(float)
+    for entry in records()[seen:]:
+        if entry.get("event") == "llm_call" and entry.get("wall_ms") is not None:
+            stages[f"{entry['tool']}.{entry['stage']}"] += entry["wall_ms"]
+
+    return {"wall_ms": wall * 1000, "cpu_ms": cpu * 1000, "stages": dict(stages), "result": result}
+
+
+def _allocations(run: Callable[[], Any]) -> Dict[str, float]:
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        run()
+        after = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    blocks = sum(stat.count_diff for stat in after.compare_to(before, "filename") if stat.count_diff > 0)
+
+    return {"peak_kb": peak / 1024, "blocks": blocks}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per agent")
+    parser.add_argument("--ttft-ms", type=float, default=400.0, help="Simulated time to first token")
+    parser.add_argument("--per-token-ms", type=float, default=8.0, help="Simulated delay per output token")
+    parser.add_argument("--jitter", type=float, default=0.25, help="Latency jitter (see fake_llm.LatencyModel)")
+    parser.add_argument("--distribution", choices=["fixed", "normal", "lognormal"], default="lognormal")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--agents", nargs="*", default=None, help="Subset of agents; 'chat' is plain chat")
+    parser.add_argument("--no-markdown", action="store_true", help="Skip Markdown conversion of agent output")
+    parser.add_argument("--json", dest="json_path", default=None, help="Also write raw results to this file")
+    parser.add_argument("--cassette", default=None, help="Replay LLM responses from this cassette instead of faking")
+    parser.add_argument("--cassette-mode", choices=["replay", "auto", "record"], default="replay")
+    parser.add_argument("--replay-timing", action="store_true", help="Replay the recorded LLM latency")
+    args = parser.parse_args()
+
+    from tools.instrumentation import recent_records
+    from tools.llm import set_model_factory
+
+    latency = LatencyModel(args.ttft_ms, args.per_token_ms, args.jitter, args.distribution)
+
+    if args.cassette:
+        from tools.cassette import use_cassette
+
+        use_cassette(args.cassette, mode=args.cassette_mode, replay_timing=args.replay_timing)
+    else:
+        set_model_factory(fake_model_factory(latency, seed=args.seed))
+
+    import backend
+    from langchain_core.messages import HumanMessage
+
+    messages = [HumanMessage(content="Help me build a stronger activity list for my applications.")]
+    targets = args.agents or list(backend.AGENT_TOOLS) + ["chat"]
+
+    def runner(target: str) -> Callable[[], Any]:
+        if target == "chat":
+            state = {"messages": messages, "selected_agent": None, "fetch_user_data": True}
+            return lambda: backend.chatbot_invoke(state)["messages"][-1].content
+
+        return lambda: backend.invoke_agent_tool(
+            target, messages, backend.DUMMY_USER_DATA, convert_to_markdown=not args.no_markdown, use_cache=False
+        )
+
+    def succeeded(target: str) -> bool:
+        # Rendered Markdown no longer looks like an error, so judge one run's raw tool output
+        if target == "chat":
+            return not str(runner(target)()).startswith("Error")
+
+        raw = backend.invoke_agent_tool(
+            target, messages, backend.DUMMY_USER_DATA, convert_to_markdown=False, use_cache=False
+        )
+
+        return not backend._is_error_result(str(raw))
+
+    print(
+        f"{'target':<30}{'p50 ms':>9}{'p95 ms':>9}{'cpu ms':>9}{'llm ms':>9}{'ovh ms':>9}"
+        f"{'peak KB':>10}{'blocks':>9}{'ok':>4}"
+    )
+
+    report: Dict[str, Any] = {
+        "latency": args.cassette or vars(latency),
+        "repeat": args.repeat,
+        "targets": {},
+    }
+
+    for target in targets:
+        run = runner(target)
+        run()  # warm-up: lazy imports and model construction are covered by benchmarks/import_time.py
+
+        samples = [_measure(run, recent_records) for _ in range(args.repeat)]
+        allocations = _allocations(run)
+
+        walls = [s["wall_ms"] for s in samples]
+        llm = [sum(s["stages"].values()) for s in samples]
+        ok = succeeded(target)
+
+        stage_names = sorted({name for s in samples for name in s["stages"]})
+        stages = {name: statistics.median(s["stages"].get(name, 0.0) for s in samples) for name in stage_names}
+
+        row = {
+            "wall_p50_ms": _percentile(walls, 50),
+            "wall_p95_ms": _percentile(walls, 95),
+            "cpu_p50_ms": statistics.median(s["cpu_ms"] for s in samples),
+            "llm_p50_ms": statistics.median(llm),
+            "overhead_p50_ms": statistics.median(wall - llm_ms for wall, llm_ms in zip(walls, llm)),
+            "stages_p50_ms": stages,
+            "ok": ok,
+            **allocations,
+        }
+        report["targets"][target] = row
+
+        print(
+            f"{target:<30}{row['wall_p50_ms']:>9.1f}{row['wall_p95_ms']:>9.1f}{row['cpu_p50_ms']:>9.1f}"
+            f"{row['llm_p50_ms']:>9.1f}{row['overhead_p50_ms']:>9.1f}{row['peak_kb']:>10.1f}{row['blocks']:>9}"
+            f"{'yes' if ok else 'NO':>4}"
+        )
+        for name, ms in stages.items():
+            print(f"{'  ' + name:<30}{ms:>9.1f}")
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    return 0 if all(row["ok"] for row in report["targets"].values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,338 @@
+"""
+Deterministic fake chat model for offline benchmarks.
+
+`FakeChatModel` returns schema-valid canned output for each tool (selected from the `tool`/`stage` metadata that
+`tools.instrumentation.metrics_config` attaches to every chain) and sleeps according to a configurable latency model,
+so orchestration overhead can be measured without network access or Azure quota.
+"""
+
+import asyncio
+import json
+import random
+import re
+import time
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+# Imported with chatbot/ on sys.path, as benchmarks/agents.py sets up
+from tools.blueprint_engine import ACTIVITY_CATEGORIES
+
+_WORDS = (
+    "student research community impact leadership initiative data model school program mentor outreach design "
+    "analysis workshop project results peers local science engineering writing growth team launch"
+).split()
+
+# Per-category fan-out prompts of create_activity_ideas state the category and the counts they expect back
+_PROMPT_CATEGORY = re.compile(r"Set 'category' to exactly: (.+)")
+_PROMPT_EXISTING = re.compile(r"Create exactly (\d+) 'Existing' ideas")
+_PROMPT_MISSING = re.compile(r"Create exactly (\d+) 'Generated' ideas")
+
+
+@dataclass
+class LatencyModel:
+    """Time to first token plus a per-output-token delay, each with multiplicative jitter.
+
+    distribution: "fixed", "normal" (jitter is the standard deviation as a fraction of the mean) or "lognormal"
+    (jitter is sigma of the underlying normal, which gives the long right tail seen in hosted LLM latencies).
+    """
+
+    ttft_ms: float = 400.0
+    per_token_ms: float = 8.0
+    jitter: float = 0.25
+    distribution: str = "lognormal"
+
+    def _factor(self, rng: random.Random) -> float:
+        if self.distribution == "fixed" or self.jitter <= 0:
+            return 1.0
+        if self.distribution == "normal":
+            return max(0.0, rng.gauss(1.0, self.jitter))
+        if self.distribution == "lognormal":
+            return rng.lognormvariate(-(self.jitter**2) / 2, self.jitter)
+        raise ValueError(f"Unknown latency distribution: {self.distribution}")
+
+    def sample(self, rng: random.Random) -> tuple:
+        """Return (seconds before the first token, seconds between subsequent tokens)."""
+        factor = self._factor(rng)
+        return self.ttft_ms * factor / 1000, self.per_token_ms * factor / 1000
+
+
+def _sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(_WORDS) for _ in range(words)).capitalize() + "."
+
+
+def _blueprint_output(total: int = 10) -> Dict[str, Any]:
+    categories = []
+    remaining = total
+
+    for index, category in enumerate(ACTIVITY_CATEGORIES[:5]):
+        count = remaining if index == 4 else 2
+        categories.append({"category": category, "existing": count // 2, "missing": count - count // 2})
+        remaining -= count
+
+    return {"categories": categories, "total": total}
+
+
+def _requested_counts(prompt: str) -> List[Dict[str, Any]]:
+    """The category and counts a per-category prompt asks for, or the canned blueprint's counts."""
+    category = _PROMPT_CATEGORY.search(prompt)
+    existing = _PROMPT_EXISTING.search(prompt)
+    missing = _PROMPT_MISSING.search(prompt)
+
+    if not (category and existing and missing):
+        return _blueprint_output()["categories"]
+
+    return [
+        {"category": category.group(1).strip(), "existing": int(existing.group(1)), "missing": int(missing.group(1))}
+    ]
+
+
+def _ideas_output(rng: random.Random, counts: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+    categories = []
+
+    for category in counts or _blueprint_output()["categories"]:
+        categories.append(
+            {
+                "category": category["category"],
+                "existing_enhancements": [
+                    {
+                        "elevated_title": _sentence(rng, 4)[:-1],
+                        "elevated_organization": _sentence(rng, 3)[:-1],
+                        "elevated_description": _sentence(rng, 20),
+                        "hours_per_week": 5,
+                        "weeks_per_year": 30,
+                        "participation_grades": ["10", "11"],
+                        "improvement_suggestions": [_sentence(rng, 10) for _ in range(2)],
+                        "alternative_suggestions": [_sentence(rng, 10)],
+                        "validation_or_evidence": [_sentence(rng, 8)],
+                        "leverage_points": [_sentence(rng, 8)],
+                    }
+                    for _ in range(category["existing"])
+                ],
+                "developed_missing_ideas": [
+                    {
+                        "idea_name": _sentence(rng, 4)[:-1],
+                        "impact_focus": _sentence(rng, 15),
+                        "unique_method": _sentence(rng, 15),
+                        "hours_per_week": 4,
+                        "weeks_per_year": 25,
+                        "participation_grades": ["11", "12"],
+                        "resources_needed": [_sentence(rng, 5) for _ in range(2)],
+                        "first_90_days": [_sentence(rng, 8) for _ in range(3)],
+                        "milestones": [_sentence(rng, 8) for _ in range(2)],
+                        "success_metrics": [_sentence(rng, 8) for _ in range(2)],
+                        "risks_and_mitigations": [_sentence(rng, 10)],
+                    }
+                    for _ in range(category["missing"])
+                ],
+            }
+        )
+
+    return {
+        "student_theme": _sentence(rng, 12),
+        "future_goals_summary": _sentence(rng, 15),
+        "categories": categories,
+        "top_priorities": [_sentence(rng, 8) for _ in range(3)],
+    }
+
+
+def _formatted_output(rng: random.Random) -> Dict[str, Any]:
+    return {
+        "activities": [
+            {
+                "position": _sentence(rng, 4)[:50].rstrip(". "),
+                "organization": _sentence(rng, 5)[:100],
+                "description": _sentence(rng, 18)[:150],
+                "commitment": {"hours_per_week": 5, "weeks_per_year": 30, "participation_grades": ["10", "11", "12"]},
+            }
+            for _ in range(10)
+        ]
+    }
+
+
+def _narrative_angles_output(rng: random.Random, angles: int = 4) -> Dict[str, Any]:
+    return {
+        "narrative_angles": [
+            {
+                "title": _sentence(rng, 5)[:-1],
+                "positioning": _sentence(rng, 16),
+                "essay_concept": _sentence(rng, 40),
+                "anchor_scene": " ".join(_sentence(rng, 14) for _ in range(4)),
+                "unexpected_twist": _sentence(rng, 16),
+                "signature_initiative": {"name": _sentence(rng, 3)[:-1], "description": _sentence(rng, 18)},
+                "natural_major_fit": [_sentence(rng, 2)[:-1] for _ in range(3)],
+            }
+            for _ in range(angles)
+        ]
+    }
+
+
+def _main_essay_ideas_output(rng: random.Random, ideas: int = 4) -> Dict[str, Any]:
+    return {
+        "main_essay_ideas": [
+            {
+                "title": _sentence(rng, 5)[:-1],
+                "theme": _sentence(rng, 4)[:-1],
+                **{
+                    field: _sentence(rng, 22)
+                    for field in ("hook", "challenge", "journey", "growth", "impact", "future_connection")
+                },
+                "key_activities": [_sentence(rng, 4)[:-1] for _ in range(2)],
+                "unique_angle": _sentence(rng, 18),
+                "authenticity_factors": [_sentence(rng, 8) for _ in range(2)],
+            }
+            for _ in range(ideas)
+        ]
+    }
+
+
+def _markdown_output(rng: random.Random, sections: int) -> str:
+    blocks = []
+
+    for index in range(sections):
+        bullets = "\n".join(f"- {_sentence(rng, 14)}" for _ in range(3))
+        blocks.append(f"## {_sentence(rng, 4)[:-1]}\n\n{_sentence(rng, 40)}\n\n{bullets}")
+
+    return "\n\n".join(blocks)
+
+
+def canned_output(tool: Optional[str], seed: int = 0, stage: Optional[str] = None, prompt: str = "") -> str:
+    """Return the canned response for a tool stage; unknown tools and plain chat get Markdown text.
+
+    `prompt` is the text of the request, read where the expected output depends on it.
+    """
+    rng = random.Random(f"{tool}:{stage}:{seed}")
+
+    if tool == "create_activities_blueprint":
+        return json.dumps(_blueprint_output())
+    if tool == "create_activity_ideas" and stage == "category":
+        # Fan-out call for one category, answered with exactly the counts its prompt asks for
+        return json.dumps(_ideas_output(rng, _requested_counts(prompt))["categories"][0])
+    if tool == "create_activity_ideas" and stage == "overview":
+        ideas = _ideas_output(rng)
+        return json.dumps({k: ideas[k] for k in ("student_theme", "future_goals_summary", "top_priorities")})
+    if tool == "create_activity_ideas":
+        return json.dumps(_ideas_output(rng))
+    if tool == "format_activity_list" and stage == "repair":
+        # Canned activities already fit their limits, so the field repair call has nothing to rewrite
+        return json.dumps({"fixes": []})
+    if tool == "format_activity_list":
+        return json.dumps(_formatted_output(rng))
+    if tool == "create_future_plan":
+        return _sentence(rng, 45)
+    if tool == "suggest_narrative_angles":
+        return json.dumps(_narrative_angles_output(rng))
+    if tool == "generate_main_essay_ideas":
+        return json.dumps(_main_essay_ideas_output(rng))
+
+    return _markdown_output(rng, 3)
+
+
+def _count_tokens(text: str) -> int:
+    return (len(text) + 3) // 4
+
+
+def _chunks(text: str) -> List[str]:
+    # Roughly one token per chunk, like the OpenAI streaming API
+    return [text[i : i + 4] for i in range(0, len(text), 4)]
+
+
+class FakeChatModel(BaseChatModel):
+    """Chat model that answers every tool with canned, schema-valid output after a simulated delay."""
+
+    latency: LatencyModel = LatencyModel()
+    seed: int = 0
+    deployment_name: str = "fake"
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def _labels(self, run_manager: Any) -> tuple:
+        metadata = getattr(run_manager, "metadata", None) or {}
+        return metadata.get("tool"), metadata.get("stage")
+
+    def _prepare(self, messages: List[BaseMessage], run_manager: Any) -> tuple:
+        rng = random.Random(self.seed * 1_000_003 + self.calls)
+        self.calls += 1
+        tool, stage = self._labels(run_manager)
+        prompt = "\n".join(str(m.content) for m in messages)
+        text = canned_output(tool, self.seed, stage, prompt)
+        first, per_token = self.latency.sample(rng)
+        prompt_tokens = sum(_count_tokens(str(m.content)) for m in messages)
+        return text, first, per_token, prompt_tokens
+
+    def _result(self, text: str, prompt_tokens: int) -> ChatResult:
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": _count_tokens(text)}
+        return ChatResult(
+            generations=[ChatGeneration(message=AIMessage(content=text))],
+            llm_output={"token_usage": usage, "model_name": self.deployment_name},
+        )
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        text, first, per_token, prompt_tokens = self._prepare(messages, run_manager)
+        time.sleep(first + per_token * max(0, _count_tokens(text) - 1))
+        return self._result(text, prompt_tokens)
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        text, first, per_token, prompt_tokens = self._prepare(messages, run_manager)
+        await asyncio.sleep(first + per_token * max(0, _count_tokens(text) - 1))
+        return self._result(text, prompt_tokens)
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        text, first, per_token, _ = self._prepare(messages, run_manager)
+
+        for index, piece in enumerate(_chunks(text)):
+            time.sleep(first if index == 0 else per_token)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=piece))
+            if run_manager:
+                run_manager.on_llm_new_token(piece, chunk=chunk)
+            yield chunk
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        text, first, per_token, _ = self._prepare(messages, run_manager)
+
+        for index, piece in enumerate(_chunks(text)):
+            await asyncio.sleep(first if index == 0 else per_token)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=piece))
+            if run_manager:
+                await run_manager.on_llm_new_token(piece, chunk=chunk)
+            yield chunk
+
+
+def fake_model_factory(latency: Optional[LatencyModel] = None, seed: int = 0):
+    """Factory for `tools.llm.set_model_factory` that builds one FakeChatModel per model key."""
+
+    def factory(deployment_name: str, temperature: Optional[float], max_tokens: Optional[int]) -> FakeChatModel:
+        return FakeChatModel(latency=latency or LatencyModel(), seed=seed, deployment_name=f"fake-{deployment_name}")
+
+    return factory
@@ -0,0 +1,79 @@
+"""
+Import-time benchmark for the chatbot backend and its lazily loaded tools.
+
+Each measurement runs in a fresh interpreter so module caches do not hide cold-start cost:
+- `backend`: importing chatbot/backend.py (what every Streamlit rerun and worker start pays)
+- one row per agent: importing the backend and then resolving that agent from AGENT_TOOLS
+
+Usage:
+    python benchmarks/import_time.py [--repeat 5] [--max-backend-ms 500]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import List, Optional
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CHATBOT_DIR = os.path.join(REPO_ROOT, "chatbot")
+
+_PROBE = """
+import json, sys, time
+sys.path.insert(0, {chatbot_dir!r})
+start = time.perf_counter()
+import backend
+backend_s = time.perf_counter() - start
+agent = {agent!r}
+agent_s = None
+if agent:
+    start = time.perf_counter()
+    backend.AGENT_TOOLS[agent]
+    agent_s = time.perf_counter() - start
+print(json.dumps({{"backend_s": backend_s, "agent_s": agent_s, "modules": len(sys.modules)}}))
+"""
+
+
+def _probe(agent: Optional[str]) -> dict:
+    code = _PROBE.format(chatbot_dir=CHATBOT_DIR, agent=agent)
+    completed = subprocess.run(
+        [sys.executable, "-c", code], cwd=CHATBOT_DIR, capture_output=True, text=True, check=True
+    )
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def _median_ms(values: List[float]) -> float:
+    return statistics.median(values) * 1000
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="Fresh-interpreter runs per measurement")
+    parser.add_argument("--max-backend-ms", type=float, default=None, help="Fail if backend import exceeds this")
+    args = parser.parse_args()
+
+    sys.path.insert(0, CHATBOT_DIR)
+    from tools import __all__ as agent_names
+
+    runs = [_probe(None) for _ in range(args.repeat)]
+    backend_ms = _median_ms([r["backend_s"] for r in runs])
+
+    print(f"{'target':<32}{'median ms':>12}{'modules':>10}")
+    print(f"{'backend':<32}{backend_ms:>12.1f}{runs[-1]['modules']:>10}")
+
+    for agent in agent_names:
+        agent_runs = [_probe(agent) for _ in range(args.repeat)]
+        agent_ms = _median_ms([r["agent_s"] for r in agent_runs])
+        print(f"{'+ ' + agent:<32}{agent_ms:>12.1f}{agent_runs[-1]['modules']:>10}")
+
+    if args.max_backend_ms is not None and backend_ms > args.max_backend_ms:
+        print(f"backend import {backend_ms:.1f} ms exceeds budget {args.max_backend_ms:.1f} ms", file=sys.stderr)
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
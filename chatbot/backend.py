@@ -1,10 +1,9 @@
 import os
 import sys
 import json
-from typing import TypedDict, List, Dict, Any
+from typing import TypedDict, List, Dict, Any, Iterator, Tuple
 
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage, BaseMessage
-from langchain_openai import AzureChatOpenAI
 from dotenv import load_dotenv
 
 from user_data import DUMMY_USER_DATA
@@ -12,38 +11,70 @@ from user_data import DUMMY_USER_DATA
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 load_dotenv()
 
-from tools import (
-    suggest_narrative_angles,
-    create_future_plan,
-    format_activity_list,
-    generate_main_essay_ideas,
-    create_activities_blueprint,
-    create_activity_ideas,
-    create_activity_list,
-)
+from tools.render_markdown import json_text_to_markdown, parse_json_output, render_generic_markdown, render_markdown
+from tools.registry import LazyRegistry
+from tools.response_cache import get_response_cache, history_hash, make_cache_key, profile_hash
+from tools.semantic_cache import BucketKey, get_semantic_cache
+from tools.single_flight import get_single_flight
+from tools.instrumentation import agent_scope, metrics_config, record_event
+from tools.llm import get_llm
+from tools.utils import compact_json, run_sync, strip_empty
+
+# Replayed responses take no rate-limit budget: in record/auto mode the cassette wraps the limiter and answers
+# recorded prompts before reaching it, and replay-only cassette models are left unwrapped by the limiter
+if os.getenv("LLM_RATE_LIMIT_ENABLED", "1") == "1":
+    from tools.rate_limit import install_rate_limiter_from_env
+
+    install_rate_limiter_from_env()
+
+if os.getenv("LLM_CASSETTE"):
+    from tools.cassette import use_cassette_from_env
 
-from tools.convert_to_markdown import json_to_markdown_llm
+    use_cassette_from_env()
+
+# Outermost wrapper, so a coalesced call is neither rate limited nor recorded twice
+if os.getenv("LLM_COALESCING_ENABLED", "1") == "1":
+    from tools.single_flight import install_llm_coalescing
+
+    install_llm_coalescing()
 
 config = {"recursion_limit": 4}
 
-llm = AzureChatOpenAI(deployment_name="gpt-4o")
+LLM_SETTINGS = {"deployment_name": "gpt-4o"}
 
 class ChatState(TypedDict):
     messages: List
     selected_agent: str | None
     fetch_user_data: bool
     convert_to_markdown: bool
+    llm_markdown_fallback: bool
+    bypass_cache: bool
     use_web_search: bool
+    regenerate_stage: str | None
+
+# Tool modules are imported on first use, so a request only pays for the agent it calls
+AGENT_TOOLS = LazyRegistry(
+    {
+        "suggest_narrative_angles": "tools.suggest_narrative_angles:suggest_narrative_angles",
+        "create_future_plan": "tools.create_future_plan:create_future_plan",
+        "format_activity_list": "tools.format_activity_list:format_activity_list",
+        "generate_main_essay_ideas": "tools.generate_main_essay_ideas:generate_main_essay_ideas",
+        "create_activities_blueprint": "tools.create_activities_blueprint:create_activities_blueprint",
+        "create_activity_ideas": "tools.create_activity_ideas:create_activity_ideas",
+        "create_activity_list": "tools.create_activity_list:create_activity_list",
+    }
+)
 
-AGENT_TOOLS = {
-    "suggest_narrative_angles": suggest_narrative_angles,
-    "create_future_plan": create_future_plan,
-    "format_activity_list": format_activity_list,
-    "generate_main_essay_ideas": generate_main_essay_ideas,
-    "create_activities_blueprint": create_activities_blueprint,
-    "create_activity_ideas": create_activity_ideas,
-    "create_activity_list": create_activity_list,
-}
+# Agents whose output is streamed as it is generated: plain LLM text token by token, or JSON one validated object at
+# a time (format_activity_list)
+STREAMING_TOOLS = LazyRegistry(
+    {
+        "suggest_narrative_angles": "tools.suggest_narrative_angles:stream_suggest_narrative_angles",
+        "create_future_plan": "tools.create_future_plan:stream_create_future_plan",
+        "format_activity_list": "tools.format_activity_list:stream_format_activity_list",
+        "generate_main_essay_ideas": "tools.generate_main_essay_ideas:stream_generate_main_essay_ideas",
+    }
+)
 
 SYSTEM_INSTRUCTIONS = (
     "You are an elite admissions strategist. "
@@ -56,45 +87,208 @@ SYSTEM_INSTRUCTIONS = (
 def _build_context_system_message(user_profile: Dict[str, Any] | None) -> SystemMessage:
     if user_profile:
         return SystemMessage(
-            content=f"{SYSTEM_INSTRUCTIONS}\n\nSTUDENT PROFILE & CONTEXT: {json.dumps(user_profile, ensure_ascii=False)}"
+            content=f"{SYSTEM_INSTRUCTIONS}\n\nSTUDENT PROFILE & CONTEXT: {compact_json(strip_empty(user_profile))}"
         )
     else:
         return SystemMessage(content=SYSTEM_INSTRUCTIONS)
 
-def invoke_agent_tool(
+
+async def _aconvert_to_markdown(result_str: str, llm_fallback: bool) -> str:
+    data = parse_json_output(result_str)
+
+    if data is None:
+        return result_str
+
+    rendered = render_markdown(data)
+
+    if rendered is not None:
+        return rendered
+
+    # Unknown shape: only pay for an LLM round-trip when explicitly requested
+    if llm_fallback:
+        from tools.convert_to_markdown import json_to_markdown_llm
+
+        return await json_to_markdown_llm.ainvoke({"data": result_str})
+
+    return render_generic_markdown(data)
+
+
+def _tool_fingerprint(agent_name: str) -> Tuple[str, Dict[str, Any]]:
+    module = sys.modules[AGENT_TOOLS[agent_name].func.__module__]
+
+    return getattr(module, "PROMPT_VERSION", ""), getattr(module, "LLM_SETTINGS", {})
+
+
+def _agent_cache_key(
+    agent_name: str,
+    recent_messages: List[BaseMessage],
+    user_profile: Dict[str, Any] | None,
+) -> str:
+    prompt_version, model_settings = _tool_fingerprint(agent_name)
+
+    return make_cache_key(agent_name, user_profile, recent_messages, prompt_version, model_settings)
+
+
+def _semantic_bucket(
+    agent_name: str, user_profile: Dict[str, Any] | None, recent_messages: List[BaseMessage]
+) -> BucketKey:
+    prompt_version, _ = _tool_fingerprint(agent_name)
+    earlier = recent_messages[:-1]
+
+    # The frontend's history already ends with the query it appends again; that copy is the query, not context
+    if earlier and isinstance(earlier[-1], HumanMessage) and earlier[-1].content == recent_messages[-1].content:
+        earlier = earlier[:-1]
+
+    # Only the latest message is compared; everything before it must match exactly, so a follow-up such as
+    # "make it shorter" never reuses the answer given in another conversation
+    return agent_name, profile_hash(user_profile), prompt_version, history_hash(earlier)
+
+
+class AgentToolError(Exception):
+    """Raised by `ainvoke_agent_tool(..., raise_errors=True)` when the agent fails or returns an error result."""
+
+    def __init__(self, agent_name: str, message: str):
+        super().__init__(message)
+        self.agent_name = agent_name
+
+
+def _is_error_result(result_str: str) -> bool:
+    if result_str.startswith("Error"):
+        return True
+
+    data = parse_json_output(result_str)
+
+    return isinstance(data, dict) and "error" in data
+
+
+async def ainvoke_agent_tool(
     agent_name: str,
     recent_messages: List[BaseMessage],
     user_profile: Dict[str, Any] | None,
     convert_to_markdown: bool = False,
+    llm_markdown_fallback: bool = False,
+    use_cache: bool = True,
+    tool_args: Dict[str, Any] | None = None,
+    raise_errors: bool = False,
 ) -> str:
+    """Run an agent and return its response, or an error message in its place.
+
+    With raise_errors, failures raise AgentToolError instead, so callers such as the batch runner need not tell an
+    error message from a response by its text. Only the agent's own output is classified; cached responses never are.
+    """
     if agent_name not in AGENT_TOOLS:
-        return f"Error: Unknown agent '{agent_name}'. Available agents: {list(AGENT_TOOLS.keys())}"
+        message = f"Error: Unknown agent '{agent_name}'. Available agents: {list(AGENT_TOOLS.keys())}"
+        if raise_errors:
+            raise AgentToolError(agent_name, message)
+        return message
 
     try:
         tool_function = AGENT_TOOLS[agent_name]
 
-        result = tool_function.invoke({"user_profile": user_profile, "recent_messages": recent_messages})
+        # Extra arguments only reach tools that declare them, and always produce a fresh (uncached) response
+        extra_args = {k: v for k, v in (tool_args or {}).items() if v is not None and k in tool_function.args}
+
+        # Tools with caches of their own (create_activity_list's stage checkpoints) bypass them along with ours
+        if not use_cache and "use_cache" in tool_function.args:
+            extra_args["use_cache"] = False
+
+        use_cache = use_cache and not extra_args
+
+        cache = get_response_cache() if use_cache else None
+        cache_key = _agent_cache_key(agent_name, recent_messages, user_profile) if cache else ""
+        result_str = cache.get(cache_key) if cache else None
+
+        semantic = get_semantic_cache() if use_cache and recent_messages else None
+        semantic_bucket = _semantic_bucket(agent_name, user_profile, recent_messages) if semantic else None
+        query_vector = None
+
+        if result_str is None and semantic:
+            try:
+                query_vector = await semantic.aembed(str(recent_messages[-1].content))
+                result_str = semantic.lookup(semantic_bucket, query_vector)
+            except Exception:
+                # The semantic cache is best effort; an embedding failure must not fail the request
+                query_vector = None
+
+            if result_str is not None and cache:
+                cache.set(cache_key, result_str)
+
+        if result_str is None:
+            # Identical concurrent requests (e.g. a double submit) share one run of the agent
+            flight_key = compact_json(
+                [_agent_cache_key(agent_name, recent_messages, user_profile), use_cache, extra_args]
+            )
+
+            async def run_agent() -> Any:
+                with agent_scope(agent_name):
+                    return await tool_function.ainvoke(
+                        {"user_profile": user_profile, "recent_messages": recent_messages, **extra_args}
+                    )
+
+            result, shared = await get_single_flight("agent").do(flight_key, run_agent)
+
+            if shared:
+                record_event(agent_name, "invoke", "coalesced")
+
+            if isinstance(result, dict):
+                result_str = json.dumps(result, indent=2, ensure_ascii=False)
+            else:
+                result_str = str(result)
 
-        if isinstance(result, dict):
-            result_str = json.dumps(result, indent=2, ensure_ascii=False)
-        else:
-            result_str = str(result)
+            if _is_error_result(result_str):
+                if raise_errors:
+                    raise AgentToolError(agent_name, result_str)
+            else:
+                if cache:
+                    cache.set(cache_key, result_str)
+                if query_vector is not None:
+                    semantic.store(semantic_bucket, query_vector, result_str)
 
         if convert_to_markdown:
             try:
-                result_str = json_to_markdown_llm.invoke({"data": result})
+                with agent_scope(agent_name):
+                    result_str = await _aconvert_to_markdown(result_str, llm_markdown_fallback)
             except Exception as e:
                 result_str = f"{result_str}\n\n*Note: Markdown conversion failed: {str(e)}*"
 
         return result_str
 
+    except AgentToolError:
+        raise
     except Exception as e:
+        if raise_errors:
+            raise AgentToolError(agent_name, f"Error calling {agent_name}: {str(e)}") from e
         return f"Error calling {agent_name}: {str(e)}"
 
 
-def chatbot_invoke(state: ChatState) -> ChatState:
+def invoke_agent_tool(
+    agent_name: str,
+    recent_messages: List[BaseMessage],
+    user_profile: Dict[str, Any] | None,
+    convert_to_markdown: bool = False,
+    llm_markdown_fallback: bool = False,
+    use_cache: bool = True,
+    tool_args: Dict[str, Any] | None = None,
+    raise_errors: bool = False,
+) -> str:
+    return run_sync(
+        ainvoke_agent_tool(
+            agent_name,
+            recent_messages,
+            user_profile,
+            convert_to_markdown,
+            llm_markdown_fallback,
+            use_cache=use_cache,
+            tool_args=tool_args,
+            raise_errors=raise_errors,
+        )
+    )
+
+
+async def achatbot_invoke(state: ChatState) -> ChatState:
     fetch_user_data = state.get("fetch_user_data", False)
     convert_to_markdown = state.get("convert_to_markdown", True)
+    llm_markdown_fallback = state.get("llm_markdown_fallback", False)
     use_web_search = state.get("use_web_search", False)
 
     user_profile = DUMMY_USER_DATA if fetch_user_data else None
@@ -104,7 +298,15 @@ def chatbot_invoke(state: ChatState) -> ChatState:
     selected_agent = state.get("selected_agent")
 
     if selected_agent and selected_agent in AGENT_TOOLS:
-        response_content = invoke_agent_tool(selected_agent, recent_messages, user_profile, convert_to_markdown)
+        response_content = await ainvoke_agent_tool(
+            selected_agent,
+            recent_messages,
+            user_profile,
+            convert_to_markdown,
+            llm_markdown_fallback,
+            use_cache=not state.get("bypass_cache", False),
+            tool_args={"regenerate": state.get("regenerate_stage")},
+        )
 
         ai_message = AIMessage(content=response_content)
     else:
@@ -112,12 +314,112 @@ def chatbot_invoke(state: ChatState) -> ChatState:
 
         messages = [system_msg] + recent_messages
 
-        ai_message = llm.invoke(messages)
+        ai_message = await get_llm(**LLM_SETTINGS).ainvoke(messages, config=metrics_config("chat", "respond"))
 
     return {
         "messages": state["messages"] + [ai_message],
         "selected_agent": selected_agent,
         "fetch_user_data": fetch_user_data,
         "convert_to_markdown": convert_to_markdown,
+        "llm_markdown_fallback": llm_markdown_fallback,
     }
 
+
+def chatbot_invoke(state: ChatState) -> ChatState:
+    return run_sync(achatbot_invoke(state))
+
+
+def supports_streaming(state: ChatState) -> bool:
+    selected_agent = state.get("selected_agent")
+
+    if not selected_agent or selected_agent not in AGENT_TOOLS:
+        return True
+
+    return selected_agent in STREAMING_TOOLS
+
+
+def stream_agent_tool(
+    agent_name: str,
+    recent_messages: List[BaseMessage],
+    user_profile: Dict[str, Any] | None,
+    use_cache: bool = True,
+) -> Iterator[str]:
+    if agent_name not in STREAMING_TOOLS:
+        yield invoke_agent_tool(agent_name, recent_messages, user_profile, use_cache=use_cache)
+        return
+
+    try:
+        cache = get_response_cache() if use_cache else None
+        cache_key = _agent_cache_key(agent_name, recent_messages, user_profile) if cache else ""
+        cached = cache.get(cache_key) if cache else None
+
+        semantic = get_semantic_cache() if use_cache and recent_messages else None
+        semantic_bucket = _semantic_bucket(agent_name, user_profile, recent_messages) if semantic else None
+        query_vector = None
+
+        if cached is None and semantic:
+            try:
+                query_vector = semantic.embed(str(recent_messages[-1].content))
+                cached = semantic.lookup(semantic_bucket, query_vector)
+            except Exception:
+                query_vector = None
+
+            if cached is not None and cache:
+                cache.set(cache_key, cached)
+
+        if cached is not None:
+            yield cached
+            return
+
+        chunks = []
+
+        with agent_scope(agent_name):
+            for chunk in STREAMING_TOOLS[agent_name](user_profile, recent_messages):
+                chunks.append(chunk)
+                yield chunk
+
+        result_str = "".join(chunks)
+
+        if not _is_error_result(result_str):
+            if cache:
+                cache.set(cache_key, result_str)
+            if query_vector is not None:
+                semantic.store(semantic_bucket, query_vector, result_str)
+    except Exception as e:
+        yield f"Error calling {agent_name}: {str(e)}"
+
+
+def chatbot_stream(state: ChatState) -> Iterator[str]:
+    """Yield the response as text chunks, suitable for `st.write_stream`.
+
+    Plain chat and the string-output agents stream tokens as they arrive, format_activity_list streams one validated
+    activity at a time, and other agents yield their full response once it is ready. Markdown conversion is not
+    applied to streamed output; see `finalize_streamed_response`.
+    """
+    fetch_user_data = state.get("fetch_user_data", False)
+
+    user_profile = DUMMY_USER_DATA if fetch_user_data else None
+
+    recent_messages = state["messages"]
+
+    selected_agent = state.get("selected_agent")
+
+    if selected_agent and selected_agent in AGENT_TOOLS:
+        yield from stream_agent_tool(
+            selected_agent, recent_messages, user_profile, use_cache=not state.get("bypass_cache", False)
+        )
+    else:
+        system_msg = _build_context_system_message(user_profile)
+
+        messages = [system_msg] + recent_messages
+
+        for chunk in get_llm(**LLM_SETTINGS).stream(messages, config=metrics_config("chat", "respond")):
+            yield chunk.content
+
+
+def finalize_streamed_response(state: ChatState, text: str) -> str:
+    """Apply local Markdown rendering to a fully streamed agent response."""
+    if state.get("selected_agent") and state.get("convert_to_markdown", True):
+        return json_text_to_markdown(text)
+
+    return text
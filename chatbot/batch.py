@@ -0,0 +1,265 @@
+"""
+Batch runner: run agents over a cohort of profiles.
+
+Profiles come from a JSON object keyed by profile ID (e.g. clab_data/all_data.json), a JSON list, or a JSONL file with
+one profile per line ({"id": ..., "profile": {...}} or a bare profile). Every (profile, agent) pair is one item; items
+run concurrently up to --concurrency and each result is appended to the output JSONL as soon as it finishes, so an
+interrupted run resumes by skipping the items already recorded as ok. A failing item is recorded with its error and
+never stops the batch.
+
+Usage:
+    python chatbot/batch.py clab_data/all_data.json --output .cache/batch.jsonl
+        [--agents create_activity_list suggest_narrative_angles generate_main_essay_ideas]
+        [--concurrency 4] [--no-cache] [--no-resume]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from langchain_core.messages import HumanMessage
+
+from backend import AGENT_TOOLS, AgentToolError, ainvoke_agent_tool
+from tools.instrumentation import usage_scope
+from tools.render_markdown import parse_json_output
+from tools.utils import run_sync
+
+DEFAULT_AGENTS = ["create_activity_list", "suggest_narrative_angles", "generate_main_essay_ideas"]
+
+# The request sent to each agent on behalf of every profile
+DEFAULT_QUERIES: Dict[str, str] = {
+    "create_activity_list": "Create my complete activity list.",
+    "suggest_narrative_angles": "Suggest narrative angles for my application.",
+    "generate_main_essay_ideas": "Generate main essay ideas for my application.",
+    "create_future_plan": "Write my future plan statement.",
+}
+
+Profile = Tuple[str, Dict[str, Any]]
+
+
+def load_profiles(path: str) -> Iterator[Profile]:
+    """Yield (profile_id, profile) pairs from a JSON object, a JSON list or a JSONL file."""
+    with open(path, encoding="utf-8") as f:
+        if path.endswith(".jsonl"):
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+
+                record = json.loads(line)
+
+                if isinstance(record.get("profile"), dict):
+                    yield str(record.get("id", line_number)), record["profile"]
+                else:
+                    yield str(record.get("id", line_number)), record
+            return
+
+        data = json.load(f)
+
+    if isinstance(data, dict):
+        yield from ((str(key), profile) for key, profile in data.items())
+    else:
+        yield from ((str(profile.get("id", index)), profile) for index, profile in enumerate(data, 1))
+
+
+def item_id(profile_id: str, agent_name: str) -> str:
+    return f"{profile_id}:{agent_name}"
+
+
+def completed_ids(output_path: str) -> Set[str]:
+    """IDs of items already recorded as ok in an earlier run's output."""
+    done: Set[str] = set()
+
+    if not os.path.exists(output_path):
+        return done
+
+    with open(output_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A line cut short by an interrupted run
+                continue
+
+            if record.get("ok"):
+                done.add(record["id"])
+
+    return done
+
+
+async def _run_item(
+    profile_id: str, profile: Dict[str, Any], agent_name: str, use_cache: bool, semaphore: asyncio.Semaphore
+) -> Dict[str, Any]:
+    query = DEFAULT_QUERIES.get(agent_name, "Help me with my college application.")
+    start = time.perf_counter()
+
+    async with semaphore:
+        with usage_scope() as usage:
+            try:
+                result = await ainvoke_agent_tool(
+                    agent_name, [HumanMessage(content=query)], profile, use_cache=use_cache, raise_errors=True
+                )
+                error = None
+            except AgentToolError as e:
+                result, error = None, str(e)
+            except Exception as e:
+                result, error = None, f"{type(e).__name__}: {e}"
+
+    record: Dict[str, Any] = {
+        "id": item_id(profile_id, agent_name),
+        "profile_id": profile_id,
+        "agent": agent_name,
+        "ok": error is None,
+        "wall_ms": round((time.perf_counter() - start) * 1000, 1),
+        **usage,
+    }
+
+    if error is None:
+        parsed = parse_json_output(result)
+        record["result"] = parsed if parsed is not None else result
+    else:
+        record["error"] = error
+
+    return record
+
+
+def _throughput(stats: Dict[str, Any], elapsed: float) -> Dict[str, Any]:
+    minutes = max(elapsed, 1e-9) / 60
+    tokens = stats["prompt_tokens"] + stats["completion_tokens"]
+
+    return {
+        **stats,
+        "elapsed_s": round(elapsed, 1),
+        "profiles_per_min": round(len(stats["profiles"]) / minutes, 2),
+        "items_per_min": round(stats["ok"] / minutes, 2),
+        "tokens_per_min": round(tokens / minutes, 1),
+    }
+
+
+async def arun_batch(
+    profiles: Iterable[Profile],
+    agents: List[str],
+    output_path: str,
+    concurrency: int = 4,
+    use_cache: bool = True,
+    resume: bool = True,
+    progress: bool = True,
+) -> Dict[str, Any]:
+    """Run every agent over every profile and append one JSONL record per item to `output_path`.
+
+    Returns throughput statistics; "profiles" counts profiles whose items all succeeded in this run.
+    """
+    unknown = [name for name in agents if name not in AGENT_TOOLS]
+
+    if unknown:
+        raise ValueError(f"Unknown agents {unknown}. Available agents: {list(AGENT_TOOLS)}")
+
+    done = completed_ids(output_path) if resume else set()
+    pending: Dict[str, int] = {}
+    jobs = []
+    skipped = 0
+
+    for profile_id, profile in profiles:
+        todo = [name for name in agents if item_id(profile_id, name) not in done]
+        skipped += len(agents) - len(todo)
+        if todo:
+            pending[profile_id] = len(todo)
+            jobs.extend((profile_id, profile, name) for name in todo)
+
+    semaphore = asyncio.Semaphore(concurrency)
+    stats: Dict[str, Any] = {
+        "items": len(jobs),
+        "skipped": skipped,
+        "ok": 0,
+        "failed": 0,
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "profiles": set(),
+    }
+    failed_profiles: Set[str] = set()
+    start = time.perf_counter()
+
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+
+    with open(output_path, "a", encoding="utf-8") as out:
+        tasks = [
+            asyncio.ensure_future(_run_item(profile_id, profile, name, use_cache, semaphore))
+            for profile_id, profile, name in jobs
+        ]
+
+        try:
+            for completed in asyncio.as_completed(tasks):
+                record = await completed
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                out.flush()
+
+                stats["ok" if record["ok"] else "failed"] += 1
+                stats["prompt_tokens"] += record["prompt_tokens"]
+                stats["completion_tokens"] += record["completion_tokens"]
+
+                profile_id = record["profile_id"]
+                pending[profile_id] -= 1
+                if not record["ok"]:
+                    failed_profiles.add(profile_id)
+                if pending[profile_id] == 0 and profile_id not in failed_profiles:
+                    stats["profiles"].add(profile_id)
+
+                if progress:
+                    rates = _throughput(stats, time.perf_counter() - start)
+                    print(
+                        f"[{stats['ok'] + stats['failed']}/{stats['items']}] {record['id']} "
+                        f"{'ok' if record['ok'] else 'FAILED'} {record['wall_ms'] / 1000:.1f}s | "
+                        f"{rates['profiles_per_min']} profiles/min, {rates['tokens_per_min']:.0f} tokens/min",
+                        file=sys.stderr,
+                    )
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    summary = _throughput(stats, time.perf_counter() - start)
+    summary["profiles"] = len(stats["profiles"])
+
+    return summary
+
+
+def run_batch(
+    profiles: Iterable[Profile],
+    agents: List[str],
+    output_path: str,
+    concurrency: int = 4,
+    use_cache: bool = True,
+    resume: bool = True,
+    progress: bool = True,
+) -> Dict[str, Any]:
+    """Sync variant of `arun_batch`."""
+    return run_sync(arun_batch(profiles, agents, output_path, concurrency, use_cache, resume, progress))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="Profiles as a JSON object/list or JSONL")
+    parser.add_argument("--output", required=True, help="JSONL file results are appended to")
+    parser.add_argument("--agents", nargs="+", default=DEFAULT_AGENTS)
+    parser.add_argument("--concurrency", type=int, default=4, help="Items in flight at once")
+    parser.add_argument("--no-cache", action="store_true", help="Bypass the response caches")
+    parser.add_argument("--no-resume", action="store_true", help="Re-run items already recorded as ok")
+    args = parser.parse_args(argv)
+
+    summary = run_batch(
+        load_profiles(args.input),
+        args.agents,
+        args.output,
+        concurrency=args.concurrency,
+        use_cache=not args.no_cache,
+        resume=not args.no_resume,
+    )
+    print(json.dumps(summary, indent=2))
+
+    return 0 if summary["failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
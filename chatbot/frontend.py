@@ -4,7 +4,13 @@ import streamlit as st
 import re
 from dotenv import load_dotenv
 from langchain_core.messages import HumanMessage, AIMessage
-from chatbot.backend import chatbot_invoke
+from chatbot.backend import (
+    AGENT_TOOLS,
+    chatbot_invoke,
+    chatbot_stream,
+    finalize_streamed_response,
+    supports_streaming,
+)
 
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 load_dotenv()
@@ -28,6 +34,19 @@ with st.sidebar:
     use_web_search = st.toggle("Use web search", value=False)
     fetch_user_data = st.toggle("Fetch user data first", value=False)
     convert_to_markdown = st.toggle("Convert to Markdown", value=True)
+    llm_markdown_fallback = st.toggle("Use LLM for unknown Markdown shapes", value=False)
+    bypass_cache = st.toggle("Bypass response cache", value=False)
+
+    # A regeneration applies to one request; the choice goes back to resuming once a request has used it
+    if st.session_state.pop("regenerate_used", False):
+        st.session_state.regenerate_stage = None
+
+    regenerate_stage = st.selectbox(
+        "`@create_activity_list`: regenerate from",
+        [None, "format", "ideas", "blueprint"],
+        format_func=lambda stage: "resume last run" if stage is None else stage,
+        key="regenerate_stage",
+    )
 
 
 if "messages" not in st.session_state:
@@ -39,15 +58,7 @@ for msg in st.session_state.messages:
         st.markdown(msg["content"])
 
 
-AVAILABLE_AGENTS = [
-    "suggest_narrative_angles",
-    "create_future_plan",
-    "format_activity_list",
-    "create_activity_list",
-    "create_activity_ideas",
-    "create_activities_blueprint",
-    "generate_main_essay_ideas",
-]
+AVAILABLE_AGENTS = list(AGENT_TOOLS)
 
 user_input = st.chat_input("Type @ to select an agent, then describe what you need...")
 
@@ -76,33 +87,62 @@ if user_input:
 
     # Process with selected agent
     with st.chat_message("assistant"):
-        with st.spinner("Processing..."):
+        # Convert history to LangChain messages
+        lc_history = []
+
+        for m in st.session_state.messages[-6:]:
+            if m["role"] == "user":
+                lc_history.append(HumanMessage(content=m["content"]))
+            else:
+                lc_history.append(AIMessage(content=m["content"]))
+
+        state = {
+            "messages": lc_history + [HumanMessage(content=user_input)],
+            "selected_agent": selected_agent,
+            "convert_to_markdown": convert_to_markdown,
+            "llm_markdown_fallback": llm_markdown_fallback,
+            "bypass_cache": bypass_cache,
+            "regenerate_stage": regenerate_stage,
+            "fetch_user_data": fetch_user_data,
+            "use_web_search": use_web_search,
+        }
+
+        if selected_agent == "create_activity_list" and regenerate_stage:
+            st.session_state.regenerate_used = True
+
+        if supports_streaming(state):
+            placeholder = st.empty()
+
             try:
-                # Convert history to LangChain messages
-                lc_history = []
+                with placeholder.container():
+                    streamed = st.write_stream(chatbot_stream(state))
 
-                for m in st.session_state.messages[-6:]:
-                    if m["role"] == "user":
-                        lc_history.append(HumanMessage(content=m["content"]))
-                    else:
-                        lc_history.append(AIMessage(content=m["content"]))
+                # Swap the raw streamed JSON for its locally rendered Markdown
+                output = finalize_streamed_response(state, streamed)
 
-                state = {
-                    "messages": lc_history + [HumanMessage(content=user_input)],
-                    "selected_agent": selected_agent,
-                    "convert_to_markdown": convert_to_markdown,
-                    "fetch_user_data": fetch_user_data,
-                    "use_web_search": use_web_search,
-                }
+                if output != streamed:
+                    placeholder.markdown(output)
+            except Exception as e:
+                output = f"Error: {e}"
+                placeholder.markdown(output)
+        else:
+            with st.spinner("Processing..."):
+                try:
+                    new_state = chatbot_invoke(state)
 
-                new_state = chatbot_invoke(state)
+                    ai_msg = (
+                        new_state["messages"][-1].content if new_state.get("messages") else "No response generated."
+                    )
 
-                ai_msg = new_state["messages"][-1].content if new_state.get("messages") else "No response generated."
+                    output = ai_msg
 
-                output = ai_msg
+                except Exception as e:
+                    output = f"Error: {e}"
 
-            except Exception as e:
-                output = f"Error: {e}"
+                st.markdown(output)
+
+        st.session_state.messages.append({"role": "assistant", "content": output})
 
-            st.markdown(output)
-            st.session_state.messages.append({"role": "assistant", "content": output})
+    # Redraw the sidebar with the regeneration choice cleared
+    if st.session_state.get("regenerate_used"):
+        st.rerun()
@@ -1,17 +1,44 @@
-from .suggest_narrative_angles import suggest_narrative_angles
-from .create_future_plan import create_future_plan
-from .format_activity_list import format_activity_list
-from .generate_main_essay_ideas import generate_main_essay_ideas
-from .create_activities_blueprint import create_activities_blueprint
-from .create_activity_ideas import create_activity_ideas
-from .create_activity_list import create_activity_list
-
-__all__ = [
-    "suggest_narrative_angles",
-    "create_future_plan",
-    "format_activity_list",
-    "generate_main_essay_ideas",
-    "create_activities_blueprint",
-    "create_activity_ideas",
-    "create_activity_list",
-]
+"""
+Agent tools, loaded lazily.
+Importing this package is cheap; each tool module (and its LLM and schema dependencies) is imported on first access.
+"""
+
+import importlib
+import sys
+import types
+from typing import Any
+
+_TOOL_MODULES = {
+    "suggest_narrative_angles": ".suggest_narrative_angles",
+    "create_future_plan": ".create_future_plan",
+    "format_activity_list": ".format_activity_list",
+    "generate_main_essay_ideas": ".generate_main_essay_ideas",
+    "create_activities_blueprint": ".create_activities_blueprint",
+    "create_activity_ideas": ".create_activity_ideas",
+    "create_activity_list": ".create_activity_list",
+}
+
+__all__ = list(_TOOL_MODULES)
+
+
+def __getattr__(name: str) -> Any:
+    if name not in _TOOL_MODULES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    value = getattr(importlib.import_module(_TOOL_MODULES[name], __name__), name)
+    globals()[name] = value
+
+    return value
+
+
+class _LazyPackage(types.ModuleType):
+    def __setattr__(self, name: str, value: Any) -> None:
+        # Importing a tool module binds it on the package under the tool's own name; skip that binding so the
+        # name keeps resolving to the tool object through __getattr__
+        if name in _TOOL_MODULES and isinstance(value, types.ModuleType):
+            return
+
+        super().__setattr__(name, value)
+
+
+sys.modules[__name__].__class__ = _LazyPackage
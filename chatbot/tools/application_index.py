@@ -0,0 +1,161 @@
+"""
+Similar-application retrieval over the embeddings of the admitted applications in clab_data.
+`ApplicationIndex` holds one contiguous matrix of unit rows (a memory-mapped embedding store, or the legacy
+application_embeddings.pkl read into float32) with the filename and college of each row alongside, so a batch of
+queries is one matrix product followed by a top-k selection.
+"""
+
+import os
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from tools.embedding_store import (
+    EmbeddingStore,
+    StoredApplication,
+    college_name,
+    load_applications,
+    normalize_rows,
+    top_k,
+)
+from tools.llm import get_embeddings
+from tools.utils import prompt_json
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+
+APPLICATION_INDEX_SETTINGS: Dict[str, Any] = {
+    "store_path": os.getenv("APPLICATION_STORE_PATH", os.path.join(BASE_DIR, "application_store")),
+    # Legacy pickle, used when no store has been converted (see tools.embedding_store)
+    "path": os.getenv("APPLICATION_EMBEDDINGS_PATH", os.path.join(BASE_DIR, "application_embeddings.pkl")),
+    "top_k": int(os.getenv("APPLICATION_INDEX_TOP_K", "3")),
+}
+
+
+class ApplicationIndex:
+    """Exact cosine search over unit-normalized application embeddings."""
+
+    def __init__(
+        self,
+        vectors: Any,
+        filenames: Sequence[str],
+        colleges: Sequence[str],
+        contents: Sequence[Any] = (),
+        normalized: bool = False,
+    ):
+        # Already-normalized rows (a store's memory map) are used as they are, without a copy
+        self.vectors = vectors if normalized else normalize_rows(vectors)
+        self.filenames = np.array(filenames, dtype=object)
+        self.colleges = np.array(colleges, dtype=object)
+        self.contents = list(contents)
+
+        if not len(self.filenames) == len(self.colleges) == self.vectors.shape[0]:
+            raise ValueError("Every embedding needs a filename and a college")
+
+    @classmethod
+    def from_applications(cls, applications: Sequence[StoredApplication]) -> "ApplicationIndex":
+        return cls(
+            [app.embedding for app in applications],
+            [app.filename for app in applications],
+            [college_name(app.filename, app.content) for app in applications],
+            [app.content for app in applications],
+        )
+
+    @classmethod
+    def from_store(cls, store: EmbeddingStore) -> "ApplicationIndex":
+        rows = store.live_rows()
+        # The memory map is searched in place unless tombstoned rows have to be left out
+        vectors = store.vectors if len(rows) == len(store) else store.vectors[rows]
+
+        return cls(
+            vectors,
+            [store.items[row]["filename"] for row in rows],
+            [store.items[row]["college"] for row in rows],
+            normalized=True,
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "ApplicationIndex":
+        """Open an embedding store directory, or read a legacy pickle."""
+        if os.path.isdir(path):
+            return cls.from_store(EmbeddingStore(path))
+
+        return cls.from_applications(load_applications(path))
+
+    @property
+    def dim(self) -> int:
+        return self.vectors.shape[1]
+
+    def __len__(self) -> int:
+        return self.vectors.shape[0]
+
+    def search(self, queries: Any, k: int = 3, college: Optional[str] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (scores, rows), both shaped (queries, k) and sorted by descending cosine similarity.
+
+        `queries` is one embedding or a batch of them; they are normalized here. With `college` (as stored, e.g.
+        "Harvard University"), only that college's applications are candidates, and k shrinks to their number.
+        """
+        candidates = None if college is None else np.flatnonzero(self.colleges == college)
+
+        return top_k(self.vectors, queries, k, candidates)
+
+    def matches(self, queries: Any, k: int = 3, college: Optional[str] = None) -> List[List[Dict[str, Any]]]:
+        """`search` with each hit described by its filename, college and score."""
+        scores, rows = self.search(queries, k, college)
+
+        return [
+            [
+                {"filename": self.filenames[row], "college": self.colleges[row], "score": float(score)}
+                for score, row in zip(query_scores, query_rows)
+            ]
+            for query_scores, query_rows in zip(scores, rows)
+        ]
+
+    def content(self, filename: str) -> Optional[Dict[str, Any]]:
+        """Structured content of an application; stores keep only its hash, so this needs the legacy pickle."""
+        rows = np.flatnonzero(self.filenames == filename)
+
+        return self.contents[rows[0]] if len(rows) and self.contents else None
+
+    async def asimilar(
+        self, texts: Sequence[str], k: int = 3, college: Optional[str] = None
+    ) -> List[List[Dict[str, Any]]]:
+        """Embed `texts` in one request and return the most similar applications for each."""
+        vectors = await get_embeddings().aembed_documents(list(texts))
+
+        return self.matches(vectors, k, college)
+
+    def similar(self, texts: Sequence[str], k: int = 3, college: Optional[str] = None) -> List[List[Dict[str, Any]]]:
+        return self.matches(get_embeddings().embed_documents(list(texts)), k, college)
+
+
+async def asimilar_applications(
+    user_profile: Optional[Dict[str, Any]], k: Optional[int] = None, college: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """Admitted applications most similar to a user profile, best first; empty when the index is unavailable."""
+    index = get_application_index()
+
+    if index is None or not user_profile:
+        return []
+
+    results = await index.asimilar([prompt_json(user_profile)], k or APPLICATION_INDEX_SETTINGS["top_k"], college)
+
+    return results[0]
+
+
+_index: Optional[ApplicationIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_application_index() -> Optional[ApplicationIndex]:
+    """Return the process-wide application index, or None when neither the store nor the pickle exists."""
+    global _index
+
+    with _index_lock:
+        if _index is None:
+            if EmbeddingStore.exists(APPLICATION_INDEX_SETTINGS["store_path"]):
+                _index = ApplicationIndex.load(APPLICATION_INDEX_SETTINGS["store_path"])
+            elif os.path.exists(APPLICATION_INDEX_SETTINGS["path"]):
+                _index = ApplicationIndex.load(APPLICATION_INDEX_SETTINGS["path"])
+
+        return _index
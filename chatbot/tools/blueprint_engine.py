@@ -0,0 +1,194 @@
+"""
+Local activities blueprint engine.
+Maps the profile's Common App activity categories onto the ten canonical ACTIVITY_CATEGORIES and fills the remaining
+slots toward the target total from rules plus category priors learned from the clab_data corpus of admitted
+applications. No LLM call; after the corpus priors are loaded once a blueprint takes microseconds.
+"""
+
+import json
+import os
+import re
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+
+ACTIVITY_CATEGORIES = [
+    "Olympiad / Competition",
+    "Council/ Leadership Position",
+    "Research Project",
+    "Research Paper",
+    "Passion Project",
+    "Community Service",
+    "Unique Activity",
+    "Hobby",
+    "Publications / Podcast / Blogs",
+    "Sports / Other Activity",
+]
+
+OLYMPIAD, LEADERSHIP, RESEARCH_PROJECT, RESEARCH_PAPER, PASSION, SERVICE, UNIQUE, HOBBY, PUBLICATIONS, SPORTS = (
+    ACTIVITY_CATEGORIES
+)
+
+DEFAULT_CORPUS_PATH = os.getenv(
+    "BLUEPRINT_CORPUS_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "clab_data", "all_data.json"),
+)
+
+# Common App activity types, lowercased, to the canonical category they most often represent
+COMMON_APP_CATEGORIES: Dict[str, str] = {
+    "academic": RESEARCH_PROJECT,
+    "art": HOBBY,
+    "athletics: club": SPORTS,
+    "athletics: jv/varsity": SPORTS,
+    "career oriented": UNIQUE,
+    "community service": SERVICE,
+    "community service (volunteer)": SERVICE,
+    "computer/technology": PASSION,
+    "cultural": UNIQUE,
+    "dance": HOBBY,
+    "debate/speech": OLYMPIAD,
+    "environmental": SERVICE,
+    "family responsibilities": UNIQUE,
+    "foreign exchange": UNIQUE,
+    "foreign language": HOBBY,
+    "internship": RESEARCH_PROJECT,
+    "journalism/publication": PUBLICATIONS,
+    "junior r.o.t.c.": LEADERSHIP,
+    "lgbt": SERVICE,
+    "music: instrumental": HOBBY,
+    "music: vocal": HOBBY,
+    "other club/activity": UNIQUE,
+    "religious": SERVICE,
+    "research": RESEARCH_PROJECT,
+    "robotics": OLYMPIAD,
+    "school spirit": LEADERSHIP,
+    "science/math": OLYMPIAD,
+    "social justice": PASSION,
+    "student govt./politics": LEADERSHIP,
+    "theater/drama": HOBBY,
+    "work (paid)": UNIQUE,
+}
+
+# Evidence in the activity text that overrides the category mapping, checked in order
+TEXT_RULES: List[Tuple[re.Pattern, str]] = [
+    (re.compile(r"\b(published|journal|paper|preprint|author)\b", re.I), RESEARCH_PAPER),
+    (re.compile(r"\b(olympiad|competition|tournament|championship|hackathon|contest)\b", re.I), OLYMPIAD),
+    (re.compile(r"\b(podcast|blog|newsletter|magazine|editor|columnist|youtube)\b", re.I), PUBLICATIONS),
+    (re.compile(r"\b(research|researcher|lab|laboratory)\b", re.I), RESEARCH_PROJECT),
+    (re.compile(r"\b(founder|founded|co-founder|initiative|startup|launched)\b", re.I), PASSION),
+    (re.compile(r"\b(president|captain|head|chair|council|prefect|secretary|treasurer)\b", re.I), LEADERSHIP),
+    (re.compile(r"\b(volunteer|volunteered|charity|ngo|fundrais\w*|tutor\w*)\b", re.I), SERVICE),
+]
+
+# Categories to favour when filling missing slots, by keywords in the student's stated goals
+GOAL_RULES: List[Tuple[re.Pattern, Tuple[str, ...]]] = [
+    (
+        re.compile(r"\b(science|engineer\w*|math\w*|physics|chemistry|biology|computer|medicine|stem)\b", re.I),
+        (RESEARCH_PROJECT, RESEARCH_PAPER, OLYMPIAD),
+    ),
+    (re.compile(r"\b(econom\w*|business|entrepreneur\w*|finance)\b", re.I), (PASSION, LEADERSHIP, RESEARCH_PAPER)),
+    (
+        re.compile(r"\b(law|policy|politic\w*|government|international relations|public)\b", re.I),
+        (LEADERSHIP, SERVICE, RESEARCH_PAPER),
+    ),
+    (re.compile(r"\b(journalism|writing|literature|media|communication\w*)\b", re.I), (PUBLICATIONS, PASSION)),
+    (re.compile(r"\b(art|design|music|film|architecture)\b", re.I), (PASSION, HOBBY, PUBLICATIONS)),
+]
+
+GOAL_BOOST = 1.5
+
+
+def classify_activity(activity: Dict[str, Any]) -> str:
+    """Canonical category for one profile activity: text evidence first, then the Common App category."""
+    text = " ".join(
+        str(activity.get(key) or "") for key in ("position", "organization", "description")
+    ) + " " + " ".join(activity.get("keywords") or [])
+
+    for pattern, category in TEXT_RULES:
+        if pattern.search(text):
+            return category
+
+    return COMMON_APP_CATEGORIES.get(str(activity.get("category", "")).strip().lower(), UNIQUE)
+
+
+def _annual_hours(activity: Dict[str, Any]) -> float:
+    match = re.search(r"([\d.]+)\s*hr/wk\D+([\d.]+)\s*wk/yr", str(activity.get("hours", "")))
+
+    return float(match.group(1)) * float(match.group(2)) if match else 0.0
+
+
+@lru_cache(maxsize=4)
+def corpus_priors(path: str = DEFAULT_CORPUS_PATH) -> Dict[str, float]:
+    """Share of each canonical category among the corpus activities (add-one smoothed); uniform without a corpus."""
+    counts = {category: 1.0 for category in ACTIVITY_CATEGORIES}
+
+    try:
+        with open(path, encoding="utf-8") as f:
+            corpus = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        corpus = {}
+
+    for application in corpus.values() if isinstance(corpus, dict) else corpus:
+        for activity in (application.get("activity_profile") or {}).get("activities") or []:
+            counts[classify_activity(activity)] += 1
+
+    total = sum(counts.values())
+
+    return {category: count / total for category, count in counts.items()}
+
+
+def _goal_text(user_profile: Dict[str, Any]) -> str:
+    academic = user_profile.get("academic_profile") or {}
+    questions = user_profile.get("university_specific_questions") or {}
+
+    return json.dumps([academic.get("future_plans"), questions.get("top_academic_majors_interest")], default=str)
+
+
+def compute_blueprint(
+    user_profile: Optional[Dict[str, Any]], target_total: int = 10, corpus_path: str = DEFAULT_CORPUS_PATH
+) -> Dict[str, Any]:
+    """Return an ActivitiesBlueprintOutput-shaped dict whose counts sum to exactly `target_total`.
+
+    Existing counts come from the profile's activities (the longest-running ones when there are more than
+    `target_total`); activities counted in time_commitment.activity_count but not listed are spread by corpus priors.
+    Missing slots go one at a time to the category with the best prior x goal boost / (1 + items already there),
+    which keeps the list balanced while leaning toward what strong applications and the student's goals favour.
+    """
+    user_profile = user_profile or {}
+    activity_profile = user_profile.get("activity_profile") or {}
+    activities = sorted(activity_profile.get("activities") or [], key=_annual_hours, reverse=True)[:target_total]
+    priors = corpus_priors(corpus_path)
+
+    existing = {category: 0 for category in ACTIVITY_CATEGORIES}
+    for activity in activities:
+        existing[classify_activity(activity)] += 1
+
+    reported = (activity_profile.get("time_commitment") or {}).get("activity_count") or 0
+    unlisted = max(0, min(int(reported), target_total) - len(activities))
+    by_prior = sorted(ACTIVITY_CATEGORIES, key=lambda c: -priors[c])
+    for index in range(unlisted):
+        existing[by_prior[index % len(by_prior)]] += 1
+
+    weights = dict(priors)
+    goal_text = _goal_text(user_profile)
+    for pattern, categories in GOAL_RULES:
+        if pattern.search(goal_text):
+            for category in categories:
+                weights[category] *= GOAL_BOOST
+
+    missing = {category: 0 for category in ACTIVITY_CATEGORIES}
+    for _ in range(target_total - sum(existing.values())):
+        best = max(
+            ACTIVITY_CATEGORIES,
+            key=lambda c: (weights[c] / (1 + existing[c] + missing[c]), -ACTIVITY_CATEGORIES.index(c)),
+        )
+        missing[best] += 1
+
+    return {
+        "categories": [
+            {"category": category, "existing": existing[category], "missing": missing[category]}
+            for category in ACTIVITY_CATEGORIES
+            if existing[category] + missing[category] > 0
+        ],
+        "total": target_total,
+    }
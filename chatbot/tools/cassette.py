@@ -0,0 +1,407 @@
+"""
+Record/replay cassettes for chat model calls.
+A cassette maps a hash of the rendered prompt (model settings plus every message) to the response text, token usage
+and timing that the live model produced. Recording wraps the real model; replay answers from the cassette without any
+network access and can reproduce the recorded time to first token and total latency.
+
+Cassettes are gzip-compressed JSON lines. Each recording is appended as its own gzip member, so a cassette grows
+without being rewritten and a partially written recording cannot corrupt earlier ones: a truncated last member is
+skipped with a warning, and the file is rewritten without it before the next recording is appended.
+
+Enable for the app with LLM_CASSETTE=<path> and LLM_CASSETTE_MODE=record|replay|auto (LLM_CASSETTE_TIMING=1 to
+replay recorded timing), or call `use_cassette` directly.
+"""
+
+import asyncio
+import gzip
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import zlib
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from tools.llm import ModelKey, add_model_wrapper, remove_model_wrapper, set_model_factory
+
+CASSETTE_MODES = ("record", "replay", "auto")
+
+logger = logging.getLogger(__name__)
+
+
+class CassetteMiss(KeyError):
+    """Raised in replay mode when a prompt was never recorded."""
+
+
+def prompt_hash(key: ModelKey, messages: List[BaseMessage], stop: Optional[List[str]] = None) -> str:
+    payload = {
+        "model": list(key),
+        "messages": [[msg.type, msg.content] for msg in messages],
+        "stop": stop,
+    }
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class Cassette:
+    """In-memory view of a cassette file; new recordings are appended to disk as they happen."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self.recorded = 0
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        # Set when the file ends in a damaged member; recordings appended after it would be unreadable
+        self._damaged = False
+
+        if os.path.exists(path):
+            self._load()
+
+    def _load(self) -> None:
+        try:
+            with gzip.open(self.path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self._entries[entry["k"]] = entry
+        except (EOFError, OSError, zlib.error, json.JSONDecodeError) as e:
+            # An interrupted recording leaves a truncated last member; the entries before it are intact
+            self._damaged = True
+            logger.warning(
+                "Cassette %s ends in a damaged recording (%s); using its %d complete entries",
+                self.path,
+                e,
+                len(self._entries),
+            )
+
+    def _rewrite(self) -> None:
+        tmp = f"{self.path}.tmp"
+
+        with gzip.open(tmp, "wt", encoding="utf-8") as f:
+            for entry in self._entries.values():
+                f.write(json.dumps(entry, separators=(",", ":"), ensure_ascii=False) + "\n")
+
+        os.replace(tmp, self.path)
+        self._damaged = False
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+
+            return entry
+
+    def put(self, entry: Dict[str, Any]) -> None:
+        line = json.dumps(entry, separators=(",", ":"), ensure_ascii=False) + "\n"
+
+        with self._lock:
+            if self._damaged:
+                self._rewrite()
+
+            self._entries[entry["k"]] = entry
+            self.recorded += 1
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with gzip.open(self.path, "at", encoding="utf-8") as f:
+                f.write(line)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses, "recorded": self.recorded}
+
+
+def _chunks(text: str, count: int) -> List[str]:
+    count = max(1, min(count, len(text)))
+    size = -(-len(text) // count)
+
+    return [text[i : i + size] for i in range(0, len(text), size)] or [""]
+
+
+def _usage_metadata(usage: Dict[str, int]) -> Optional[Dict[str, int]]:
+    if not usage:
+        return None
+
+    prompt_tokens = usage.get("prompt_tokens", 0)
+    completion_tokens = usage.get("completion_tokens", 0)
+
+    return {
+        "input_tokens": prompt_tokens,
+        "output_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+
+
+def _add_chunk(chunk: ChatGenerationChunk, parts: List[str], streamed: Dict[str, Any]) -> None:
+    """Collect a live streamed chunk's text, token usage (reported on the final chunk) and model name."""
+    parts.append(chunk.text)
+    usage = getattr(chunk.message, "usage_metadata", None) or {}
+
+    if usage:
+        streamed["prompt_tokens"] = streamed.get("prompt_tokens", 0) + usage.get("input_tokens", 0)
+        streamed["completion_tokens"] = streamed.get("completion_tokens", 0) + usage.get("output_tokens", 0)
+
+    streamed["model_name"] = chunk.message.response_metadata.get("model_name") or streamed.get("model_name")
+
+
+def _streamed_result(parts: List[str], streamed: Dict[str, Any]) -> ChatResult:
+    usage = {k: streamed[k] for k in ("prompt_tokens", "completion_tokens") if k in streamed}
+    message = AIMessage(content="".join(parts), usage_metadata=_usage_metadata(usage))
+
+    return ChatResult(
+        generations=[ChatGeneration(message=message)],
+        llm_output={"token_usage": usage, "model_name": streamed.get("model_name")},
+    )
+
+
+class CassetteChatModel(BaseChatModel):
+    """Chat model that records the wrapped model's responses to a cassette or replays them from it.
+
+    Entries use short keys to keep cassettes small: k (prompt hash), t (text), u (token usage), m (model name),
+    f (time to first token, ms), w (wall time, ms) and n (number of streamed chunks).
+    """
+
+    inner: Optional[BaseChatModel] = None
+    cassette: Any
+    key: ModelKey
+    mode: str = "auto"
+    replay_timing: bool = False
+
+    @property
+    def _llm_type(self) -> str:
+        return "cassette"
+
+    def _lookup(self, messages: List[BaseMessage], stop: Optional[List[str]]) -> tuple:
+        key = prompt_hash(self.key, messages, stop)
+        entry = None if self.mode == "record" else self.cassette.get(key)
+
+        if entry is None and (self.mode == "replay" or self.inner is None):
+            raise CassetteMiss(f"No recorded response for prompt {key[:12]} in {self.cassette.path}")
+
+        return key, entry
+
+    def _result(self, entry: Dict[str, Any]) -> ChatResult:
+        return ChatResult(
+            generations=[ChatGeneration(message=AIMessage(content=entry["t"]))],
+            llm_output={"token_usage": entry.get("u") or {}, "model_name": entry.get("m")},
+        )
+
+    def _record(self, key: str, result: ChatResult, first_token: Optional[float], start: float, chunks: int) -> None:
+        llm_output = result.llm_output or {}
+        usage = llm_output.get("token_usage") or {}
+        self.cassette.put(
+            {
+                "k": key,
+                "t": result.generations[0].message.content,
+                "u": {k: usage[k] for k in ("prompt_tokens", "completion_tokens") if k in usage},
+                "m": llm_output.get("model_name"),
+                "f": round(((first_token or time.perf_counter()) - start) * 1000, 1),
+                "w": round((time.perf_counter() - start) * 1000, 1),
+                "n": chunks,
+            }
+        )
+
+    def _replay_delays(self, entry: Dict[str, Any], chunks: int) -> tuple:
+        if not self.replay_timing:
+            return 0.0, 0.0
+
+        first = entry.get("f", 0.0) / 1000
+        rest = max(0.0, entry.get("w", 0.0) / 1000 - first)
+
+        return first, rest / max(1, chunks - 1)
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        key, entry = self._lookup(messages, stop)
+
+        if entry is not None:
+            if self.replay_timing:
+                time.sleep(entry.get("w", 0.0) / 1000)
+            return self._result(entry)
+
+        start = time.perf_counter()
+        result = self.inner._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+        self._record(key, result, None, start, 1)
+
+        return result
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        key, entry = self._lookup(messages, stop)
+
+        if entry is not None:
+            if self.replay_timing:
+                await asyncio.sleep(entry.get("w", 0.0) / 1000)
+            return self._result(entry)
+
+        start = time.perf_counter()
+        result = await self.inner._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+        self._record(key, result, None, start, 1)
+
+        return result
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        key, entry = self._lookup(messages, stop)
+
+        if entry is not None:
+            pieces = _chunks(entry["t"], entry.get("n", 1))
+            first, between = self._replay_delays(entry, len(pieces))
+
+            for index, piece in enumerate(pieces):
+                time.sleep(first if index == 0 else between)
+                # Like a live stream, the last chunk carries the recorded token usage
+                usage = _usage_metadata(entry.get("u") or {}) if index == len(pieces) - 1 else None
+                chunk = ChatGenerationChunk(message=AIMessageChunk(content=piece, usage_metadata=usage))
+                if run_manager:
+                    run_manager.on_llm_new_token(piece, chunk=chunk)
+                yield chunk
+            return
+
+        start = time.perf_counter()
+        first_token = None
+        parts: List[str] = []
+        streamed: Dict[str, Any] = {}
+
+        for chunk in self.inner._stream(messages, stop=stop, run_manager=run_manager, **kwargs):
+            first_token = first_token or time.perf_counter()
+            _add_chunk(chunk, parts, streamed)
+            yield chunk
+
+        self._record(key, _streamed_result(parts, streamed), first_token, start, len(parts))
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        key, entry = self._lookup(messages, stop)
+
+        if entry is not None:
+            pieces = _chunks(entry["t"], entry.get("n", 1))
+            first, between = self._replay_delays(entry, len(pieces))
+
+            for index, piece in enumerate(pieces):
+                await asyncio.sleep(first if index == 0 else between)
+                # Like a live stream, the last chunk carries the recorded token usage
+                usage = _usage_metadata(entry.get("u") or {}) if index == len(pieces) - 1 else None
+                chunk = ChatGenerationChunk(message=AIMessageChunk(content=piece, usage_metadata=usage))
+                if run_manager:
+                    await run_manager.on_llm_new_token(piece, chunk=chunk)
+                yield chunk
+            return
+
+        start = time.perf_counter()
+        first_token = None
+        parts: List[str] = []
+        streamed: Dict[str, Any] = {}
+
+        async for chunk in self.inner._astream(messages, stop=stop, run_manager=run_manager, **kwargs):
+            first_token = first_token or time.perf_counter()
+            _add_chunk(chunk, parts, streamed)
+            yield chunk
+
+        self._record(key, _streamed_result(parts, streamed), first_token, start, len(parts))
+
+
+_active: Optional[tuple] = None
+_active_lock = threading.Lock()
+
+
+def use_cassette(path: str, mode: str = "auto", replay_timing: bool = False) -> Cassette:
+    """Route every `get_llm` model through a cassette.
+
+    record: always call the live model and append its response; replay: answer only from the cassette (no Azure
+    credentials needed) and raise `CassetteMiss` for unknown prompts; auto: replay when recorded, otherwise record.
+    """
+    global _active
+
+    if mode not in CASSETTE_MODES:
+        raise ValueError(f"Unknown cassette mode '{mode}'. Expected one of {CASSETTE_MODES}")
+
+    eject_cassette()
+    cassette = Cassette(path)
+
+    if mode == "replay":
+
+        def factory(deployment_name: str, temperature: Optional[float], max_tokens: Optional[int]) -> BaseChatModel:
+            return CassetteChatModel(
+                cassette=cassette,
+                key=(deployment_name, temperature, max_tokens),
+                mode=mode,
+                replay_timing=replay_timing,
+            )
+
+        set_model_factory(factory)
+        hook = ("factory", factory)
+    else:
+
+        def wrapper(model: BaseChatModel, key: ModelKey) -> BaseChatModel:
+            return CassetteChatModel(inner=model, cassette=cassette, key=key, mode=mode, replay_timing=replay_timing)
+
+        add_model_wrapper(wrapper)
+        hook = ("wrapper", wrapper)
+
+    with _active_lock:
+        _active = (cassette, hook)
+
+    return cassette
+
+
+def eject_cassette() -> None:
+    """Stop routing models through the active cassette, if any."""
+    global _active
+
+    with _active_lock:
+        active, _active = _active, None
+
+    if active is None:
+        return
+
+    kind, hook = active[1]
+
+    if kind == "factory":
+        set_model_factory(None)
+    else:
+        remove_model_wrapper(hook)
+
+
+def use_cassette_from_env() -> Optional[Cassette]:
+    path = os.getenv("LLM_CASSETTE")
+
+    if not path:
+        return None
+
+    return use_cassette(
+        path, mode=os.getenv("LLM_CASSETTE_MODE", "auto"), replay_timing=os.getenv("LLM_CASSETTE_TIMING", "0") == "1"
+    )
@@ -0,0 +1,161 @@
+"""
+Stage checkpoints for multi-step agent pipelines.
+Each stage's output is stored in SQLite under a pipeline run ID derived from the pipeline, the profile, the user's
+query and the pipeline's prompt version, so re-invoking a pipeline after a failure resumes from the last successful
+stage instead of repeating earlier LLM calls.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+from langchain_core.messages import BaseMessage
+
+from tools.response_cache import _canonical_json, normalize_messages, profile_hash
+
+
+DEFAULT_CHECKPOINT_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(__file__))), ".cache", "checkpoints.db"
+)
+
+CHECKPOINT_SETTINGS: Dict[str, Any] = {
+    "enabled": os.getenv("PIPELINE_CHECKPOINTS_ENABLED", "1") == "1",
+    "path": os.getenv("PIPELINE_CHECKPOINT_PATH", DEFAULT_CHECKPOINT_PATH),
+    "ttl_seconds": float(os.getenv("PIPELINE_CHECKPOINT_TTL_SECONDS", str(24 * 3600))),
+}
+
+
+def pipeline_run_id(
+    pipeline: str,
+    user_profile: Optional[Dict[str, Any]],
+    recent_messages: List[BaseMessage],
+    prompt_version: str,
+) -> str:
+    """Run ID for a pipeline invocation.
+
+    Only the latest message is part of the key: the chat history grows with every retry (including the failed
+    response itself), while the request being retried stays the same.
+    """
+    payload = {
+        "pipeline": pipeline,
+        "profile": profile_hash(user_profile),
+        "query": normalize_messages(recent_messages[-1:]),
+        "prompt_version": prompt_version,
+    }
+
+    return hashlib.sha256(_canonical_json(payload).encode("utf-8")).hexdigest()[:32]
+
+
+class CheckpointStore:
+    """SQLite-backed stage outputs keyed by (run_id, stage), expiring after `ttl_seconds`."""
+
+    def __init__(self, path: str, ttl_seconds: float = 24 * 3600):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS checkpoints ("
+            "run_id TEXT NOT NULL, stage TEXT NOT NULL, pipeline TEXT NOT NULL, profile TEXT NOT NULL, "
+            "value TEXT NOT NULL, created_at REAL NOT NULL, PRIMARY KEY (run_id, stage))"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS checkpoints_profile ON checkpoints (pipeline, profile, created_at)"
+        )
+        self._conn.commit()
+
+    def load(self, run_id: str, stage: str) -> Optional[str]:
+        cutoff = time.time() - self.ttl_seconds
+
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM checkpoints WHERE run_id = ? AND stage = ? AND created_at >= ?",
+                (run_id, stage, cutoff),
+            ).fetchone()
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+
+            return row[0]
+
+    def save(self, run_id: str, stage: str, pipeline: str, profile: str, value: str) -> None:
+        now = time.time()
+
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO checkpoints (run_id, stage, pipeline, profile, value, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (run_id, stage, pipeline, profile, value, now),
+            )
+            self._conn.execute("DELETE FROM checkpoints WHERE created_at < ?", (now - self.ttl_seconds,))
+            self._conn.commit()
+
+    def discard(self, run_id: str, stages: Iterable[str]) -> None:
+        with self._lock:
+            self._conn.executemany(
+                "DELETE FROM checkpoints WHERE run_id = ? AND stage = ?", [(run_id, stage) for stage in stages]
+            )
+            self._conn.commit()
+
+    def has_run(self, run_id: str) -> bool:
+        """True when any stage of `run_id` is still checkpointed."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM checkpoints WHERE run_id = ? AND created_at >= ? LIMIT 1",
+                (run_id, time.time() - self.ttl_seconds),
+            ).fetchone()
+
+        return row is not None
+
+    def latest_run(self, pipeline: str, profile: str) -> Optional[str]:
+        """Most recently checkpointed run of `pipeline` for a profile hash, if any is still live."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT run_id FROM checkpoints WHERE pipeline = ? AND profile = ? AND created_at >= ? "
+                "ORDER BY created_at DESC LIMIT 1",
+                (pipeline, profile, time.time() - self.ttl_seconds),
+            ).fetchone()
+
+        return row[0] if row else None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM checkpoints")
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM checkpoints").fetchone()[0]
+
+        return {"hits": self.hits, "misses": self.misses, "entries": entries}
+
+
+_store: Optional[CheckpointStore] = None
+_store_lock = threading.Lock()
+
+
+def get_checkpoint_store() -> Optional[CheckpointStore]:
+    """Return the process-wide checkpoint store, or None when checkpoints are disabled."""
+    global _store
+
+    if not CHECKPOINT_SETTINGS["enabled"]:
+        return None
+
+    with _store_lock:
+        if _store is None:
+            _store = CheckpointStore(CHECKPOINT_SETTINGS["path"], ttl_seconds=CHECKPOINT_SETTINGS["ttl_seconds"])
+
+        return _store
@@ -0,0 +1,399 @@
+"""
+Section-level retrieval over the structured applications in clab_data.
+Each `*_structured.json` application is split into chunks, one per personal statement, activity, supplemental essay
+and application narrative, and every chunk is embedded on its own. A chunk keeps a pointer to its parent application
+and its JSON path inside it, so a tool can put the three most relevant activity descriptions or essays in a prompt
+instead of whole applications, and still find the application they came from.
+
+Index the corpus from the chatbot directory with:
+
+    python -m tools.chunk_index [--data-dir ../clab_data] [--store ../.cache/chunk_store] [--rebuild] [--compact]
+
+Indexing is incremental: files whose hash is unchanged are skipped, only new or changed chunks are embedded (and
+texts embedded before come from the embedding cache), and replaced or deleted chunks are tombstoned, so the cost of
+an update follows the size of the change rather than of the corpus.
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import sys
+import threading
+from collections import defaultdict
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from tools.embedding_cache import get_embedding_cache
+from tools.embedding_store import EmbeddingStore, college_name, content_hash, top_k
+from tools.llm import DEFAULT_EMBEDDING_DEPLOYMENT, get_embeddings
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+
+CHUNK_INDEX_SETTINGS: Dict[str, Any] = {
+    "data_dir": os.getenv("CHUNK_INDEX_DATA_DIR", os.path.join(BASE_DIR, "clab_data")),
+    "store_path": os.getenv("CHUNK_INDEX_STORE_PATH", os.path.join(BASE_DIR, ".cache", "chunk_store")),
+    "batch_size": int(os.getenv("CHUNK_INDEX_BATCH_SIZE", "64")),
+    "top_k": int(os.getenv("CHUNK_INDEX_TOP_K", "3")),
+}
+
+STRUCTURED_SUFFIX = "_structured.json"
+
+# Bump when chunk_application changes, so the next update re-chunks unchanged files
+CHUNK_VERSION = "1"
+
+# Chunk kinds, in the order they are produced for an application
+KINDS = ("personal_statement", "activity", "supplemental", "narrative")
+
+# Stanford files name their supplemental section differently
+SUPPLEMENTAL_SECTIONS = ("university_supplemental_questions", "stanford_supplemental_questions")
+
+
+def application_id(path: str) -> str:
+    """File stem without the "_structured.json" suffix, e.g. "Harvard_app1"."""
+    name = os.path.basename(path)
+
+    return name[: -len(STRUCTURED_SUFFIX)] if name.endswith(STRUCTURED_SUFFIX) else os.path.splitext(name)[0]
+
+
+def _text(value: Any) -> str:
+    # String leaves of nested sections, one per line
+    if isinstance(value, str):
+        return value.strip()
+
+    if isinstance(value, dict):
+        parts = [_text(v) for v in value.values()]
+    elif isinstance(value, list):
+        parts = [_text(v) for v in value]
+    else:
+        return "" if value is None else str(value)
+
+    return "\n".join(part for part in parts if part)
+
+
+def _activity_text(activity: Dict[str, Any]) -> str:
+    heading = ", ".join(str(activity[k]) for k in ("position", "organization") if activity.get(k))
+    details = "; ".join(str(activity[k]) for k in ("category", "grades", "hours") if activity.get(k))
+    keywords = ", ".join(activity.get("keywords") or [])
+
+    return "\n".join(part for part in (heading, details, activity.get("description"), keywords) if part)
+
+
+def _essay_text(essay: Any) -> str:
+    if not isinstance(essay, dict):
+        return _text(essay)
+
+    # The analysis is about the essay; only the prompt and the essay itself are retrieved
+    return "\n\n".join(part for part in (_text(essay.get("prompt")), _text(essay.get("response"))) if part)
+
+
+def chunk_application(parent: str, application: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Split one structured application into chunks with parent pointers.
+
+    Each chunk has an ID ("<parent>:<path>"), its parent application, college, kind, JSON path, title, text and a
+    hash of that text.
+    """
+    college = college_name(parent, application)
+    chunks: List[Dict[str, Any]] = []
+
+    def add(kind: str, path: List[Any], title: str, text: str) -> None:
+        if text:
+            chunks.append(
+                {
+                    "id": ":".join([parent, *map(str, path)]),
+                    "parent": parent,
+                    "college": college,
+                    "kind": kind,
+                    "path": path,
+                    "title": title,
+                    "text": text,
+                    "content_hash": content_hash(text),
+                }
+            )
+
+    statement = application.get("personal_statement") or {}
+    add(
+        "personal_statement",
+        ["personal_statement"],
+        "Personal statement",
+        _essay_text({"prompt": statement.get("essay_prompt"), "response": statement.get("personal_statement")}),
+    )
+
+    for index, activity in enumerate((application.get("activity_profile") or {}).get("activities") or []):
+        add(
+            "activity",
+            ["activity_profile", "activities", index],
+            activity.get("position") or activity.get("organization") or f"Activity {index + 1}",
+            _activity_text(activity),
+        )
+
+    narratives = [(["application_narrative"], application.get("application_narrative"))]
+
+    for section in SUPPLEMENTAL_SECTIONS:
+        for key, essay in (application.get(section) or {}).items():
+            if key == "application_narrative":
+                # Some files nest the narrative inside the supplemental section
+                narratives.append(([section, key], essay))
+                continue
+
+            title = essay.get("prompt") if isinstance(essay, dict) else None
+            add("supplemental", [section, key], title or key, _essay_text(essay))
+
+    for path, narrative in narratives:
+        add("narrative", path, "Application narrative", _text(narrative))
+
+    return chunks
+
+
+def structured_files(data_dir: str) -> List[str]:
+    return sorted(glob.glob(os.path.join(data_dir, f"*{STRUCTURED_SUFFIX}")))
+
+
+def load_corpus(data_dir: str) -> Iterator[Dict[str, Any]]:
+    """Yield the chunks of every structured application in `data_dir`, in file name order."""
+    for path in structured_files(data_dir):
+        with open(path, encoding="utf-8") as f:
+            yield from chunk_application(application_id(path), json.load(f))
+
+
+def embed_texts(texts: Sequence[str], batch_size: int = 64) -> List[List[float]]:
+    embeddings = get_embeddings()
+    vectors: List[List[float]] = []
+
+    for start in range(0, len(texts), batch_size):
+        vectors.extend(embeddings.embed_documents(list(texts[start : start + batch_size])))
+
+    return vectors
+
+
+def embed_chunks(chunks: Sequence[Dict[str, Any]], batch_size: int = 64) -> Tuple[List[Any], int]:
+    """Vectors for `chunks` and the number of texts actually embedded; the rest come from the embedding cache."""
+    cache = get_embedding_cache()
+    hashes = [chunk["content_hash"] for chunk in chunks]
+    vectors: Dict[str, Any] = cache.get_many(DEFAULT_EMBEDDING_DEPLOYMENT, hashes) if cache else {}
+
+    texts = {chunk["content_hash"]: chunk["text"] for chunk in chunks if chunk["content_hash"] not in vectors}
+    fresh = dict(zip(texts, embed_texts(list(texts.values()), batch_size)))
+
+    if cache and fresh:
+        cache.set_many(DEFAULT_EMBEDDING_DEPLOYMENT, fresh)
+
+    vectors.update(fresh)
+
+    return [vectors[key] for key in hashes], len(fresh)
+
+
+def build_chunk_store(data_dir: str, store_path: str, dtype: str = "float32", batch_size: int = 64) -> EmbeddingStore:
+    """Chunk and embed the whole corpus into a new store at `store_path`."""
+    chunks = list(load_corpus(data_dir))
+    vectors, _ = embed_chunks(chunks, batch_size)
+
+    return EmbeddingStore.create(store_path, vectors, chunks, dtype, _source_state(data_dir))
+
+
+def _file_hash(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def _source_state(data_dir: str) -> Dict[str, Any]:
+    return {
+        "chunk_version": CHUNK_VERSION,
+        "sources": {application_id(path): _file_hash(path) for path in structured_files(data_dir)},
+    }
+
+
+def update_chunk_store(
+    data_dir: str, store_path: str, dtype: str = "float32", batch_size: int = 64
+) -> Dict[str, Any]:
+    """Bring the store at `store_path` up to date with `data_dir`, embedding only new or changed chunks.
+
+    Unchanged files are skipped on their hash without being parsed. Chunks of changed files are compared with the
+    stored ones; new and changed chunks are appended (changed ones tombstone their old row), and chunks of edited or
+    deleted files that no longer exist are tombstoned. Returns counts of what was done.
+    """
+    store = EmbeddingStore(store_path) if EmbeddingStore.exists(store_path) else None
+
+    if store is None:
+        store = EmbeddingStore.create(store_path, [], [], dtype)
+
+    # A new chunking scheme re-chunks every file; unchanged chunk texts still need no embedding
+    same_scheme = store.extra.get("chunk_version") == CHUNK_VERSION
+    sources: Dict[str, str] = dict(store.extra.get("sources", {})) if same_scheme else {}
+
+    live: Dict[str, Dict[str, int]] = defaultdict(dict)
+    for row, item in enumerate(store.items):
+        if not item.get("deleted"):
+            live[item["parent"]][item["id"]] = row
+
+    stats = {"files": 0, "unchanged_files": 0, "added": 0, "updated": 0, "deleted": 0, "unchanged": 0}
+    new_chunks: List[Dict[str, Any]] = []
+    tombstones: List[int] = []
+    seen = set()
+
+    for path in structured_files(data_dir):
+        parent = application_id(path)
+        digest = _file_hash(path)
+        seen.add(parent)
+        stats["files"] += 1
+
+        if sources.get(parent) == digest:
+            stats["unchanged_files"] += 1
+            continue
+
+        with open(path, encoding="utf-8") as f:
+            chunks = chunk_application(parent, json.load(f))
+
+        sources[parent] = digest
+        stored = live.get(parent, {})
+
+        for chunk in chunks:
+            row = stored.pop(chunk["id"], None)
+
+            if row is not None and store.items[row] == chunk:
+                stats["unchanged"] += 1
+                continue
+
+            if row is not None:
+                tombstones.append(row)
+
+            stats["updated" if row is not None else "added"] += 1
+            new_chunks.append(chunk)
+
+        # Whatever is left no longer exists in the file
+        tombstones.extend(stored.values())
+        stats["deleted"] += len(stored)
+
+    for parent in set(live) - seen:
+        tombstones.extend(live[parent].values())
+        stats["deleted"] += len(live[parent])
+        sources.pop(parent, None)
+
+    for parent in set(sources) - seen:
+        sources.pop(parent)
+
+    vectors, stats["embedded"] = embed_chunks(new_chunks, batch_size)
+    extra = {**store.extra, "chunk_version": CHUNK_VERSION, "sources": sources}
+
+    if new_chunks or tombstones or extra != store.extra:
+        store.append(vectors, new_chunks, tombstones, extra)
+
+    stats["live"] = len(store.live_rows())
+    stats["tombstoned"] = len(store) - stats["live"]
+
+    return stats
+
+
+class ChunkIndex:
+    """Cosine search over the chunks of an embedding store, filtered by kind and parent application."""
+
+    def __init__(self, store: EmbeddingStore):
+        self.store = store
+        self.items = store.items
+        self.kinds = np.array([item["kind"] for item in store.items], dtype=object)
+        self.parents = np.array([item["parent"] for item in store.items], dtype=object)
+        self.live = np.array([not item.get("deleted") for item in store.items], dtype=bool)
+
+    def __len__(self) -> int:
+        return int(self.live.sum())
+
+    def _candidates(
+        self, kind: Optional[str], parent: Optional[str], exclude_parent: Optional[str]
+    ) -> Optional[np.ndarray]:
+        if kind is None and parent is None and exclude_parent is None and self.live.all():
+            return None
+
+        mask = self.live.copy()
+
+        if kind is not None:
+            mask &= self.kinds == kind
+        if parent is not None:
+            mask &= self.parents == parent
+        if exclude_parent is not None:
+            mask &= self.parents != exclude_parent
+
+        return np.flatnonzero(mask)
+
+    def search(
+        self,
+        queries: Any,
+        k: int = 3,
+        kind: Optional[str] = None,
+        parent: Optional[str] = None,
+        exclude_parent: Optional[str] = None,
+    ) -> List[List[Dict[str, Any]]]:
+        """Return the k most similar chunks for each query embedding, best first, each with its score."""
+        scores, rows = top_k(self.store.vectors, queries, k, self._candidates(kind, parent, exclude_parent))
+
+        return [
+            [{**self.items[row], "score": float(score)} for score, row in zip(query_scores, query_rows)]
+            for query_scores, query_rows in zip(scores, rows)
+        ]
+
+    async def asimilar(self, texts: Sequence[str], k: int = 3, **filters: Any) -> List[List[Dict[str, Any]]]:
+        """Embed `texts` in one request and return the most similar chunks for each."""
+        return self.search(await get_embeddings().aembed_documents(list(texts)), k, **filters)
+
+    def similar(self, texts: Sequence[str], k: int = 3, **filters: Any) -> List[List[Dict[str, Any]]]:
+        return self.search(get_embeddings().embed_documents(list(texts)), k, **filters)
+
+
+async def arelevant_chunks(
+    query: str, kind: Optional[str] = None, k: Optional[int] = None, **filters: Any
+) -> List[Dict[str, Any]]:
+    """Chunks most relevant to `query`, best first; empty when no chunk store has been built."""
+    index = get_chunk_index()
+
+    if index is None or not len(index) or not query:
+        return []
+
+    results = await index.asimilar([query], k or CHUNK_INDEX_SETTINGS["top_k"], kind=kind, **filters)
+
+    return results[0]
+
+
+_index: Optional[ChunkIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_chunk_index() -> Optional[ChunkIndex]:
+    """Return the process-wide chunk index, or None when the store has not been built."""
+    global _index
+
+    with _index_lock:
+        if _index is None and EmbeddingStore.exists(CHUNK_INDEX_SETTINGS["store_path"]):
+            _index = ChunkIndex(EmbeddingStore(CHUNK_INDEX_SETTINGS["store_path"]))
+
+        return _index
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Chunk and embed the structured applications into a chunk store.")
+    parser.add_argument("--data-dir", default=CHUNK_INDEX_SETTINGS["data_dir"])
+    parser.add_argument("--store", default=CHUNK_INDEX_SETTINGS["store_path"])
+    parser.add_argument("--dtype", choices=["float32", "float16"], default="float32", help="For a new store")
+    parser.add_argument("--batch-size", type=int, default=CHUNK_INDEX_SETTINGS["batch_size"])
+    parser.add_argument("--rebuild", action="store_true", help="Write a new store instead of updating the existing one")
+    parser.add_argument("--compact", action="store_true", help="Drop tombstoned rows after updating")
+    args = parser.parse_args(argv)
+
+    if args.rebuild:
+        store = build_chunk_store(args.data_dir, args.store, args.dtype, args.batch_size)
+        print(f"Wrote {len(store)} chunks to {args.store}")
+        return 0
+
+    stats = update_chunk_store(args.data_dir, args.store, args.dtype, args.batch_size)
+
+    if args.compact:
+        EmbeddingStore(args.store).compact()
+        stats["tombstoned"] = 0
+
+    print(json.dumps(stats, indent=2))
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
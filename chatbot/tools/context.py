@@ -0,0 +1,142 @@
+"""
+Token accounting and compact summaries for conversation context.
+Keeps the conversation part of every tool prompt within a per-tool token budget, however long the session runs.
+"""
+
+import json
+import re
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional
+
+from langchain_core.messages import BaseMessage
+
+
+DEFAULT_CONTEXT_TOKEN_BUDGET = 1200
+
+# Conversation-context token budget per tool; tools not listed use DEFAULT_CONTEXT_TOKEN_BUDGET
+CONTEXT_TOKEN_BUDGETS: Dict[str, int] = {
+    "format_activity_list": 600,
+    "create_activities_blueprint": 600,
+    "create_activity_ideas": 1000,
+    "create_future_plan": 800,
+    "suggest_narrative_angles": 1500,
+    "generate_main_essay_ideas": 1500,
+}
+
+# The newest messages are kept verbatim unless a single message is larger than this
+VERBATIM_TURNS = 2
+MAX_VERBATIM_MESSAGE_TOKENS = 350
+
+SUMMARY_TOKENS = 60
+
+# Keys whose values name an item in the structured agent outputs
+_TITLE_KEYS = ("title", "idea_name", "elevated_title", "position", "name", "category")
+
+
+@lru_cache(maxsize=1)
+def _token_encoder() -> Optional[Callable[[str], List[int]]]:
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+
+    return tiktoken.get_encoding("o200k_base").encode
+
+
+def count_tokens(text: str) -> int:
+    """Count tokens locally with tiktoken when installed, otherwise estimate at ~4 characters per token."""
+    encode = _token_encoder()
+
+    if encode is not None:
+        return len(encode(text))
+
+    return (len(text) + 3) // 4
+
+
+def _truncate_to_tokens(text: str, max_tokens: int) -> str:
+    if count_tokens(text) <= max_tokens:
+        return text
+
+    words = text.split()
+    kept: List[str] = []
+    used = 0
+
+    for word in words:
+        used += count_tokens(word + " ")
+        if used > max_tokens:
+            break
+        kept.append(word)
+
+    return " ".join(kept) + " …"
+
+
+def _collect_titles(value: Any, titles: List[str]) -> None:
+    if isinstance(value, dict):
+        for key in _TITLE_KEYS:
+            if isinstance(value.get(key), str):
+                titles.append(value[key])
+                break
+        for child in value.values():
+            _collect_titles(child, titles)
+    elif isinstance(value, list):
+        for child in value:
+            _collect_titles(child, titles)
+
+
+@lru_cache(maxsize=512)
+def summarize_message(content: str, max_tokens: int = SUMMARY_TOKENS) -> str:
+    """Return a compact, deterministic summary of one message; results are cached per content."""
+    text = content.strip()
+    candidate = re.sub(r"^```(?:json)?\s*|\s*```$", "", text)
+
+    if candidate[:1] in ("{", "["):
+        try:
+            data = json.loads(candidate)
+        except json.JSONDecodeError:
+            data = None
+
+        if data is not None:
+            titles: List[str] = []
+            _collect_titles(data, titles)
+            keys = ", ".join(data.keys()) if isinstance(data, dict) else f"{len(data)} items"
+            summary = f"[structured output: {keys}]"
+            if titles:
+                summary += f" covering: {'; '.join(dict.fromkeys(titles))}"
+            return _truncate_to_tokens(summary, max_tokens)
+
+    headings = [line.lstrip("#").strip() for line in text.splitlines() if line.startswith("#")]
+
+    if headings:
+        return _truncate_to_tokens(f"[response covering: {'; '.join(headings)}]", max_tokens)
+
+    return _truncate_to_tokens(re.sub(r"\s+", " ", text), max_tokens)
+
+
+def _role(msg: BaseMessage) -> str:
+    return "User" if hasattr(msg, "type") and msg.type == "human" else "Assistant"
+
+
+def budget_conversation(recent_messages: List[BaseMessage], token_budget: int) -> List[str]:
+    """Return "Role: content" lines for the conversation, newest turns verbatim and the rest summarized.
+
+    Messages are visited newest first. Old or oversized messages are replaced by their summaries, and once the budget
+    is spent the remaining older messages are folded into a single omission note.
+    """
+    lines: List[str] = []
+    used = 0
+
+    for index, msg in enumerate(reversed(recent_messages)):
+        content = str(msg.content)
+        verbatim = index < VERBATIM_TURNS and count_tokens(content) <= MAX_VERBATIM_MESSAGE_TOKENS
+        line = f"{_role(msg)}: {content if verbatim else summarize_message(content)}"
+        cost = count_tokens(line)
+
+        if used + cost > token_budget:
+            omitted = len(recent_messages) - index
+            lines.append(f"[{omitted} earlier message{'s' if omitted != 1 else ''} omitted]")
+            break
+
+        lines.append(line)
+        used += cost
+
+    return list(reversed(lines))
@@ -4,20 +4,18 @@ from langchain_core.runnables import Runnable
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.prompts import ChatPromptTemplate
 
-from langchain_openai import AzureChatOpenAI
+from tools.instrumentation import metrics_config
+from tools.llm import get_llm
 
 
-llm = AzureChatOpenAI(deployment_name="gpt-4o")
+LLM_SETTINGS = {"deployment_name": "gpt-4o"}
 
 
 class JSONToMarkdownLLMInput(BaseModel):
     data: str = Field(..., description="JSON object/list or JSON string to convert to Markdown using LLM")
 
 
-@tool("json_to_markdown_llm", args_schema=JSONToMarkdownLLMInput, return_direct=False)
-def json_to_markdown_llm(data: str) -> str:
-    """Convert JSON data to clean, readable Markdown format using LLM processing."""
-
+def _build_chain() -> Runnable:
     system_instructions = (
         "You are a formatter that converts JSON into clean, readable Markdown. "
         "Output ONLY Markdown content without code fences. "
@@ -34,8 +32,23 @@ def json_to_markdown_llm(data: str) -> str:
         ]
     )
 
-    chain: Runnable = prompt | llm | StrOutputParser()
+    return prompt | get_llm(**LLM_SETTINGS) | StrOutputParser()
 
-    raw = chain.invoke({"data": data})
+
+@tool("json_to_markdown_llm", args_schema=JSONToMarkdownLLMInput, return_direct=False)
+def json_to_markdown_llm(data: str) -> str:
+    """Convert JSON data to clean, readable Markdown format using LLM processing."""
+
+    raw = _build_chain().invoke({"data": data}, config=metrics_config("json_to_markdown_llm", "markdown"))
 
     return raw.strip()
+
+
+async def ajson_to_markdown_llm(data: str) -> str:
+    """Async variant of `json_to_markdown_llm`."""
+    raw = await _build_chain().ainvoke({"data": data}, config=metrics_config("json_to_markdown_llm", "markdown"))
+
+    return raw.strip()
+
+
+json_to_markdown_llm.coroutine = ajson_to_markdown_llm
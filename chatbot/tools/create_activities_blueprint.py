@@ -1,29 +1,26 @@
-import json
+import os
 from typing import List, Dict, Any, Optional
 
-from langchain_openai import AzureChatOpenAI
 from langchain_core.output_parsers import PydanticOutputParser
 from langchain_core.prompts import ChatPromptTemplate
 from pydantic import BaseModel, Field
 from langchain_core.tools import tool
 from langchain_core.messages import BaseMessage
 
-from tools.utils import create_conversation_context, create_user_context
+from tools.blueprint_engine import ACTIVITY_CATEGORIES, compute_blueprint
+from tools.instrumentation import metrics_config
+from tools.llm import get_llm
+from tools.utils import compact_json, create_conversation_context, create_user_context, run_sync
 
-llm = AzureChatOpenAI(deployment_name="gpt-4o", temperature=0.7, max_tokens=4000)
+LLM_SETTINGS = {"deployment_name": "gpt-4o", "temperature": 0.7, "max_tokens": 4000}
 
-ACTIVITY_CATEGORIES = [
-    "Olympiad / Competition",
-    "Council/ Leadership Position",
-    "Research Project",
-    "Research Paper",
-    "Passion Project",
-    "Community Service",
-    "Unique Activity",
-    "Hobby",
-    "Publications / Podcast / Blogs",
-    "Sports / Other Activity",
-]
+# The blueprint is computed locally by tools.blueprint_engine; the LLM only refines it when enabled
+BLUEPRINT_SETTINGS: Dict[str, Any] = {
+    "refine_with_llm": os.getenv("ACTIVITIES_BLUEPRINT_REFINE", "0") == "1",
+}
+
+# Bump whenever the prompt or output schema changes; part of the response cache key
+PROMPT_VERSION = "4"
 
 
 class ActivityBlueprintItem(BaseModel):
@@ -49,6 +46,9 @@ class ActivitiesBlueprintInput(BaseModel):
     user_profile: Optional[Dict[str, Any]] = Field(None, description="Complete user profile")
     recent_messages: List[BaseMessage] = Field(..., description="Recent conversation messages")
     target_total: int = Field(10, description="Target total number of activities (N+M)")
+    refine_with_llm: Optional[bool] = Field(
+        None, description="Let the LLM adjust the locally computed blueprint; defaults to BLUEPRINT_SETTINGS"
+    )
 
 
 def create_activities_blueprint_prompt_template() -> ChatPromptTemplate:
@@ -81,6 +81,9 @@ def create_activities_blueprint_prompt_template() -> ChatPromptTemplate:
         "{format_instructions}\n\n"
         "CONTEXT:\n"
         "{user_profile_context}\n"
+        "LOCAL BLUEPRINT (computed from the profile's activities; keep these counts unless the profile or "
+        "conversation clearly justifies a change):\n"
+        "{local_blueprint}\n"
     )
     user_prompt = "{conversation_context}\n\nUSER QUERY: {user_query}\nProduce the activities blueprint JSON now, honoring the target total of {target_total}."
 
@@ -92,11 +95,87 @@ def create_activities_blueprint_prompt_template() -> ChatPromptTemplate:
     )
 
 
+def _build_inputs(
+    user_profile: Optional[Dict[str, Any]],
+    recent_messages: List[BaseMessage],
+    target_total: int,
+    local_blueprint: ActivitiesBlueprintOutput,
+    parser: PydanticOutputParser,
+) -> Dict[str, Any]:
+    return {
+        "conversation_context": (
+            create_conversation_context(recent_messages[:-1], "create_activities_blueprint") if recent_messages else ""
+        ),
+        "user_profile_context": create_user_context(user_profile, "create_activities_blueprint"),
+        "user_query": recent_messages[-1].content if recent_messages else "",
+        "target_total": target_total,
+        "local_blueprint": compact_json(local_blueprint.dict()),
+        "format_instructions": parser.get_format_instructions(),
+    }
+
+
+def _use_llm(refine_with_llm: Optional[bool]) -> bool:
+    return BLUEPRINT_SETTINGS["refine_with_llm"] if refine_with_llm is None else refine_with_llm
+
+
+def _check_total(result: ActivitiesBlueprintOutput, target_total: int) -> ActivitiesBlueprintOutput:
+    counted = sum(c.existing + c.missing for c in result.categories)
+
+    if counted != target_total or result.total != target_total:
+        raise ValueError(f"Blueprint counts sum to {counted} (total {result.total}), expected {target_total}")
+
+    return result
+
+
+def generate_activities_blueprint(
+    user_profile: Optional[Dict[str, Any]],
+    recent_messages: List[BaseMessage],
+    target_total: int = 10,
+    refine_with_llm: Optional[bool] = None,
+) -> ActivitiesBlueprintOutput:
+    """Typed core of `create_activities_blueprint`.
+
+    Returns the local blueprint unless LLM refinement is enabled; a failed refinement also falls back to it.
+    """
+    return run_sync(agenerate_activities_blueprint(user_profile, recent_messages, target_total, refine_with_llm))
+
+
+async def agenerate_activities_blueprint(
+    user_profile: Optional[Dict[str, Any]],
+    recent_messages: List[BaseMessage],
+    target_total: int = 10,
+    refine_with_llm: Optional[bool] = None,
+) -> ActivitiesBlueprintOutput:
+    """Async variant of `generate_activities_blueprint`."""
+    local_blueprint = ActivitiesBlueprintOutput(**compute_blueprint(user_profile, target_total))
+
+    if not _use_llm(refine_with_llm):
+        return local_blueprint
+
+    parser = PydanticOutputParser(pydantic_object=ActivitiesBlueprintOutput)
+    chain = create_activities_blueprint_prompt_template() | get_llm(**LLM_SETTINGS) | parser
+    inputs = _build_inputs(user_profile, recent_messages, target_total, local_blueprint, parser)
+
+    max_retries = 3
+
+    for attempt in range(max_retries):
+        try:
+            config = metrics_config("create_activities_blueprint", "blueprint", attempt)
+
+            return _check_total(await chain.ainvoke(inputs, config=config), target_total)
+
+        except Exception:
+            continue
+
+    return local_blueprint
+
+
 @tool("create_activities_blueprint", args_schema=ActivitiesBlueprintInput, return_direct=False)
 def create_activities_blueprint(
     user_profile: Optional[Dict[str, Any]],
     recent_messages: List[BaseMessage],
     target_total: int = 10,
+    refine_with_llm: Optional[bool] = None,
 ) -> str:
     """Generate per-category counts and a total as a valid JSON object.
 
@@ -105,46 +184,25 @@ def create_activities_blueprint(
     - Categories can have any non-negative counts; include as many as justified by the profile/context.
     - Output a JSON object with 'categories' array and 'total' field.
     - The TOTAL number of activities across all categories (Existing + Missing) MUST be exactly {target_total}. If fewer exist, add Missing to reach {target_total}; if more, select the most representative {target_total} to count.
+    - Counts are computed locally from the profile and corpus priors; the LLM only refines them when enabled.
     """
 
-    conversation_context = create_conversation_context(recent_messages[:-1]) if recent_messages else ""
-    user_profile_context = create_user_context(user_profile)
-    last_user_query = recent_messages[-1].content if recent_messages else ""
+    result = generate_activities_blueprint(user_profile, recent_messages, target_total, refine_with_llm)
 
-    parser = PydanticOutputParser(pydantic_object=ActivitiesBlueprintOutput)
-    prompt = create_activities_blueprint_prompt_template()
+    return compact_json(result.dict())
 
-    chain = prompt | llm | parser
 
-    max_retries = 3
+async def acreate_activities_blueprint(
+    user_profile: Optional[Dict[str, Any]],
+    recent_messages: List[BaseMessage],
+    target_total: int = 10,
+    refine_with_llm: Optional[bool] = None,
+) -> str:
+    """Async variant of `create_activities_blueprint`."""
 
-    for attempt in range(max_retries):
-        try:
-            result = chain.invoke(
-                {
-                    "conversation_context": conversation_context,
-                    "user_profile_context": user_profile_context,
-                    "user_query": last_user_query,
-                    "target_total": target_total,
-                    "format_instructions": parser.get_format_instructions(),
-                }
-            )
-
-            return json.dumps(result.dict(), indent=2)
+    result = await agenerate_activities_blueprint(user_profile, recent_messages, target_total, refine_with_llm)
 
-        except Exception:
-            continue
+    return compact_json(result.dict())
 
-    # Fallback: return JSON with exactly target_total, omitting empty categories
-    categories_used = ACTIVITY_CATEGORIES[:3]
-    per_category = target_total // 3
-    remainder = target_total % 3
-    counts_missing = [per_category + (1 if i < remainder else 0) for i in range(3)]
-
-    fallback_output = {
-        "categories": [
-            {"category": cat, "existing": 0, "missing": m} for cat, m in zip(categories_used, counts_missing)
-        ],
-        "total": target_total,
-    }
-    return json.dumps(fallback_output, indent=2)
+
+create_activities_blueprint.coroutine = acreate_activities_blueprint
@@ -1,17 +1,45 @@
+import asyncio
 import json
+import os
 import re
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Union
 
-from langchain_openai import AzureChatOpenAI
 from langchain_core.output_parsers import PydanticOutputParser
 from langchain_core.prompts import ChatPromptTemplate
 from pydantic import BaseModel, Field
 from langchain_core.tools import tool
 from langchain_core.messages import BaseMessage
 
-from tools.utils import create_conversation_context, create_user_context
+from tools.create_activities_blueprint import ActivitiesBlueprintOutput
+from tools.instrumentation import metrics_config
+from tools.llm import get_llm
+from tools.utils import (
+    _strip_fences_and_labels,
+    compact_json,
+    create_conversation_context,
+    create_user_context,
+    prompt_json,
+    run_sync,
+)
 
-llm = AzureChatOpenAI(deployment_name="gpt-4o", temperature=0.7, max_tokens=4000)
+LLM_SETTINGS = {"deployment_name": "gpt-4o", "temperature": 0.7, "max_tokens": 4000}
+
+# Fan-out mode: one smaller call per blueprint category plus one for the overview fields, run concurrently
+CATEGORY_LLM_SETTINGS = {"deployment_name": "gpt-4o", "temperature": 0.7, "max_tokens": 1500}
+OVERVIEW_LLM_SETTINGS = {"deployment_name": "gpt-4o", "temperature": 0.7, "max_tokens": 500}
+
+FAN_OUT_SETTINGS: Dict[str, Any] = {
+    "enabled": os.getenv("ACTIVITY_IDEAS_FAN_OUT", "1") == "1",
+    "max_concurrency": int(os.getenv("ACTIVITY_IDEAS_MAX_CONCURRENCY", "4")),
+}
+
+EXPECTED_TOTAL = 10
+
+# A blueprint arrives as the typed stage output from create_activity_list or as JSON/counts text from a caller
+Blueprint = Union[ActivitiesBlueprintOutput, str, None]
+
+# Bump whenever the prompt or output schema changes; part of the response cache key
+PROMPT_VERSION = "4"
 
 
 class ExistingEnhancement(BaseModel):
@@ -117,12 +145,61 @@ class ActivityIdeasOutput(BaseModel):
     )
 
 
+class IdeasOverview(BaseModel):
+    student_theme: Optional[str] = Field(
+        None, description="Optional throughline inferred from the blueprint and profile, connecting to future goals"
+    )
+    future_goals_summary: Optional[str] = Field(
+        None, description="Brief summary of student's stated future goals and intended trajectory"
+    )
+    top_priorities: List[str] = Field(
+        default_factory=list,
+        description="3-5 recommended focus items to execute next that strengthen narrative coherence",
+    )
+
+
 class ActivityIdeasInput(BaseModel):
     user_profile: Optional[Dict[str, Any]] = Field(None, description="Complete user profile")
     recent_messages: List[BaseMessage] = Field(..., description="Recent conversation messages")
     blueprint_json: Optional[str] = Field(
         None, description="Counts-only Activities Blueprint text; used to enforce per-category totals summing to 10"
     )
+    fan_out: Optional[bool] = Field(
+        None, description="Generate each blueprint category in its own concurrent call; defaults to FAN_OUT_SETTINGS"
+    )
+
+
+_ALIGNMENT_RULES = (
+    "CRITICAL ALIGNMENT REQUIREMENT:\n"
+    "- EVERY activity (both existing enhancements and new ideas) MUST align with the student's narrative and future "
+    "goals.\n"
+    "- Explicitly identify the student's future goals, intended major/career path, and personal narrative from the "
+    "profile and conversation.\n"
+    "- When enhancing existing activities, frame them to show clear progression toward their future goals.\n"
+    "- When developing missing activities, ensure they fill gaps that strengthen the narrative arc toward their "
+    "aspirations.\n"
+    "- The connection between each activity and future goals should be explicit and defensible in an interview.\n"
+    "- Avoid generic activities that don't tie to the student's specific trajectory.\n\n"
+)
+
+_TIME_COMMITMENT_RULES = (
+    "TIME COMMITMENT & PARTICIPATION TRACKING:\n"
+    "- For EACH activity, provide realistic hours_per_week (1-40), weeks_per_year (1-52), and participation_grades.\n"
+    "- Hours should be defensible: a student can't commit 40 hrs/week to 10 different activities.\n"
+    "- Total weekly hours across all activities should not exceed 50-60 hours (assuming 15-20 hrs available after "
+    "school/sleep/homework).\n"
+    "- Year-round activities: 48-52 weeks/year; School-year only: 30-36 weeks/year; Summer programs: 8-12 weeks/year.\n"
+    "- participation_grades should reflect when the student started or plans to start (e.g., ['9','10','11','12'] for "
+    "4-year commitment).\n"
+    "- Balance depth (multi-year commitment, higher hours) with breadth (variety of activities).\n\n"
+)
+
+_JSON_OUTPUT_RULES = (
+    "- Your response MUST be a valid JSON object that can be parsed without errors.\n"
+    "- Do NOT include any text before or after the JSON object.\n"
+    "- Do NOT use markdown code blocks or backticks.\n"
+    "- Ensure all strings are properly escaped and all brackets/braces are balanced.\n"
+)
 
 
 def create_activity_ideas_prompt_template() -> ChatPromptTemplate:
@@ -130,21 +207,9 @@ def create_activity_ideas_prompt_template() -> ChatPromptTemplate:
         "You are an elite U.S. college admissions strategist.\n"
         "Generate exactly 10 activities distributed across categories per the provided counts-only Activities Blueprint.\n"
         "Use the student's profile and conversation context to make each idea authentic and interview-defensible.\n\n"
-        "CRITICAL ALIGNMENT REQUIREMENT:\n"
-        "- EVERY activity (both existing enhancements and new ideas) MUST align with the student's narrative and future goals.\n"
-        "- Explicitly identify the student's future goals, intended major/career path, and personal narrative from the profile and conversation.\n"
-        "- When enhancing existing activities, frame them to show clear progression toward their future goals.\n"
-        "- When developing missing activities, ensure they fill gaps that strengthen the narrative arc toward their aspirations.\n"
-        "- The connection between each activity and future goals should be explicit and defensible in an interview.\n"
-        "- Avoid generic activities that don't tie to the student's specific trajectory.\n\n"
-        "TIME COMMITMENT & PARTICIPATION TRACKING:\n"
-        "- For EACH activity, provide realistic hours_per_week (1-40), weeks_per_year (1-52), and participation_grades.\n"
-        "- Hours should be defensible: a student can't commit 40 hrs/week to 10 different activities.\n"
-        "- Total weekly hours across all activities should not exceed 50-60 hours (assuming 15-20 hrs available after school/sleep/homework).\n"
-        "- Year-round activities: 48-52 weeks/year; School-year only: 30-36 weeks/year; Summer programs: 8-12 weeks/year.\n"
-        "- participation_grades should reflect when the student started or plans to start (e.g., ['9','10','11','12'] for 4-year commitment).\n"
-        "- Balance depth (multi-year commitment, higher hours) with breadth (variety of activities).\n\n"
-        "INSTRUCTIONS:\n"
+        + _ALIGNMENT_RULES
+        + _TIME_COMMITMENT_RULES
+        + "INSTRUCTIONS:\n"
         "- The blueprint provides category lines like '- <Category>: Existing: N | Missing: M' and a final total of 10.\n"
         "- For each category, create N 'Existing' ideas (refine/strengthen plausible existing items) and M 'Generated' ideas.\n"
         "- Sum across categories MUST equal 10. Do not add or remove categories beyond those present in the blueprint counts.\n"
@@ -152,11 +217,8 @@ def create_activity_ideas_prompt_template() -> ChatPromptTemplate:
         "- Keep ideas realistic and defensible; avoid inflated claims.\n"
         "- Ensure narrative coherence: activities should tell a cohesive story that leads to their stated future goals.\n\n"
         "OUTPUT RULES:\n"
-        "- Your response MUST be a valid JSON object that can be parsed without errors.\n"
-        "- Do NOT include any text before or after the JSON object.\n"
-        "- Do NOT use markdown code blocks or backticks.\n"
-        "- Ensure all strings are properly escaped and all brackets/braces are balanced.\n"
-        "- Populate 'categories' with one entry per category present in the blueprint counts.\n"
+        + _JSON_OUTPUT_RULES
+        + "- Populate 'categories' with one entry per category present in the blueprint counts.\n"
         "- Put refined existing items in 'existing_enhancements' and generated items in 'developed_missing_ideas'.\n"
         "- The total number of items across all categories (existing_enhancements + developed_missing_ideas) MUST be 10.\n\n"
         "{format_instructions}\n\n"
@@ -180,28 +242,108 @@ def create_activity_ideas_prompt_template() -> ChatPromptTemplate:
     )
 
 
-@tool("create_activity_ideas", args_schema=ActivityIdeasInput, return_direct=False)
-def create_activity_ideas(
-    user_profile: Optional[Dict[str, Any]],
-    recent_messages: List[BaseMessage],
-    blueprint_json: Optional[str] = None,
-) -> str:
-    """Generate exactly 10 activities distributed per counts-only Activities Blueprint, strongly aligned with student's narrative and future goals.
+def create_category_ideas_prompt_template() -> ChatPromptTemplate:
+    system_prompt = (
+        "You are an elite U.S. college admissions strategist.\n"
+        "Generate the activities for ONE category of the student's 10-activity list: {category}.\n"
+        "The other categories ({other_categories}) are generated separately; do not duplicate their content.\n"
+        "Use the student's profile and conversation context to make each idea authentic and interview-defensible.\n\n"
+        + _ALIGNMENT_RULES
+        + _TIME_COMMITMENT_RULES
+        + "INSTRUCTIONS:\n"
+        "- Create exactly {existing} 'Existing' ideas (refine/strengthen plausible existing items) in "
+        "'existing_enhancements'.\n"
+        "- Create exactly {missing} 'Generated' ideas in 'developed_missing_ideas'.\n"
+        "- Prefer overlooked communities, unexpected methods, measurable results, and clear alignment with the "
+        "student's future plans.\n"
+        "- Keep ideas realistic and defensible; avoid inflated claims.\n\n"
+        "OUTPUT RULES:\n"
+        + _JSON_OUTPUT_RULES
+        + "- Set 'category' to exactly: {category}\n\n"
+        "{format_instructions}\n\n"
+        "CONTEXT:\n"
+        "{user_profile_context}\n"
+    )
 
-    - Parses counts-only blueprint lines: "- <Category>: Existing: N | Missing: M" plus the final total line.
-    - Produces ideas such that the sum across categories equals 10.
-    - Uses student's profile and conversation context for authenticity.
-    - EVERY activity (existing enhancements and new ideas) MUST align with the student's narrative and future goals.
-    - Ensures narrative coherence: activities tell a cohesive story leading to stated future aspirations.
-    - Includes realistic time commitment tracking: hours_per_week, weeks_per_year, and participation_grades for each activity.
-    - Validates total time commitments are realistic and defensible for college applications.
-    """
+    user_prompt = (
+        "{conversation_context}\n\n"
+        "USER QUERY: {user_query}\n"
+        "Produce the {category} activities now. Ensure EVERY activity strongly aligns with the student's narrative "
+        "and future goals."
+    )
+
+    return ChatPromptTemplate.from_messages(
+        [
+            ("system", system_prompt),
+            ("user", user_prompt),
+        ]
+    )
 
-    conversation_context = create_conversation_context(recent_messages[:-1])
-    user_profile_context = create_user_context(user_profile)
 
+def create_ideas_overview_prompt_template() -> ChatPromptTemplate:
+    system_prompt = (
+        "You are an elite U.S. college admissions strategist.\n"
+        "Summarize the throughline of the student's activity list before the individual activities are written.\n"
+        "Identify the student's future goals, intended major/career path, and personal narrative from the profile and "
+        "conversation.\n\n"
+        "OUTPUT RULES:\n"
+        + _JSON_OUTPUT_RULES
+        + "- 'top_priorities' lists 3-5 recommended focus items that strengthen narrative coherence across the "
+        "categories.\n\n"
+        "{format_instructions}\n\n"
+        "CONTEXT:\n"
+        "{user_profile_context}\n"
+        "BLUEPRINT COUNTS (counts-only text):\n"
+        "{blueprint_counts}\n"
+    )
+
+    user_prompt = "{conversation_context}\n\nUSER QUERY: {user_query}\nProduce the summary now."
+
+    return ChatPromptTemplate.from_messages(
+        [
+            ("system", system_prompt),
+            ("user", user_prompt),
+        ]
+    )
+
+
+# Parse counts from the blueprint: ActivitiesBlueprintOutput JSON or counts-only text
+def parse_counts(text: str) -> List[Dict[str, Any]]:
+    counts: List[Dict[str, Any]] = []
+    if not text:
+        return counts
+    try:
+        data = json.loads(_strip_fences_and_labels(text))
+    except (json.JSONDecodeError, TypeError):
+        data = None
+    if isinstance(data, dict) and isinstance(data.get("categories"), list):
+        for item in data["categories"]:
+            try:
+                category, existing, missing = str(item["category"]), int(item["existing"]), int(item["missing"])
+            except (KeyError, TypeError, ValueError):
+                continue
+            counts.append({"category": category, "existing": existing, "missing": missing})
+        return counts
+    # Example line: "- Category: Existing: 1 | Missing: 2"
+    line_pattern = re.compile(r"^\s*-\s*(.+?):\s*Existing:\s*(\d+)\s*\|\s*Missing:\s*(\d+)\s*$")
+    for raw_line in text.splitlines():
+        m = line_pattern.match(raw_line.strip())
+        if m:
+            cat = m.group(1).strip()
+            existing = int(m.group(2))
+            missing = int(m.group(3))
+            counts.append({"category": cat, "existing": existing, "missing": missing})
+    return counts
+
+
+def _build_inputs(
+    user_profile: Optional[Dict[str, Any]],
+    recent_messages: List[BaseMessage],
+    blueprint: Blueprint,
+    parser: PydanticOutputParser,
+) -> Dict[str, Any]:
     # Try to auto-detect blueprint counts text from the latest message if not provided explicitly
-    detected_blueprint = blueprint_json or ""
+    detected_blueprint = prompt_json(blueprint)
     try:
         last_msg = recent_messages[-1].content if recent_messages else ""
         # Heuristic: if last message looks like JSON, include it verbatim
@@ -214,44 +356,192 @@ def create_activity_ideas(
     except Exception:
         pass
 
-    # Parse counts from the counts-only blueprint text
-    def parse_counts(text: str) -> List[Dict[str, Any]]:
-        counts: List[Dict[str, Any]] = []
-        if not text:
-            return counts
-        # Example line: "- Category: Existing: 1 | Missing: 2"
-        line_pattern = re.compile(r"^\s*-\s*(.+?):\s*Existing:\s*(\d+)\s*\|\s*Missing:\s*(\d+)\s*$")
-        for raw_line in text.splitlines():
-            m = line_pattern.match(raw_line.strip())
-            if m:
-                cat = m.group(1).strip()
-                existing = int(m.group(2))
-                missing = int(m.group(3))
-                counts.append({"category": cat, "existing": existing, "missing": missing})
-        return counts
+    return {
+        "conversation_context": create_conversation_context(recent_messages[:-1], "create_activity_ideas"),
+        "user_profile_context": create_user_context(user_profile, "create_activity_ideas"),
+        "user_query": recent_messages[-1].content if recent_messages else "",
+        "blueprint_counts": detected_blueprint,
+        "format_instructions": parser.get_format_instructions(),
+    }
+
+
+def _fan_out_counts(blueprint: Blueprint, blueprint_counts: str, fan_out: Optional[bool]) -> List[Dict[str, Any]]:
+    """Per-category counts to fan out over, or an empty list when the single-call path should be used."""
+    if not (FAN_OUT_SETTINGS["enabled"] if fan_out is None else fan_out):
+        return []
+
+    if isinstance(blueprint, ActivitiesBlueprintOutput):
+        counts = [c.dict() for c in blueprint.categories]
+    else:
+        counts = parse_counts(blueprint_counts)
+
+    counts = [c for c in counts if c["existing"] + c["missing"] > 0]
+
+    if len(counts) < 2 or sum(c["existing"] + c["missing"] for c in counts) != EXPECTED_TOTAL:
+        return []
+
+    return counts
 
-    parser = PydanticOutputParser(pydantic_object=ActivityIdeasOutput)
-    prompt = create_activity_ideas_prompt_template()
 
-    chain = prompt | llm | parser
+def _fit_category(result: CategoryIdeas, count: Dict[str, Any]) -> CategoryIdeas:
+    """Trim surplus items to the blueprint counts; a shortfall is an error so the category is retried."""
+    existing = result.existing_enhancements[: count["existing"]]
+    missing = result.developed_missing_ideas[: count["missing"]]
+
+    if len(existing) < count["existing"] or len(missing) < count["missing"]:
+        raise ValueError(
+            f"{count['category']}: expected {count['existing']} existing and {count['missing']} new ideas, "
+            f"got {len(existing)} and {len(missing)}"
+        )
+
+    return CategoryIdeas(category=count["category"], existing_enhancements=existing, developed_missing_ideas=missing)
+
+
+async def _agenerate_category(
+    base_inputs: Dict[str, Any], count: Dict[str, Any], other_categories: List[str], semaphore: asyncio.Semaphore
+) -> CategoryIdeas:
+    parser = PydanticOutputParser(pydantic_object=CategoryIdeas)
+    chain = create_category_ideas_prompt_template() | get_llm(**CATEGORY_LLM_SETTINGS) | parser
+    inputs = {
+        **base_inputs,
+        "format_instructions": parser.get_format_instructions(),
+        "category": count["category"],
+        "existing": count["existing"],
+        "missing": count["missing"],
+        "other_categories": ", ".join(other_categories) or "none",
+    }
 
     max_retries = 3
+    last_error: Optional[Exception] = None
 
     for attempt in range(max_retries):
         try:
-            result = chain.invoke(
-                {
-                    "conversation_context": conversation_context,
-                    "user_profile_context": user_profile_context,
-                    "user_query": recent_messages[-1].content if recent_messages else "",
-                    "blueprint_counts": detected_blueprint,
-                    "format_instructions": parser.get_format_instructions(),
-                }
-            )
-
-            return json.dumps(result.dict(), indent=2)
+            config = metrics_config("create_activity_ideas", "category", attempt)
+
+            async with semaphore:
+                result = await chain.ainvoke(inputs, config=config)
+
+            return _fit_category(result, count)
 
         except Exception as e:
-            return f"Error: {str(e)}"
+            last_error = e
+
+    raise ValueError(f"Category '{count['category']}' failed after {max_retries} attempts: {last_error}")
+
+
+async def _agenerate_overview(base_inputs: Dict[str, Any], semaphore: asyncio.Semaphore) -> IdeasOverview:
+    parser = PydanticOutputParser(pydantic_object=IdeasOverview)
+    chain = create_ideas_overview_prompt_template() | get_llm(**OVERVIEW_LLM_SETTINGS) | parser
+    inputs = {**base_inputs, "format_instructions": parser.get_format_instructions()}
+
+    try:
+        async with semaphore:
+            return await chain.ainvoke(inputs, config=metrics_config("create_activity_ideas", "overview"))
+    except Exception:
+        # The overview fields are optional in ActivityIdeasOutput; the category ideas are what matters
+        return IdeasOverview()
+
+
+async def _afan_out(base_inputs: Dict[str, Any], counts: List[Dict[str, Any]]) -> ActivityIdeasOutput:
+    """Generate every category concurrently (bounded by FAN_OUT_SETTINGS) and merge into ActivityIdeasOutput."""
+    semaphore = asyncio.Semaphore(FAN_OUT_SETTINGS["max_concurrency"])
+    names = [c["category"] for c in counts]
+
+    overview, *categories = await asyncio.gather(
+        _agenerate_overview(base_inputs, semaphore),
+        *(
+            _agenerate_category(base_inputs, count, [n for n in names if n != count["category"]], semaphore)
+            for count in counts
+        ),
+    )
+
+    total = sum(len(c.existing_enhancements) + len(c.developed_missing_ideas) for c in categories)
+
+    if total != EXPECTED_TOTAL:
+        raise ValueError(f"Merged ideas total {total}, expected {EXPECTED_TOTAL}")
+
+    return ActivityIdeasOutput(
+        student_theme=overview.student_theme,
+        future_goals_summary=overview.future_goals_summary,
+        categories=categories,
+        top_priorities=overview.top_priorities,
+    )
+
+
+def generate_activity_ideas(
+    user_profile: Optional[Dict[str, Any]],
+    recent_messages: List[BaseMessage],
+    blueprint: Blueprint = None,
+    fan_out: Optional[bool] = None,
+) -> ActivityIdeasOutput:
+    """Typed core of `create_activity_ideas`; raises when generation or validation fails.
+
+    A thin wrapper over `agenerate_activity_ideas`. On the shared background loop itself (a sync call from one of its
+    coroutines) it raises RuntimeError rather than block that loop; await `agenerate_activity_ideas` there instead.
+    """
+    return run_sync(agenerate_activity_ideas(user_profile, recent_messages, blueprint, fan_out))
+
+
+async def agenerate_activity_ideas(
+    user_profile: Optional[Dict[str, Any]],
+    recent_messages: List[BaseMessage],
+    blueprint: Blueprint = None,
+    fan_out: Optional[bool] = None,
+) -> ActivityIdeasOutput:
+    """Async variant of `generate_activity_ideas`."""
+    parser = PydanticOutputParser(pydantic_object=ActivityIdeasOutput)
+    inputs = _build_inputs(user_profile, recent_messages, blueprint, parser)
+    counts = _fan_out_counts(blueprint, inputs["blueprint_counts"], fan_out)
+
+    if counts:
+        return await _afan_out(inputs, counts)
+
+    chain = create_activity_ideas_prompt_template() | get_llm(**LLM_SETTINGS) | parser
+
+    return await chain.ainvoke(inputs, config=metrics_config("create_activity_ideas", "ideas"))
+
+
+@tool("create_activity_ideas", args_schema=ActivityIdeasInput, return_direct=False)
+def create_activity_ideas(
+    user_profile: Optional[Dict[str, Any]],
+    recent_messages: List[BaseMessage],
+    blueprint_json: Optional[str] = None,
+    fan_out: Optional[bool] = None,
+) -> str:
+    """Generate exactly 10 activities distributed per counts-only Activities Blueprint, strongly aligned with student's narrative and future goals.
+
+    - Parses the blueprint JSON or counts-only lines: "- <Category>: Existing: N | Missing: M" plus the final total line.
+    - In fan-out mode each category is generated by its own concurrent call and the merged total is checked locally.
+    - Produces ideas such that the sum across categories equals 10.
+    - Uses student's profile and conversation context for authenticity.
+    - EVERY activity (existing enhancements and new ideas) MUST align with the student's narrative and future goals.
+    - Ensures narrative coherence: activities tell a cohesive story leading to stated future aspirations.
+    - Includes realistic time commitment tracking: hours_per_week, weeks_per_year, and participation_grades for each activity.
+    - Validates total time commitments are realistic and defensible for college applications.
+    """
+
+    try:
+        result = generate_activity_ideas(user_profile, recent_messages, blueprint_json, fan_out)
+    except Exception as e:
+        return f"Error: {str(e)}"
+
+    return compact_json(result.dict())
+
+
+async def acreate_activity_ideas(
+    user_profile: Optional[Dict[str, Any]],
+    recent_messages: List[BaseMessage],
+    blueprint_json: Optional[str] = None,
+    fan_out: Optional[bool] = None,
+) -> str:
+    """Async variant of `create_activity_ideas`."""
+
+    try:
+        result = await agenerate_activity_ideas(user_profile, recent_messages, blueprint_json, fan_out)
+    except Exception as e:
+        return f"Error: {str(e)}"
+
+    return compact_json(result.dict())
+
 
-    return json.dumps({"error": "Maximum retries exceeded"}, indent=2)
+create_activity_ideas.coroutine = acreate_activity_ideas
@@ -1,13 +1,28 @@
 import json
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Awaitable, Callable, Type
 
 from pydantic import BaseModel, Field
 from langchain_core.tools import tool
 from langchain_core.messages import BaseMessage
 
-from .create_activities_blueprint import create_activities_blueprint
-from .create_activity_ideas import create_activity_ideas
-from .format_activity_list import format_activity_list
+from .create_activities_blueprint import (
+    ActivitiesBlueprintOutput,
+    agenerate_activities_blueprint,
+    PROMPT_VERSION as BLUEPRINT_PROMPT_VERSION,
+)
+from .create_activity_ideas import ActivityIdeasOutput, agenerate_activity_ideas, PROMPT_VERSION as IDEAS_PROMPT_VERSION
+from .format_activity_list import aformat_activities, PROMPT_VERSION as FORMAT_PROMPT_VERSION
+from tools.checkpoints import CheckpointStore, get_checkpoint_store, pipeline_run_id
+from tools.response_cache import profile_hash
+from tools.utils import compact_json, run_sync
+
+# Response cache key component; changes whenever any stage's prompt version does
+PROMPT_VERSION = f"2:{BLUEPRINT_PROMPT_VERSION}:{IDEAS_PROMPT_VERSION}:{FORMAT_PROMPT_VERSION}"
+
+PIPELINE = "create_activity_list"
+
+# Pipeline order; every stage except the last is checkpointed, the final formatting always runs
+STAGES = ("blueprint", "ideas", "format")
 
 
 class CreateActivityListInput(BaseModel):
@@ -16,6 +31,40 @@ class CreateActivityListInput(BaseModel):
     include_intermediate: bool = Field(
         False, description="Include intermediate blueprint and ideas in the final output"
     )
+    run_id: Optional[str] = Field(
+        None, description="Pipeline run to resume; defaults to the run derived from the profile and latest message"
+    )
+    regenerate: Optional[str] = Field(
+        None,
+        description=(
+            "Recompute this stage (blueprint, ideas or format) and every later one, reusing the earlier stages of "
+            "the profile's latest run"
+        ),
+    )
+    use_cache: bool = Field(True, description="Reuse checkpointed stages; False recomputes every stage")
+
+
+async def _checkpointed(
+    store: Optional[CheckpointStore],
+    run_id: str,
+    profile: str,
+    stage: str,
+    model: Type[BaseModel],
+    produce: Callable[[], Awaitable[BaseModel]],
+    use_cache: bool = True,
+) -> BaseModel:
+    # Bypassing skips the lookup only; the fresh output still replaces the stage's checkpoint
+    cached = store.load(run_id, stage) if store and use_cache else None
+
+    if cached is not None:
+        return model.parse_obj(json.loads(cached))
+
+    output = await produce()
+
+    if store:
+        store.save(run_id, stage, PIPELINE, profile, compact_json(output.dict()))
+
+    return output
 
 
 @tool("create_activity_list", args_schema=CreateActivityListInput, return_direct=False)
@@ -23,57 +72,97 @@ def create_activity_list(
     user_profile: Optional[Dict[str, Any]],
     recent_messages: List[BaseMessage],
     include_intermediate: bool = True,
+    run_id: Optional[str] = None,
+    regenerate: Optional[str] = None,
+    use_cache: bool = True,
 ) -> str:
     """Run sequential workflow: activities_blueprint -> activity_ideas -> format_activity_list.
     Returns a consolidated JSON object including all stages when include_intermediate=True;
     otherwise returns only the final formatted activities JSON.
     """
 
-    result: Dict[str, Any] = {}
+    return run_sync(
+        acreate_activity_list(user_profile, recent_messages, include_intermediate, run_id, regenerate, use_cache)
+    )
+
+
+async def acreate_activity_list(
+    user_profile: Optional[Dict[str, Any]],
+    recent_messages: List[BaseMessage],
+    include_intermediate: bool = True,
+    run_id: Optional[str] = None,
+    regenerate: Optional[str] = None,
+    use_cache: bool = True,
+) -> str:
+    """Async variant of `create_activity_list`.
+
+    Stages hand their Pydantic outputs to each other directly; JSON is only produced for the next stage's prompt
+    and for the final response. The blueprint and ideas are checkpointed under the run ID (returned with errors and
+    intermediate output), so retrying after a formatting failure only repeats the formatting call.
+    """
+
+    if regenerate is not None and regenerate not in STAGES:
+        return json.dumps({"error": f"Unknown stage '{regenerate}'. Expected one of {list(STAGES)}"}, indent=2)
+
+    store = get_checkpoint_store()
+    profile = profile_hash(user_profile)
+
+    if run_id is None:
+        run_id = pipeline_run_id(PIPELINE, user_profile, recent_messages, PROMPT_VERSION)
+
+        # A regenerate request worded differently from the original has no checkpoints of its own; only then fall
+        # back to the profile's most recent run, so another query's run is never overwritten when this one exists
+        if regenerate and store and not store.has_run(run_id):
+            run_id = store.latest_run(PIPELINE, profile) or run_id
+
+    if regenerate and store:
+        store.discard(run_id, STAGES[STAGES.index(regenerate) :])
+
+    result: Dict[str, Any] = {"run_id": run_id}
 
     # Step 1: Create Activities Blueprint
     try:
-        blueprint_text = create_activities_blueprint.invoke(
-            {"user_profile": user_profile, "recent_messages": recent_messages}
+        blueprint = await _checkpointed(
+            store,
+            run_id,
+            profile,
+            "blueprint",
+            ActivitiesBlueprintOutput,
+            lambda: agenerate_activities_blueprint(user_profile, recent_messages),
+            use_cache,
         )
-        blueprint_json = json.loads(blueprint_text)
         if include_intermediate:
-            result["activities_blueprint"] = blueprint_json
+            result["activities_blueprint"] = blueprint.dict()
     except Exception as e:
-        return json.dumps({"error": f"Blueprint error: {str(e)}"}, indent=2)
+        return json.dumps({"error": f"Blueprint error: {str(e)}", "run_id": run_id}, indent=2)
 
     # Step 2: Create Activity Ideas (grounded by blueprint)
     try:
-        ideas_text = create_activity_ideas.invoke(
-            {
-                "user_profile": user_profile,
-                "recent_messages": recent_messages,
-                "blueprint_json": blueprint_text,
-            }
+        ideas = await _checkpointed(
+            store,
+            run_id,
+            profile,
+            "ideas",
+            ActivityIdeasOutput,
+            lambda: agenerate_activity_ideas(user_profile, recent_messages, blueprint),
+            use_cache,
         )
-        ideas_json = json.loads(ideas_text)
         if include_intermediate:
-            result["activity_ideas"] = ideas_json
+            result["activity_ideas"] = ideas.dict()
     except Exception as e:
-        return json.dumps({"error": f"Ideas error: {str(e)}"}, indent=2)
+        return json.dumps({"error": f"Ideas error: {str(e)}", "run_id": run_id}, indent=2)
 
     # Step 3: Format Activity List (grounded by blueprint + ideas)
     try:
-        formatted_text = format_activity_list.invoke(
-            {
-                "user_profile": user_profile,
-                "recent_messages": recent_messages,
-                "blueprint_json": blueprint_text,
-                "ideas_json": ideas_text,
-                "as_text": False,
-            }
-        )
-        formatted_json = json.loads(formatted_text)
+        formatted = await aformat_activities(user_profile, recent_messages, blueprint, ideas)
         if include_intermediate:
-            result["formatted_activity_list"] = formatted_json
+            result["formatted_activity_list"] = formatted.dict()
         else:
-            return formatted_text
+            return compact_json(formatted.dict())
     except Exception as e:
-        return json.dumps({"error": f"Formatting error: {str(e)}"}, indent=2)
+        return json.dumps({"error": f"Formatting error: {str(e)}", "run_id": run_id}, indent=2)
+
+    return compact_json(result)
+
 
-    return json.dumps(result, indent=2)
+create_activity_list.coroutine = acreate_activity_list
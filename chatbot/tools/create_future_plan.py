@@ -3,22 +3,26 @@ Future plan generation tool for college application strategy.
 Generates a single ≤100 character future plan line based on user context.
 """
 
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterator
 
 from langchain_core.runnables import Runnable
-from langchain_openai import AzureChatOpenAI
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.prompts import ChatPromptTemplate
 from pydantic import BaseModel, Field
 
 from langchain_core.tools import tool
 
-from tools.utils import create_conversation_context, create_user_context
+from tools.instrumentation import metrics_config
+from tools.llm import get_llm
+from tools.utils import create_conversation_context, create_user_context, run_sync
 
 from langchain_core.messages import BaseMessage
 
 
-llm = AzureChatOpenAI(deployment_name="gpt-4o")
+LLM_SETTINGS = {"deployment_name": "gpt-4o"}
+
+# Bump whenever the prompt or output schema changes; part of the response cache key
+PROMPT_VERSION = "3"
 
 
 def create_future_plan_prompt_template() -> ChatPromptTemplate:
@@ -68,20 +72,38 @@ class FuturePlanInput(BaseModel):
     recent_messages: List[BaseMessage] = Field(..., description="Recent conversation messages")
 
 
+def _build_chain() -> Runnable:
+    prompt: ChatPromptTemplate = create_future_plan_prompt_template()
+
+    return prompt | get_llm(**LLM_SETTINGS) | StrOutputParser()
+
+
+def _build_inputs(user_profile: Optional[Dict[str, Any]], recent_messages: List[BaseMessage]) -> Dict[str, Any]:
+    return {
+        "conversation_context": create_conversation_context(recent_messages[:-1], "create_future_plan"),
+        "user_profile_context": create_user_context(user_profile, "create_future_plan"),
+        "user_query": recent_messages[-1].content,
+    }
+
+
 @tool("create_future_plan", args_schema=FuturePlanInput, return_direct=False)
 def create_future_plan(user_profile: Optional[Dict[str, Any]], recent_messages: List[BaseMessage]) -> str:
     """Create a compelling future plan statement for college applications based on user context."""
-    conversation_context = create_conversation_context(recent_messages[:-1])
-    user_profile_context = create_user_context(user_profile)
+    return run_sync(acreate_future_plan(user_profile, recent_messages))
 
-    prompt: ChatPromptTemplate = create_future_plan_prompt_template()
 
-    chain: Runnable = prompt | llm | StrOutputParser()
+async def acreate_future_plan(user_profile: Optional[Dict[str, Any]], recent_messages: List[BaseMessage]) -> str:
+    """Async variant of `create_future_plan`."""
+    inputs = _build_inputs(user_profile, recent_messages)
+    return await _build_chain().ainvoke(inputs, config=metrics_config("create_future_plan", "generate"))
 
-    return chain.invoke(
-        {
-            "conversation_context": conversation_context,
-            "user_profile_context": user_profile_context,
-            "user_query": recent_messages[-1].content,
-        }
-    )
+
+create_future_plan.coroutine = acreate_future_plan
+
+
+def stream_create_future_plan(
+    user_profile: Optional[Dict[str, Any]], recent_messages: List[BaseMessage]
+) -> Iterator[str]:
+    """Yield the future plan line as text chunks while the LLM generates it."""
+    inputs = _build_inputs(user_profile, recent_messages)
+    yield from _build_chain().stream(inputs, config=metrics_config("create_future_plan", "generate"))
@@ -0,0 +1,107 @@
+"""
+Persistent embedding cache keyed on content hash.
+Vectors live in SQLite as float32 bytes under (content hash, embedding deployment), so re-indexing text that has
+been embedded before, by any store or any earlier run, costs no embeddings call.
+"""
+
+import os
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, Optional
+
+import numpy as np
+
+DEFAULT_EMBEDDING_CACHE_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(__file__))), ".cache", "embeddings.db"
+)
+
+EMBEDDING_CACHE_SETTINGS: Dict[str, Any] = {
+    "enabled": os.getenv("EMBEDDING_CACHE_ENABLED", "1") == "1",
+    "path": os.getenv("EMBEDDING_CACHE_PATH", DEFAULT_EMBEDDING_CACHE_PATH),
+}
+
+
+class EmbeddingCache:
+    """SQLite-backed map from (content hash, deployment) to an embedding vector."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "content_hash TEXT NOT NULL, deployment TEXT NOT NULL, vector BLOB NOT NULL, "
+            "PRIMARY KEY (content_hash, deployment))"
+        )
+        self._conn.commit()
+
+    def get_many(self, deployment: str, hashes: Iterable[str]) -> Dict[str, np.ndarray]:
+        wanted = list(dict.fromkeys(hashes))
+        found: Dict[str, np.ndarray] = {}
+
+        with self._lock:
+            # Stay under SQLite's bound-parameter limit
+            for start in range(0, len(wanted), 500):
+                batch = wanted[start : start + 500]
+                rows = self._conn.execute(
+                    "SELECT content_hash, vector FROM embeddings "
+                    f"WHERE deployment = ? AND content_hash IN ({','.join('?' * len(batch))})",
+                    (deployment, *batch),
+                ).fetchall()
+                found.update((key, np.frombuffer(vector, dtype="<f4")) for key, vector in rows)
+
+            self.hits += len(found)
+            self.misses += len(wanted) - len(found)
+
+        return found
+
+    def set_many(self, deployment: str, vectors: Dict[str, Any]) -> None:
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (content_hash, deployment, vector) VALUES (?, ?, ?)",
+                [(key, deployment, np.asarray(v, dtype="<f4").tobytes()) for key, v in vectors.items()],
+            )
+            self._conn.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM embeddings")
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+        lookups = self.hits + self.misses
+
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": entries,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+_cache: Optional[EmbeddingCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """Return the process-wide embedding cache, or None when it is disabled."""
+    global _cache
+
+    if not EMBEDDING_CACHE_SETTINGS["enabled"]:
+        return None
+
+    with _cache_lock:
+        if _cache is None:
+            _cache = EmbeddingCache(EMBEDDING_CACHE_SETTINGS["path"])
+
+        return _cache
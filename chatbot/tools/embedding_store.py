@@ -0,0 +1,283 @@
+"""
+On-disk embedding store: a raw matrix of unit-normalized rows opened with `np.memmap`, plus a JSON sidecar.
+
+    <store>/vectors.bin   count x dim little-endian float32 (or float16), row-major
+    <store>/items.json    {"version", "dim", "dtype", "count", "items": [metadata of each row, ...], "extra": {...}}
+
+Application stores describe each row by filename, college and content hash; chunk stores (tools.chunk_index) add the
+section, parent application and text of each chunk.
+
+Opening a store reads only the sidecar; vector pages are loaded by the OS on first touch and shared between worker
+processes that map the same file. The sidecar's count is authoritative, so bytes past it (an interrupted write) are
+ignored. Stores grow by appending rows and tombstoning replaced ones; tools.chunk_index uses this to re-index only
+what changed. Convert the legacy pickle with:
+
+    python chatbot/tools/embedding_store.py application_embeddings.pkl application_store [--dtype float16]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import sys
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+STORE_VERSION = 1
+VECTORS_FILE = "vectors.bin"
+ITEMS_FILE = "items.json"
+DTYPES = ("float32", "float16")
+
+
+class StoredApplication:
+    """Stand-in for the `Application` class the legacy pickle was written with; only its attributes are needed."""
+
+    filename: str
+    content: Dict[str, Any]
+    embedding: List[float]
+
+
+class _ApplicationUnpickler(pickle.Unpickler):
+    # The pickle was written from a script's __main__, which no importer of this module can provide
+    def find_class(self, module: str, name: str) -> Any:
+        if name == "Application":
+            return StoredApplication
+
+        return super().find_class(module, name)
+
+
+def load_applications(path: str) -> List[StoredApplication]:
+    with open(path, "rb") as f:
+        return _ApplicationUnpickler(f).load()
+
+
+def college_name(filename: str, content: Dict[str, Any]) -> str:
+    college = (content.get("university_specific_questions") or {}).get("college_name")
+
+    # Filenames look like "Harvard_app1"
+    return college or filename.split("_")[0]
+
+
+def content_hash(content: Any) -> str:
+    canonical = json.dumps(content, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def normalize_rows(vectors: Any) -> np.ndarray:
+    matrix = np.array(vectors, dtype=np.float32, ndmin=2, order="C")
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix /= norms
+
+    return matrix
+
+
+def top_k(
+    vectors: np.ndarray, queries: Any, k: int, candidates: Optional[np.ndarray] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Cosine top-k of unit `vectors` for a batch of queries: (scores, rows), each (queries, k), best first.
+
+    `candidates` restricts the search to those row numbers; k shrinks to the number of rows searched.
+    """
+    q = normalize_rows(queries)
+
+    if q.shape[1] != vectors.shape[1]:
+        raise ValueError(f"Query dimension {q.shape[1]} does not match index dimension {vectors.shape[1]}")
+
+    matrix = vectors if candidates is None else vectors[candidates]
+    k = min(k, matrix.shape[0])
+
+    if k == 0:
+        return np.empty((q.shape[0], 0), dtype=np.float32), np.empty((q.shape[0], 0), dtype=np.int64)
+
+    scores = q @ matrix.T
+
+    if k < matrix.shape[0]:
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        top = np.broadcast_to(np.arange(k), (q.shape[0], k))
+
+    top_scores = np.take_along_axis(scores, top, axis=1)
+    order = np.argsort(-top_scores, axis=1, kind="stable")
+    rows = np.take_along_axis(top, order, axis=1)
+
+    if candidates is not None:
+        rows = candidates[rows]
+
+    return np.take_along_axis(top_scores, order, axis=1), rows
+
+
+def _write_json(path: str, value: Any) -> None:
+    # Readers never see a half-written sidecar
+    tmp = f"{path}.tmp"
+
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(value, f, ensure_ascii=False)
+
+    os.replace(tmp, path)
+
+
+def _write_sidecar(path: str, dim: int, dtype: str, items: List[Dict[str, Any]], extra: Dict[str, Any]) -> None:
+    _write_json(
+        os.path.join(path, ITEMS_FILE),
+        {"version": STORE_VERSION, "dim": dim, "dtype": dtype, "count": len(items), "items": items, "extra": extra},
+    )
+
+
+class EmbeddingStore:
+    """A store directory; `vectors` is a read-only memory map of its unit rows.
+
+    Rows are only ever appended. Removing or replacing an item tombstones its row ("deleted": true in its metadata)
+    so the vector file never has to be rewritten; `live_rows()` lists the rows searches should consider and
+    `compact()` drops tombstoned rows for good.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._open()
+
+    def _open(self) -> None:
+        with open(os.path.join(self.path, ITEMS_FILE), encoding="utf-8") as f:
+            meta = json.load(f)
+
+        if meta.get("version") != STORE_VERSION:
+            raise ValueError(f"Unsupported embedding store version {meta.get('version')} at {self.path}")
+
+        self.dim: int = meta["dim"]
+        self.dtype_name: str = meta["dtype"]
+        self.dtype = np.dtype(self.dtype_name).newbyteorder("<")
+        self.items: List[Dict[str, Any]] = meta["items"]
+        # Store-level metadata kept by whoever maintains the store, e.g. source file hashes
+        self.extra: Dict[str, Any] = meta.get("extra", {})
+        count: int = meta["count"]
+
+        if count:
+            self.vectors = np.memmap(
+                os.path.join(self.path, VECTORS_FILE), dtype=self.dtype, mode="r", shape=(count, self.dim)
+            )
+        else:
+            self.vectors = np.empty((0, self.dim), dtype=self.dtype)
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    @staticmethod
+    def exists(path: str) -> bool:
+        return os.path.exists(os.path.join(path, ITEMS_FILE))
+
+    def live_rows(self) -> np.ndarray:
+        return np.array([row for row, item in enumerate(self.items) if not item.get("deleted")], dtype=np.int64)
+
+    @classmethod
+    def create(
+        cls,
+        path: str,
+        vectors: Any,
+        items: Sequence[Dict[str, Any]],
+        dtype: str = "float32",
+        extra: Optional[Dict[str, Any]] = None,
+    ) -> "EmbeddingStore":
+        """Write a new store at `path`, replacing any existing one, and open it."""
+        if dtype not in DTYPES:
+            raise ValueError(f"Unsupported dtype '{dtype}'. Expected one of {list(DTYPES)}")
+
+        matrix = normalize_rows(vectors) if len(items) else np.empty((0, 0), dtype=np.float32)
+
+        if matrix.shape[0] != len(items):
+            raise ValueError(f"Got {matrix.shape[0]} vectors for {len(items)} items")
+
+        os.makedirs(path, exist_ok=True)
+        matrix.astype(np.dtype(dtype).newbyteorder("<")).tofile(os.path.join(path, VECTORS_FILE))
+
+        _write_sidecar(path, int(matrix.shape[1]), dtype, list(items), extra or {})
+
+        return cls(path)
+
+    def append(
+        self,
+        vectors: Any,
+        items: Sequence[Dict[str, Any]],
+        tombstones: Iterable[int] = (),
+        extra: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        """Append rows, tombstone the given row numbers and replace `extra`, with one sidecar write.
+
+        New vectors are written past the current count before the sidecar that counts them, so an interrupted append
+        leaves the store as it was.
+        """
+        # Row numbers stay valid across reopening, since rows are only ever appended
+        self._open()
+        metas = [dict(item) for item in self.items]
+
+        for row in tombstones:
+            metas[row]["deleted"] = True
+
+        if len(items):
+            matrix = normalize_rows(vectors)
+
+            if matrix.shape[0] != len(items):
+                raise ValueError(f"Got {matrix.shape[0]} vectors for {len(items)} items")
+
+            if self.dim == 0:
+                self.dim = int(matrix.shape[1])
+            elif matrix.shape[1] != self.dim:
+                raise ValueError(f"Vector dimension {matrix.shape[1]} does not match store dimension {self.dim}")
+
+            with open(os.path.join(self.path, VECTORS_FILE), "r+b" if len(self.items) else "wb") as f:
+                # Drop bytes left past the count by an earlier interrupted append
+                f.truncate(len(self.items) * self.dim * self.dtype.itemsize)
+                f.seek(0, os.SEEK_END)
+                f.write(matrix.astype(self.dtype).tobytes())
+
+            metas.extend(items)
+
+        # Release the old map before the sidecar that sizes it changes
+        self.vectors = None
+        _write_sidecar(self.path, self.dim, self.dtype_name, metas, self.extra if extra is None else extra)
+        self._open()
+
+    def compact(self) -> None:
+        """Rewrite the store without its tombstoned rows; other processes must not have it open meanwhile."""
+        self._open()
+        rows = self.live_rows()
+        vectors = np.asarray(self.vectors[rows], dtype=np.float32) if len(rows) else []
+        items = [self.items[row] for row in rows]
+
+        # Rows are already unit length; create() normalizes again, which leaves them unchanged
+        compacted = EmbeddingStore.create(self.path, vectors, items, self.dtype_name, self.extra)
+        self.__dict__.update(compacted.__dict__)
+
+
+def convert_pickle(pickle_path: str, store_path: str, dtype: str = "float32") -> EmbeddingStore:
+    """Write the applications of a legacy application_embeddings.pkl as an embedding store."""
+    applications = load_applications(pickle_path)
+    items = [
+        {
+            "filename": app.filename,
+            "college": college_name(app.filename, app.content),
+            "content_hash": content_hash(app.content),
+        }
+        for app in applications
+    ]
+
+    return EmbeddingStore.create(store_path, [app.embedding for app in applications], items, dtype)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Convert application_embeddings.pkl into an embedding store.")
+    parser.add_argument("pickle", help="Legacy pickle of Application objects")
+    parser.add_argument("store", help="Store directory to write")
+    parser.add_argument("--dtype", choices=DTYPES, default="float32", help="float16 halves the file size")
+    args = parser.parse_args(argv)
+
+    store = convert_pickle(args.pickle, args.store, args.dtype)
+    print(f"Wrote {len(store)} x {store.dim} {args.dtype} vectors to {args.store}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,16 +1,40 @@
 import json
-from typing import List, Dict, Any, Optional
+import re
+from typing import List, Dict, Any, AsyncIterator, Iterator, Optional, Tuple, Union
 
-from langchain_openai import AzureChatOpenAI
-from langchain_core.output_parsers import PydanticOutputParser
+from langchain_core.output_parsers import PydanticOutputParser, StrOutputParser
 from langchain_core.prompts import ChatPromptTemplate
 from pydantic import BaseModel, Field, constr
 from langchain_core.tools import tool
 from langchain_core.messages import BaseMessage
 
-from tools.utils import create_conversation_context, create_user_context
+from tools.create_activity_ideas import ActivityIdeasOutput, Blueprint
+from tools.instrumentation import metrics_config, record_event
+from tools.json_stream import WILDCARD, JsonStreamParser
+from tools.llm import get_llm
+from tools.text_compression import compress_to_limit, truncate_to_limit
+from tools.utils import (
+    _strip_fences_and_labels,
+    compact_json,
+    create_conversation_context,
+    create_user_context,
+    iterate_sync,
+    prompt_json,
+    run_sync,
+)
 
-llm = AzureChatOpenAI(deployment_name="gpt-4o", temperature=0.7, max_tokens=4000)
+LLM_SETTINGS = {"deployment_name": "gpt-4o", "temperature": 0.7, "max_tokens": 4000}
+REPAIR_LLM_SETTINGS = {"deployment_name": "gpt-4o", "temperature": 0.2, "max_tokens": 800}
+
+# Bump whenever the prompt or output schema changes; part of the response cache key
+PROMPT_VERSION = "4"
+
+# Hard character limits of the Common App activity fields, mirrored by the constr() bounds below
+FIELD_LIMITS = {"position": 50, "organization": 100, "description": 150}
+
+MAX_RETRIES = 3
+
+Ideas = Union[ActivityIdeasOutput, str, None]
 
 
 class Commitment(BaseModel):
@@ -48,6 +72,16 @@ class FormatActivitiesOutput(BaseModel):
     )
 
 
+class FieldFix(BaseModel):
+    index: int = Field(..., description="Index of the activity in the list")
+    field: str = Field(..., description="position, organization or description")
+    text: str = Field(..., description="Rewritten text within the field's character limit")
+
+
+class FieldRepairOutput(BaseModel):
+    fixes: List[FieldFix] = Field(..., description="One rewrite per field that was over its limit")
+
+
 class FormatActivitiesInput(BaseModel):
     user_profile: Optional[Dict[str, Any]] = Field(None, description="Complete user profile")
     recent_messages: List[BaseMessage] = Field(..., description="Recent conversation messages")
@@ -120,22 +154,28 @@ def create_format_activities_prompt_template() -> ChatPromptTemplate:
     )
 
 
-@tool("format_activity_list", args_schema=FormatActivitiesInput, return_direct=False)
-def format_activity_list(
-    user_profile: Optional[Dict[str, Any]],
-    recent_messages: List[BaseMessage],
-    blueprint_json: Optional[str] = None,
-    ideas_json: Optional[str] = None,
-    as_text: bool = False,
-) -> str:
-    """Format activities into Position (≤50 chars), Organization (≤100 chars), Description (≤150 chars), and Commitment (hours_per_week, weeks_per_year, participation_grades). All enhancements must fit within character limits. Returns a valid JSON object. Can be grounded with optional blueprint/ideas JSON or inferred from conversation/profile."""
+def create_field_repair_prompt_template() -> ChatPromptTemplate:
+    system_prompt = (
+        "You shorten Common App activity fields that are over their character limit.\n"
+        "Rewrite each field so it fits within its limit (count every character including spaces).\n"
+        "Keep every number, name and concrete outcome; drop filler words first, then use standard abbreviations.\n"
+        "Return one fix per input field with the same index and field.\n\n"
+        "{format_instructions}"
+    )
+
+    return ChatPromptTemplate.from_messages([("system", system_prompt), ("user", "FIELDS:\n{fields}")])
 
-    conversation_context = create_conversation_context(recent_messages[:-1])
-    user_profile_context = create_user_context(user_profile)
 
+def _build_inputs(
+    user_profile: Optional[Dict[str, Any]],
+    recent_messages: List[BaseMessage],
+    blueprint: Blueprint,
+    ideas: Ideas,
+    parser: PydanticOutputParser,
+) -> Dict[str, Any]:
     # Heuristics: if the last message contains JSON and blueprint/ideas are missing, attach it
-    detected_blueprint = blueprint_json or ""
-    detected_ideas = ideas_json or ""
+    detected_blueprint = prompt_json(blueprint)
+    detected_ideas = prompt_json(ideas)
     try:
         last_msg = recent_messages[-1].content if recent_messages else ""
         if last_msg and (last_msg.strip().startswith("{") or last_msg.strip().startswith("[")):
@@ -146,50 +186,345 @@ def format_activity_list(
     except Exception:
         pass
 
+    return {
+        "conversation_context": create_conversation_context(recent_messages[:-1], "format_activity_list"),
+        "user_profile_context": create_user_context(user_profile, "format_activity_list"),
+        "user_query": recent_messages[-1].content,
+        "blueprint_json": detected_blueprint,
+        "ideas_json": detected_ideas,
+        "format_instructions": parser.get_format_instructions(),
+    }
+
+
+def _render_output(result: FormatActivitiesOutput, as_text: bool) -> str:
+    if not as_text:
+        return compact_json(result.dict())
+
+    data = result.dict()
+    lines = []
+    for a in data.get("activities", []):
+        pos = a.get("position", "")
+        org = a.get("organization", "")
+        desc = a.get("description", "")
+        commitment = a.get("commitment", {})
+        lines.append(f"Position: {pos} ({len(pos)})")
+        lines.append(f"Organization: {org} ({len(org)})")
+        lines.append(f"Description: {desc} ({len(desc)})")
+        if commitment:
+            hrs = commitment.get("hours_per_week", "N/A")
+            wks = commitment.get("weeks_per_year", "N/A")
+            grades = commitment.get("participation_grades", [])
+            lines.append(
+                f"Commitment: {hrs} hrs/week, {wks} weeks/year, Grades: {', '.join(grades) if grades else 'N/A'}"
+            )
+        lines.append("")
+    return "\n".join(lines).strip()
+
+
+def _lenient_commitment(value: Any) -> Optional[Dict[str, Any]]:
+    if not isinstance(value, dict):
+        return None
+
+    def number(raw: Any, cast: type) -> Any:
+        # "30-36" or "5 hrs" become the first number mentioned
+        match = re.search(r"\d+(?:\.\d+)?", str(raw)) if raw is not None else None
+        return cast(float(match.group())) if match else None
+
+    grades = value.get("participation_grades")
+
+    return {
+        "hours_per_week": number(value.get("hours_per_week"), float),
+        "weeks_per_year": number(value.get("weeks_per_year"), int),
+        "participation_grades": [str(g) for g in grades] if isinstance(grades, list) else None,
+    }
+
+
+def _lenient_activity(item: Any) -> Dict[str, Any]:
+    if not isinstance(item, dict):
+        raise ValueError(f"Activity is not an object: {str(item)[:80]}")
+
+    activity = {field: re.sub(r"\s+", " ", str(item.get(field) or "")).strip() for field in FIELD_LIMITS}
+
+    if not activity["position"] or not activity["description"]:
+        raise ValueError(f"Activity is missing a position or description: {compact_json(item)[:120]}")
+
+    return {**activity, "commitment": _lenient_commitment(item.get("commitment"))}
+
+
+def _lenient_parse(text: str) -> List[Dict[str, Any]]:
+    """Parse the formatter's raw JSON without enforcing field limits; extra keys are dropped."""
+    data = json.loads(_strip_fences_and_labels(text))
+    activities = data.get("activities") if isinstance(data, dict) else data
+
+    if not isinstance(activities, list) or not activities:
+        raise ValueError("Formatter output has no activities list")
+
+    return [_lenient_activity(item) for item in activities]
+
+
+def _compress_fields(activity: Dict[str, Any]) -> Tuple[int, List[str]]:
+    """Compress over-long fields of one activity in place; return how many were fixed and which still do not fit."""
+    compressed_count = 0
+    remaining = []
+
+    for field, limit in FIELD_LIMITS.items():
+        if len(activity[field]) <= limit:
+            continue
+
+        compressed = compress_to_limit(activity[field], limit)
+
+        if compressed is None:
+            remaining.append(field)
+        else:
+            activity[field] = compressed
+            compressed_count += 1
+
+    return compressed_count, remaining
+
+
+def _record_repairs(attempt: int, compressed_count: int, remaining: List[Tuple[int, str]]) -> None:
+    if compressed_count or remaining:
+        record_event(
+            "format_activity_list", "repair", "field_repair", attempt, local=compressed_count, llm=len(remaining)
+        )
+
+
+def _repair_locally(activities: List[Dict[str, Any]], attempt: int) -> List[Tuple[int, str]]:
+    """Compress over-long fields in place; return the (index, field) pairs that still do not fit."""
+    remaining = []
+    compressed_count = 0
+
+    for index, activity in enumerate(activities):
+        count, fields = _compress_fields(activity)
+        compressed_count += count
+        remaining.extend((index, field) for field in fields)
+
+    _record_repairs(attempt, compressed_count, remaining)
+
+    return remaining
+
+
+def _repair_inputs(activities: List[Dict[str, Any]], remaining: List[Tuple[int, str]]) -> Dict[str, Any]:
+    fields = [
+        {"index": index, "field": field, "limit": FIELD_LIMITS[field], "text": activities[index][field]}
+        for index, field in remaining
+    ]
+
+    return {
+        "fields": compact_json(fields),
+        "format_instructions": PydanticOutputParser(pydantic_object=FieldRepairOutput).get_format_instructions(),
+    }
+
+
+def _apply_fixes(
+    activities: List[Dict[str, Any]], remaining: List[Tuple[int, str]], fixes: List[FieldFix]
+) -> FormatActivitiesOutput:
+    wanted = set(remaining)
+
+    for fix in fixes:
+        if (fix.index, fix.field) in wanted:
+            activities[fix.index][fix.field] = re.sub(r"\s+", " ", fix.text).strip()
+
+    # Anything the repair call missed or left too long is cut at a word boundary rather than failing the list
+    for index, field in remaining:
+        activities[index][field] = truncate_to_limit(activities[index][field], FIELD_LIMITS[field])
+
+    return FormatActivitiesOutput(activities=activities)
+
+
+def _repair_chain():
+    parser = PydanticOutputParser(pydantic_object=FieldRepairOutput)
+
+    return create_field_repair_prompt_template() | get_llm(**REPAIR_LLM_SETTINGS) | parser
+
+
+async def _afetch_fixes(
+    activities: List[Dict[str, Any]], remaining: List[Tuple[int, str]], attempt: int
+) -> List[FieldFix]:
+    try:
+        config = metrics_config("format_activity_list", "repair", attempt)
+        return (await _repair_chain().ainvoke(_repair_inputs(activities, remaining), config=config)).fixes
+    except Exception:
+        return []
+
+
+async def _arepair(activities: List[Dict[str, Any]], attempt: int) -> FormatActivitiesOutput:
+    remaining = _repair_locally(activities, attempt)
+    fixes = await _afetch_fixes(activities, remaining, attempt) if remaining else []
+
+    return _apply_fixes(activities, remaining, fixes)
+
+
+def format_activities(
+    user_profile: Optional[Dict[str, Any]],
+    recent_messages: List[BaseMessage],
+    blueprint: Blueprint = None,
+    ideas: Ideas = None,
+) -> FormatActivitiesOutput:
+    """Typed core of `format_activity_list`.
+
+    The formatter's JSON is parsed leniently and only over-long fields are repaired (locally, then with one small
+    batched LLM call), so a single long description no longer costs a full regeneration. Regenerates only when the
+    output is not parseable at all; raises after MAX_RETRIES attempts.
+    """
+    return run_sync(aformat_activities(user_profile, recent_messages, blueprint, ideas))
+
+
+async def aformat_activities(
+    user_profile: Optional[Dict[str, Any]],
+    recent_messages: List[BaseMessage],
+    blueprint: Blueprint = None,
+    ideas: Ideas = None,
+) -> FormatActivitiesOutput:
+    """Async variant of `format_activities`."""
     parser = PydanticOutputParser(pydantic_object=FormatActivitiesOutput)
-    prompt = create_format_activities_prompt_template()
+    chain = create_format_activities_prompt_template() | get_llm(**LLM_SETTINGS) | StrOutputParser()
+    inputs = _build_inputs(user_profile, recent_messages, blueprint, ideas, parser)
+    last_error: Optional[Exception] = None
 
-    chain = prompt | llm | parser
+    for attempt in range(MAX_RETRIES):
+        try:
+            raw = await chain.ainvoke(inputs, config=metrics_config("format_activity_list", "format", attempt))
+            return await _arepair(_lenient_parse(raw), attempt)
+        except Exception as e:
+            last_error = e
+            if isinstance(e, ValueError):
+                record_event("format_activity_list", "format", "parse_failure", attempt, error=str(e)[:200])
 
-    max_retries = 3
+    raise ValueError(f"Formatting failed after {MAX_RETRIES} attempts: {last_error}")
+
+
+async def astream_format_activities(
+    user_profile: Optional[Dict[str, Any]],
+    recent_messages: List[BaseMessage],
+    blueprint: Blueprint = None,
+    ideas: Ideas = None,
+) -> AsyncIterator[Tuple[int, FormattedActivity]]:
+    """Yield (index, activity) pairs as each activity object closes in the streamed completion.
+
+    Activities that fit their limits after local compression are yielded immediately; the few that need the batched
+    LLM repair follow once the stream ends, so indices can arrive out of order. Like `aformat_activities`, a completion
+    that fails to parse is regenerated, up to MAX_RETRIES attempts, as long as no activity has been yielded yet; after
+    that a malformed activity raises as soon as it closes, since the caller has already shown the earlier ones.
+    """
+    parser = PydanticOutputParser(pydantic_object=FormatActivitiesOutput)
+    chain = create_format_activities_prompt_template() | get_llm(**LLM_SETTINGS) | StrOutputParser()
+    inputs = _build_inputs(user_profile, recent_messages, blueprint, ideas, parser)
+    last_error: Optional[Exception] = None
+
+    for attempt in range(MAX_RETRIES):
+        stream = JsonStreamParser([("activities", WILDCARD)])
+        activities: List[Dict[str, Any]] = []
+        remaining: List[Tuple[int, str]] = []
+        compressed_count = 0
+        yielded = False
 
-    for attempt in range(max_retries):
         try:
-            result = chain.invoke(
-                {
-                    "conversation_context": conversation_context,
-                    "user_profile_context": user_profile_context,
-                    "user_query": recent_messages[-1].content,
-                    "blueprint_json": detected_blueprint,
-                    "ideas_json": detected_ideas,
-                    "format_instructions": parser.get_format_instructions(),
-                }
-            )
+            config = metrics_config("format_activity_list", "format", attempt)
+
+            async for chunk in chain.astream(inputs, config=config):
+                for _, item in stream.feed(chunk):
+                    activity = _lenient_activity(item)
+                    count, fields = _compress_fields(activity)
+                    compressed_count += count
+                    activities.append(activity)
+
+                    if fields:
+                        remaining.extend((len(activities) - 1, field) for field in fields)
+                    else:
+                        yielded = True
+                        yield len(activities) - 1, FormattedActivity(**activity)
 
-            if as_text:
-                data = result.dict()
-                lines = []
-                for a in data.get("activities", []):
-                    pos = a.get("position", "")
-                    org = a.get("organization", "")
-                    desc = a.get("description", "")
-                    commitment = a.get("commitment", {})
-                    lines.append(f"Position: {pos} ({len(pos)})")
-                    lines.append(f"Organization: {org} ({len(org)})")
-                    lines.append(f"Description: {desc} ({len(desc)})")
-                    if commitment:
-                        hrs = commitment.get("hours_per_week", "N/A")
-                        wks = commitment.get("weeks_per_year", "N/A")
-                        grades = commitment.get("participation_grades", [])
-                        lines.append(
-                            f"Commitment: {hrs} hrs/week, {wks} weeks/year, Grades: {', '.join(grades) if grades else 'N/A'}"
-                        )
-                    lines.append("")
-                return "\n".join(lines).strip()
-            else:
-                return json.dumps(result.dict(), indent=2)
+            stream.close()
 
+            if not activities:
+                raise ValueError("Formatter output has no activities list")
         except Exception as e:
-            return f"Error: {str(e)}"
+            last_error = e
+            if isinstance(e, ValueError):
+                record_event("format_activity_list", "format", "parse_failure", attempt, error=str(e)[:200])
+            if yielded:
+                raise
+            continue
+
+        _record_repairs(attempt, compressed_count, remaining)
+
+        if remaining:
+            repaired = _apply_fixes(activities, remaining, await _afetch_fixes(activities, remaining, attempt))
+
+            for index in sorted({index for index, _ in remaining}):
+                yield index, repaired.activities[index]
+
+        return
+
+    raise ValueError(f"Formatting failed after {MAX_RETRIES} attempts: {last_error}")
+
+
+def stream_format_activities(
+    user_profile: Optional[Dict[str, Any]],
+    recent_messages: List[BaseMessage],
+    blueprint: Blueprint = None,
+    ideas: Ideas = None,
+) -> Iterator[Tuple[int, FormattedActivity]]:
+    """Sync variant of `astream_format_activities`."""
+    yield from iterate_sync(astream_format_activities(user_profile, recent_messages, blueprint, ideas))
+
+
+@tool("format_activity_list", args_schema=FormatActivitiesInput, return_direct=False)
+def format_activity_list(
+    user_profile: Optional[Dict[str, Any]],
+    recent_messages: List[BaseMessage],
+    blueprint_json: Optional[str] = None,
+    ideas_json: Optional[str] = None,
+    as_text: bool = False,
+) -> str:
+    """Format activities into Position (≤50 chars), Organization (≤100 chars), Description (≤150 chars), and Commitment (hours_per_week, weeks_per_year, participation_grades). All enhancements must fit within character limits. Returns a valid JSON object. Can be grounded with optional blueprint/ideas JSON or inferred from conversation/profile."""
+
+    try:
+        result = format_activities(user_profile, recent_messages, blueprint_json, ideas_json)
+    except Exception as e:
+        return f"Error: {str(e)}"
+
+    return _render_output(result, as_text)
+
+
+async def aformat_activity_list(
+    user_profile: Optional[Dict[str, Any]],
+    recent_messages: List[BaseMessage],
+    blueprint_json: Optional[str] = None,
+    ideas_json: Optional[str] = None,
+    as_text: bool = False,
+) -> str:
+    """Async variant of `format_activity_list`."""
+
+    try:
+        result = await aformat_activities(user_profile, recent_messages, blueprint_json, ideas_json)
+    except Exception as e:
+        return f"Error: {str(e)}"
+
+    return _render_output(result, as_text)
+
+
+format_activity_list.coroutine = aformat_activity_list
+
+
+def stream_format_activity_list(
+    user_profile: Optional[Dict[str, Any]], recent_messages: List[BaseMessage]
+) -> Iterator[str]:
+    """Yield the formatted activities JSON one complete activity at a time while the LLM generates it.
+
+    Activities are emitted in list order: one waiting for the LLM repair holds back those after it, so the streamed
+    (and cached) JSON matches what `format_activity_list` returns. Nothing is emitted before the first activity, so
+    a completion regenerated after a parse failure leaves no partial JSON behind.
+    """
+    pending: Dict[int, FormattedActivity] = {}
+    position = 0
+
+    for index, activity in stream_format_activities(user_profile, recent_messages):
+        pending[index] = activity
+
+        while position in pending:
+            yield ("," if position else '{"activities":[') + compact_json(pending.pop(position).dict())
+            position += 1
 
-    return json.dumps({"error": "Maximum retries exceeded"}, indent=2)
+    yield "]}"
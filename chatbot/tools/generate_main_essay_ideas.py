@@ -3,10 +3,9 @@ Main essay ideas generation tool for college application strategy.
 Generates comprehensive main essay ideas based on user context.
 """
 
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Iterator
 
 from langchain_core.runnables import Runnable
-from langchain_openai import AzureChatOpenAI
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.prompts import ChatPromptTemplate
 from pydantic import BaseModel, Field
@@ -15,12 +14,18 @@ from langchain_core.prompts import ChatPromptTemplate
 
 from langchain_core.tools import tool
 
-from tools.utils import create_conversation_context, create_user_context
+from tools.grounding import agrounding_context, grounding_version
+from tools.instrumentation import metrics_config
+from tools.llm import get_llm
+from tools.utils import create_conversation_context, create_user_context, run_sync
 
 from langchain_core.messages import BaseMessage
 
 
-llm = AzureChatOpenAI(deployment_name="gpt-4o")
+LLM_SETTINGS = {"deployment_name": "gpt-4o"}
+
+# Bump whenever the prompt or output schema changes; part of the response cache key
+PROMPT_VERSION = "3" + grounding_version()
 
 
 def create_main_essay_ideas_prompt_template() -> ChatPromptTemplate:
@@ -73,7 +78,7 @@ def create_main_essay_ideas_prompt_template() -> ChatPromptTemplate:
 
     Tone: Engaging, vivid, authentic, and admissions-ready.
 
-    {user_profile_context}
+    {user_profile_context}{retrieved_examples}
     """
 
     user_prompt = """{conversation_context}
@@ -103,21 +108,47 @@ class MainEssayIdeasInput(BaseModel):
     recent_messages: List[BaseMessage] = Field(..., description="Recent conversation messages")
 
 
+def _build_chain() -> Runnable:
+    prompt: ChatPromptTemplate = create_main_essay_ideas_prompt_template()
+
+    return prompt | get_llm(**LLM_SETTINGS) | StrOutputParser()
+
+
+def _build_inputs(user_profile: Optional[Dict[str, Any]], recent_messages: List[BaseMessage]) -> Dict[str, Any]:
+    return {
+        "conversation_context": create_conversation_context(recent_messages[:-1], "generate_main_essay_ideas"),
+        "user_profile_context": create_user_context(user_profile, "generate_main_essay_ideas"),
+        "user_query": recent_messages[-1].content,
+        "retrieved_examples": "",
+    }
+
+
+async def _abuild_inputs(user_profile: Optional[Dict[str, Any]], recent_messages: List[BaseMessage]) -> Dict[str, Any]:
+    inputs = _build_inputs(user_profile, recent_messages)
+    query = f"{inputs['user_profile_context']}\n{inputs['user_query']}"
+    inputs["retrieved_examples"] = await agrounding_context(user_profile, query, kind="personal_statement")
+
+    return inputs
+
+
 @tool("generate_main_essay_ideas", args_schema=MainEssayIdeasInput, return_direct=False)
 def generate_main_essay_ideas(user_profile: Optional[Dict[str, Any]], recent_messages: List[BaseMessage]) -> str:
     """Generate compelling main essay ideas for college applications based on user context."""
-    conversation_context = create_conversation_context(recent_messages[:-1])
+    return run_sync(agenerate_main_essay_ideas(user_profile, recent_messages))
 
-    user_profile_context = create_user_context(user_profile)
 
-    prompt: ChatPromptTemplate = create_main_essay_ideas_prompt_template()
+async def agenerate_main_essay_ideas(user_profile: Optional[Dict[str, Any]], recent_messages: List[BaseMessage]) -> str:
+    """Async variant of `generate_main_essay_ideas`."""
+    inputs = await _abuild_inputs(user_profile, recent_messages)
+    return await _build_chain().ainvoke(inputs, config=metrics_config("generate_main_essay_ideas", "generate"))
+
+
+generate_main_essay_ideas.coroutine = agenerate_main_essay_ideas
 
-    chain: Runnable = prompt | llm | StrOutputParser()
 
-    return chain.invoke(
-        {
-            "conversation_context": conversation_context,
-            "user_profile_context": user_profile_context,
-            "user_query": recent_messages[-1].content,
-        }
-    )
+def stream_generate_main_essay_ideas(
+    user_profile: Optional[Dict[str, Any]], recent_messages: List[BaseMessage]
+) -> Iterator[str]:
+    """Yield the main essay ideas JSON as text chunks while the LLM generates it."""
+    inputs = run_sync(_abuild_inputs(user_profile, recent_messages))
+    yield from _build_chain().stream(inputs, config=metrics_config("generate_main_essay_ideas", "generate"))
@@ -0,0 +1,72 @@
+"""
+Retrieval grounding for generation tools.
+Looks up the admitted applications most similar to the student (tools.application_index) and the corpus chunks most
+relevant to the request (tools.chunk_index), and renders them as a prompt section the tool can draw on for tone,
+depth and structure.
+
+Off by default: enable with RETRIEVAL_GROUNDING_ENABLED=1 once an application store and a chunk store have been built.
+Either index being unavailable only leaves its part of the section out.
+"""
+
+import asyncio
+import os
+from typing import Any, Dict, List, Optional
+
+from tools.text_compression import truncate_to_limit
+
+GROUNDING_SETTINGS: Dict[str, Any] = {
+    "enabled": os.getenv("RETRIEVAL_GROUNDING_ENABLED", "0") == "1",
+    "applications": int(os.getenv("RETRIEVAL_GROUNDING_APPLICATIONS", "3")),
+    "chunks": int(os.getenv("RETRIEVAL_GROUNDING_CHUNKS", "3")),
+    "excerpt_chars": int(os.getenv("RETRIEVAL_GROUNDING_EXCERPT_CHARS", "600")),
+}
+
+
+def grounding_version() -> str:
+    """Suffix for a tool's PROMPT_VERSION, so grounded and ungrounded responses never share cache entries."""
+    return "+grounded" if GROUNDING_SETTINGS["enabled"] else ""
+
+
+def render_grounding(applications: List[Dict[str, Any]], chunks: List[Dict[str, Any]]) -> str:
+    if not applications and not chunks:
+        return ""
+
+    lines = [
+        "",
+        "REFERENCE MATERIAL FROM ADMITTED APPLICATIONS (learn from it; never copy it or present it as the student's):",
+    ]
+
+    if applications:
+        lines.append("Most similar admitted applicants: " + ", ".join(app["college"] for app in applications))
+
+    for chunk in chunks:
+        excerpt = truncate_to_limit(" ".join(chunk["text"].split()), GROUNDING_SETTINGS["excerpt_chars"])
+        lines.append(f"- {chunk['college']}, {chunk['title']}: {excerpt}")
+
+    return "\n".join(lines)
+
+
+async def agrounding_context(
+    user_profile: Optional[Dict[str, Any]], query: str, kind: Optional[str] = None
+) -> str:
+    """Reference section for a tool prompt, or "" when grounding is disabled or nothing could be retrieved.
+
+    `query` is embedded to pick chunks of `kind` (e.g. "personal_statement"); the profile picks similar applications.
+    """
+    if not GROUNDING_SETTINGS["enabled"]:
+        return ""
+
+    # Imported here so tools pay for NumPy and the stores only when grounding is on
+    from tools.application_index import asimilar_applications
+    from tools.chunk_index import arelevant_chunks
+
+    try:
+        applications, chunks = await asyncio.gather(
+            asimilar_applications(user_profile, GROUNDING_SETTINGS["applications"]),
+            arelevant_chunks(query, kind=kind, k=GROUNDING_SETTINGS["chunks"]),
+        )
+    except Exception:
+        # Grounding is best effort; an embedding failure must not fail the tool
+        return ""
+
+    return render_grounding(applications, chunks)
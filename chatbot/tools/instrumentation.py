@@ -0,0 +1,428 @@
+"""
+Per-call LLM instrumentation.
+A LangChain callback handler records wall time, time to first token, token usage, cost, attempts and parse failures
+for every chain run, labelled by agent, tool and stage. Records go to an in-memory buffer that can be exported as
+Prometheus text, and to a JSONL file written by a background thread so no disk I/O happens on the calling event loop.
+
+Usage:
+    python -m tools.instrumentation summary [--path .cache/llm_metrics.jsonl]
+    python -m tools.instrumentation prometheus [--path .cache/llm_metrics.jsonl]
+"""
+
+import argparse
+import atexit
+import contextvars
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, Iterator, List, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.exceptions import OutputParserException
+from langchain_core.outputs import LLMResult
+from langchain_core.runnables import RunnableConfig
+
+
+DEFAULT_METRICS_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(__file__))), ".cache", "llm_metrics.jsonl"
+)
+
+METRICS_SETTINGS: Dict[str, Any] = {
+    "enabled": os.getenv("LLM_METRICS_ENABLED", "1") == "1",
+    "path": os.getenv("LLM_METRICS_PATH", DEFAULT_METRICS_PATH),
+    "buffer_size": int(os.getenv("LLM_METRICS_BUFFER_SIZE", "5000")),
+}
+
+# USD per 1M tokens (input, output)
+MODEL_PRICES: Dict[str, tuple] = {
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4o-mini": (0.15, 0.60),
+}
+
+_current_agent: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("current_agent", default=None)
+_current_usage: contextvars.ContextVar[Optional[Dict[str, int]]] = contextvars.ContextVar("current_usage", default=None)
+
+logger = logging.getLogger(__name__)
+
+_records: Deque[Dict[str, Any]] = deque(maxlen=METRICS_SETTINGS["buffer_size"])
+
+# (path, JSONL line) pairs waiting for the writer thread
+_pending: "queue.Queue[tuple]" = queue.Queue()
+_writer: Optional[threading.Thread] = None
+_writer_lock = threading.Lock()
+
+
+@contextmanager
+def agent_scope(agent_name: str) -> Iterator[None]:
+    """Label every LLM call made inside the block with the top-level agent that triggered it."""
+    token = _current_agent.set(agent_name)
+    try:
+        yield
+    finally:
+        _current_agent.reset(token)
+
+
+def current_agent() -> Optional[str]:
+    """The agent set by the enclosing `agent_scope`, if any."""
+    return _current_agent.get()
+
+
+@contextmanager
+def usage_scope() -> Iterator[Dict[str, int]]:
+    """Accumulate the token usage of every LLM call made inside the block (including concurrent child tasks)."""
+    usage = {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0}
+    token = _current_usage.set(usage)
+    try:
+        yield usage
+    finally:
+        _current_usage.reset(token)
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int) -> Optional[float]:
+    for name in sorted(MODEL_PRICES, key=len, reverse=True):
+        if model.startswith(name):
+            input_price, output_price = MODEL_PRICES[name]
+            return (prompt_tokens * input_price + completion_tokens * output_price) / 1_000_000
+
+    return None
+
+
+def _write_pending() -> None:
+    while True:
+        batch = [_pending.get()]
+
+        # Everything queued while the last batch was written goes out in one append per file
+        while True:
+            try:
+                batch.append(_pending.get_nowait())
+            except queue.Empty:
+                break
+
+        lines: Dict[str, List[str]] = defaultdict(list)
+        for path, line in batch:
+            lines[path].append(line)
+
+        for path, path_lines in lines.items():
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+                with open(path, "a", encoding="utf-8") as f:
+                    f.writelines(path_lines)
+            except OSError as e:
+                logger.warning("Could not write %d LLM metrics records to %s: %s", len(path_lines), path, e)
+
+        for _ in batch:
+            _pending.task_done()
+
+
+def _start_writer() -> None:
+    global _writer
+
+    with _writer_lock:
+        if _writer is None:
+            _writer = threading.Thread(target=_write_pending, name="llm-metrics-writer", daemon=True)
+            _writer.start()
+            atexit.register(flush)
+
+
+def flush() -> None:
+    """Block until every record queued so far is written to the metrics file."""
+    if _writer is not None:
+        _pending.join()
+
+
+def record(entry: Dict[str, Any]) -> None:
+    _records.append(entry)
+
+    path = METRICS_SETTINGS["path"]
+
+    if not path:
+        return
+
+    # Serialized here so later changes to the entry cannot race the writer
+    _pending.put((path, json.dumps(entry, ensure_ascii=False) + "\n"))
+
+    if _writer is None:
+        _start_writer()
+
+
+def recent_records() -> List[Dict[str, Any]]:
+    return list(_records)
+
+
+def record_event(tool: str, stage: str, event: str, attempt: int = 0, **fields: Any) -> None:
+    """Record a non-LLM event (e.g. a local parse failure or field repair) alongside the call metrics."""
+    if not METRICS_SETTINGS["enabled"]:
+        return
+
+    agent = _current_agent.get()
+    record(
+        {
+            "ts": time.time(),
+            "agent": agent or tool,
+            "tool": tool,
+            "stage": stage,
+            "attempt": attempt,
+            "event": event,
+            **fields,
+        }
+    )
+
+
+class LLMMetricsHandler(BaseCallbackHandler):
+    """Collects one metrics record per chat model call and one per failed chain run."""
+
+    def __init__(self, tool: str, stage: str, attempt: int = 0):
+        self.tool = tool
+        self.stage = stage
+        self.attempt = attempt
+        self.agent = _current_agent.get()
+        self.usage = _current_usage.get()
+        self._starts: Dict[UUID, float] = {}
+        self._first_token: Dict[UUID, float] = {}
+
+    def _base(self) -> Dict[str, Any]:
+        return {
+            "ts": time.time(),
+            "agent": self.agent or self.tool,
+            "tool": self.tool,
+            "stage": self.stage,
+            "attempt": self.attempt,
+        }
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._starts[run_id] = time.perf_counter()
+
+    def on_llm_start(self, serialized: Dict[str, Any], prompts: List[str], *, run_id: UUID, **kwargs: Any) -> None:
+        self._starts[run_id] = time.perf_counter()
+
+    def on_llm_new_token(self, token: str, *, run_id: UUID, **kwargs: Any) -> None:
+        self._first_token.setdefault(run_id, time.perf_counter())
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        start = self._starts.pop(run_id, None)
+        first_token = self._first_token.pop(run_id, None)
+        end = time.perf_counter()
+
+        llm_output = response.llm_output or {}
+        usage = llm_output.get("token_usage") or {}
+        prompt_tokens = usage.get("prompt_tokens")
+        completion_tokens = usage.get("completion_tokens")
+
+        if prompt_tokens is None:
+            # Streaming responses report usage on the message rather than in llm_output
+            for generations in response.generations:
+                for generation in generations:
+                    usage_metadata = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                    prompt_tokens = (prompt_tokens or 0) + usage_metadata.get("input_tokens", 0)
+                    completion_tokens = (completion_tokens or 0) + usage_metadata.get("output_tokens", 0)
+
+        if llm_output.get("coalesced"):
+            # The response was shared from an identical in-flight call (tools.single_flight); that call is recorded
+            record({**self._base(), "event": "coalesced"})
+            return
+
+        model = llm_output.get("model_name") or "unknown"
+
+        if self.usage is not None:
+            self.usage["calls"] += 1
+            self.usage["prompt_tokens"] += prompt_tokens or 0
+            self.usage["completion_tokens"] += completion_tokens or 0
+
+        record(
+            {
+                **self._base(),
+                "event": "llm_call",
+                "model": model,
+                "wall_ms": (end - start) * 1000 if start is not None else None,
+                "ttft_ms": (first_token - start) * 1000 if start is not None and first_token is not None else None,
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "cost_usd": estimate_cost(model, prompt_tokens or 0, completion_tokens or 0),
+            }
+        )
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        start = self._starts.pop(run_id, None)
+        self._first_token.pop(run_id, None)
+
+        record(
+            {
+                **self._base(),
+                "event": "llm_error",
+                "error": type(error).__name__,
+                "wall_ms": (time.perf_counter() - start) * 1000 if start is not None else None,
+            }
+        )
+
+    def on_chain_error(
+        self, error: BaseException, *, run_id: UUID, parent_run_id: Optional[UUID] = None, **kwargs: Any
+    ) -> None:
+        # Only the parser's own run reports a parse failure; the enclosing sequence re-raises the same error
+        if isinstance(error, OutputParserException) and parent_run_id is not None:
+            record({**self._base(), "event": "parse_failure", "error": str(error)[:200]})
+
+    def on_retry(self, retry_state: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        record({**self._base(), "event": "retry"})
+
+
+def metrics_config(tool: str, stage: str, attempt: int = 0) -> RunnableConfig:
+    """RunnableConfig that attaches metrics collection to a chain invocation."""
+    config: RunnableConfig = {"run_name": f"{tool}.{stage}", "metadata": {"tool": tool, "stage": stage}}
+
+    if METRICS_SETTINGS["enabled"]:
+        config["callbacks"] = [LLMMetricsHandler(tool, stage, attempt)]
+
+    return config
+
+
+def load_records(path: str) -> List[Dict[str, Any]]:
+    entries = []
+
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                entries.append(json.loads(line))
+
+    return entries
+
+
+def _percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+
+    return ordered[index]
+
+
+def summarize(entries: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Aggregate records per (agent, tool, stage) into counts, p50/p95 latencies, tokens and cost."""
+    groups: Dict[tuple, List[Dict[str, Any]]] = defaultdict(list)
+
+    for entry in entries:
+        groups[(entry.get("agent"), entry.get("tool"), entry.get("stage"))].append(entry)
+
+    rows = []
+
+    for (agent, tool, stage), group in sorted(groups.items(), key=lambda item: tuple(str(k) for k in item[0])):
+        calls = [e for e in group if e.get("event") == "llm_call"]
+        wall = [e["wall_ms"] for e in calls if e.get("wall_ms") is not None]
+        ttft = [e["ttft_ms"] for e in calls if e.get("ttft_ms") is not None]
+
+        rows.append(
+            {
+                "agent": agent,
+                "tool": tool,
+                "stage": stage,
+                "calls": len(calls),
+                "errors": sum(1 for e in group if e.get("event") == "llm_error"),
+                "parse_failures": sum(1 for e in group if e.get("event") == "parse_failure"),
+                "coalesced": sum(1 for e in group if e.get("event") == "coalesced"),
+                "retries": sum(1 for e in calls if e.get("attempt", 0) > 0)
+                + sum(1 for e in group if e.get("event") == "retry"),
+                "wall_p50_ms": _percentile(wall, 50),
+                "wall_p95_ms": _percentile(wall, 95),
+                "ttft_p50_ms": _percentile(ttft, 50),
+                "ttft_p95_ms": _percentile(ttft, 95),
+                "prompt_tokens": sum(e.get("prompt_tokens") or 0 for e in calls),
+                "completion_tokens": sum(e.get("completion_tokens") or 0 for e in calls),
+                "cost_usd": sum(e.get("cost_usd") or 0.0 for e in calls),
+            }
+        )
+
+    return rows
+
+
+def prometheus_text(entries: Optional[List[Dict[str, Any]]] = None) -> str:
+    """Render aggregated metrics in the Prometheus text exposition format."""
+    rows = summarize(entries if entries is not None else recent_records())
+    lines = []
+
+    metrics = [
+        ("llm_calls_total", "counter", "calls"),
+        ("llm_errors_total", "counter", "errors"),
+        ("llm_parse_failures_total", "counter", "parse_failures"),
+        ("llm_retries_total", "counter", "retries"),
+        ("llm_coalesced_total", "counter", "coalesced"),
+        ("llm_prompt_tokens_total", "counter", "prompt_tokens"),
+        ("llm_completion_tokens_total", "counter", "completion_tokens"),
+        ("llm_cost_usd_total", "counter", "cost_usd"),
+        ("llm_wall_ms_p50", "gauge", "wall_p50_ms"),
+        ("llm_wall_ms_p95", "gauge", "wall_p95_ms"),
+        ("llm_ttft_ms_p50", "gauge", "ttft_p50_ms"),
+        ("llm_ttft_ms_p95", "gauge", "ttft_p95_ms"),
+    ]
+
+    for name, kind, field in metrics:
+        lines.append(f"# TYPE {name} {kind}")
+        for row in rows:
+            if row[field] is None:
+                continue
+            labels = f'agent="{row["agent"]}",tool="{row["tool"]}",stage="{row["stage"]}"'
+            lines.append(f"{name}{{{labels}}} {row[field]}")
+
+    if entries is None:
+        # Live request-coalescing state of this process (tools.single_flight)
+        from tools.single_flight import single_flight_stats
+
+        groups = single_flight_stats()
+
+        for name, kind, field in [
+            ("single_flight_in_flight", "gauge", "in_flight"),
+            ("single_flight_waiting", "gauge", "waiting"),
+            ("single_flight_max_waiters", "gauge", "max_waiters"),
+            ("single_flight_coalesced_total", "counter", "coalesced"),
+        ]:
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(f'{name}{{group="{group["name"]}"}} {group[field]}' for group in groups)
+
+    return "\n".join(lines) + "\n"
+
+
+def _format_ms(value: Optional[float]) -> str:
+    return f"{value:.0f}" if value is not None else "-"
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Inspect recorded LLM call metrics.")
+    parser.add_argument("command", choices=["summary", "prometheus"])
+    parser.add_argument("--path", default=METRICS_SETTINGS["path"], help="JSONL metrics file")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.path):
+        print(f"No metrics recorded at {args.path}", file=sys.stderr)
+        return 1
+
+    entries = load_records(args.path)
+
+    if args.command == "prometheus":
+        sys.stdout.write(prometheus_text(entries))
+        return 0
+
+    header = (
+        f"{'agent':<28}{'tool':<28}{'stage':<10}{'calls':>6}{'fail':>6}{'retry':>6}{'coal':>6}"
+        f"{'p50 ms':>9}{'p95 ms':>9}{'ttft50':>8}{'in tok':>9}{'out tok':>9}{'cost $':>9}"
+    )
+    print(header)
+
+    for row in summarize(entries):
+        print(
+            f"{str(row['agent']):<28}{str(row['tool']):<28}{str(row['stage']):<10}{row['calls']:>6}"
+            f"{row['errors'] + row['parse_failures']:>6}{row['retries']:>6}{row['coalesced']:>6}"
+            f"{_format_ms(row['wall_p50_ms']):>9}{_format_ms(row['wall_p95_ms']):>9}{_format_ms(row['ttft_p50_ms']):>8}"
+            f"{row['prompt_tokens']:>9}{row['completion_tokens']:>9}{row['cost_usd']:>9.4f}"
+        )
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,123 @@
+"""
+Incremental JSON parsing for streamed LLM output.
+`JsonStreamParser` consumes the completion chunk by chunk and returns every value whose path matches one of its
+patterns as soon as that value is complete, e.g. each element of "activities" the moment its closing brace arrives,
+instead of waiting for the last token before parsing the whole document.
+"""
+
+import json
+from typing import Any, List, Optional, Sequence, Tuple, Union
+
+PathElement = Union[str, int]
+Path = Tuple[PathElement, ...]
+
+# "*" in a pattern matches any array index or object key
+WILDCARD = "*"
+
+
+def path_matches(path: Path, pattern: Sequence[PathElement]) -> bool:
+    return len(path) == len(pattern) and all(p == WILDCARD or p == e for e, p in zip(path, pattern))
+
+
+class _Frame:
+    __slots__ = ("kind", "start", "key", "index", "expect_key")
+
+    def __init__(self, kind: str, start: int):
+        self.kind = kind
+        self.start = start
+        self.key: Optional[str] = None
+        self.index = 0
+        self.expect_key = kind == "{"
+
+
+class JsonStreamParser:
+    """Emit (path, value) pairs for matching objects, arrays and strings as soon as they close.
+
+    Text before the first "{" or "[" (a code fence or a "json" label) is ignored. Only the structure is tracked
+    incrementally; each matched value is decoded once with `json.loads`, so malformed JSON inside it raises
+    `json.JSONDecodeError` at the point it closes.
+    """
+
+    def __init__(self, patterns: Sequence[Sequence[PathElement]]):
+        self.patterns = [tuple(p) for p in patterns]
+        self._text = ""
+        self._pos = 0
+        self._stack: List[_Frame] = []
+        self._started = False
+        self._done = False
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+
+    @property
+    def done(self) -> bool:
+        """True once the top-level value has closed."""
+        return self._done
+
+    def _path(self) -> Path:
+        return tuple(frame.key if frame.kind == "{" else frame.index for frame in self._stack)
+
+    def _emit(self, path: Path, start: int, end: int, out: List[Tuple[Path, Any]]) -> None:
+        if any(path_matches(path, pattern) for pattern in self.patterns):
+            out.append((path, json.loads(self._text[start:end])))
+
+    def feed(self, chunk: str) -> List[Tuple[Path, Any]]:
+        out: List[Tuple[Path, Any]] = []
+        self._text += chunk
+        text = self._text
+
+        for pos in range(self._pos, len(text)):
+            char = text[pos]
+
+            if self._done:
+                break
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    frame = self._stack[-1]
+
+                    if frame.kind == "{" and frame.expect_key:
+                        frame.key = json.loads(text[self._string_start : pos + 1])
+                    else:
+                        self._emit(self._path(), self._string_start, pos + 1, out)
+                continue
+
+            if not self._started:
+                if char in "{[":
+                    self._started = True
+                else:
+                    continue
+
+            if char == '"':
+                self._in_string = True
+                self._string_start = pos
+            elif char in "{[":
+                self._stack.append(_Frame(char, pos))
+            elif char in "}]":
+                frame = self._stack[-1]
+                path = self._path()[:-1]
+                self._stack.pop()
+                self._emit(path, frame.start, pos + 1, out)
+                self._done = not self._stack
+            elif char == ":":
+                self._stack[-1].expect_key = False
+            elif char == ",":
+                frame = self._stack[-1]
+                if frame.kind == "{":
+                    frame.expect_key = True
+                else:
+                    frame.index += 1
+
+        self._pos = len(text)
+
+        return out
+
+    def close(self) -> None:
+        """Raise if the stream ended before the top-level value closed."""
+        if not self._done:
+            raise ValueError("Streamed JSON ended before the document was complete")
@@ -0,0 +1,206 @@
+"""
+Shared chat model registry for the chatbot tools.
+Models are built on first use, cached per (deployment, temperature, max_tokens) and share one pooled HTTP client.
+"""
+
+import os
+import threading
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+if TYPE_CHECKING:
+    from langchain_core.language_models import BaseChatModel
+    from langchain_openai import AzureChatOpenAI, AzureOpenAIEmbeddings
+
+
+DEFAULT_DEPLOYMENT = "gpt-4o"
+
+# 1536-dim embeddings, the same scheme as application_embeddings.pkl
+DEFAULT_EMBEDDING_DEPLOYMENT = os.getenv("EMBEDDING_DEPLOYMENT", "text-embedding-ada-002")
+
+# Connection pool settings shared by every chat model; override with env vars or `configure_pool`
+POOL_SETTINGS: Dict[str, Any] = {
+    "max_connections": int(os.getenv("LLM_POOL_MAX_CONNECTIONS", "50")),
+    "max_keepalive_connections": int(os.getenv("LLM_POOL_MAX_KEEPALIVE", "20")),
+    "keepalive_expiry": float(os.getenv("LLM_POOL_KEEPALIVE_EXPIRY", "60")),
+    "timeout": float(os.getenv("LLM_HTTP_TIMEOUT", "600")),
+    # Client-side retries of failed requests; tools.rate_limit sets 0 and retries transient errors this often itself
+    "max_retries": int(os.getenv("LLM_CLIENT_MAX_RETRIES", "2")),
+}
+
+ModelKey = Tuple[str, Optional[float], Optional[int]]
+ModelFactory = Callable[[str, Optional[float], Optional[int]], "BaseChatModel"]
+ModelWrapper = Callable[["BaseChatModel", ModelKey], "BaseChatModel"]
+
+_lock = threading.RLock()
+_models: Dict[ModelKey, "AzureChatOpenAI"] = {}
+_model_factory: Optional[ModelFactory] = None
+_model_wrappers: List[ModelWrapper] = []
+_embeddings: Dict[str, "AzureOpenAIEmbeddings"] = {}
+_http_client: Optional[httpx.Client] = None
+_http_async_client: Optional[httpx.AsyncClient] = None
+
+
+def _client_kwargs() -> Dict[str, Any]:
+    return {
+        "limits": httpx.Limits(
+            max_connections=POOL_SETTINGS["max_connections"],
+            max_keepalive_connections=POOL_SETTINGS["max_keepalive_connections"],
+            keepalive_expiry=POOL_SETTINGS["keepalive_expiry"],
+        ),
+        "timeout": httpx.Timeout(POOL_SETTINGS["timeout"], connect=10.0),
+        "follow_redirects": True,
+    }
+
+
+def get_http_client() -> httpx.Client:
+    global _http_client
+
+    with _lock:
+        if _http_client is None:
+            _http_client = httpx.Client(**_client_kwargs())
+
+        return _http_client
+
+
+def get_async_http_client() -> httpx.AsyncClient:
+    global _http_async_client
+
+    with _lock:
+        if _http_async_client is None:
+            _http_async_client = httpx.AsyncClient(**_client_kwargs())
+
+        return _http_async_client
+
+
+def configure_pool(
+    max_connections: Optional[int] = None,
+    max_keepalive_connections: Optional[int] = None,
+    keepalive_expiry: Optional[float] = None,
+    timeout: Optional[float] = None,
+    max_retries: Optional[int] = None,
+) -> None:
+    """Change the shared pool settings. Cached models and clients are dropped and rebuilt on next use."""
+    global _http_client, _http_async_client
+
+    updates = {
+        "max_connections": max_connections,
+        "max_keepalive_connections": max_keepalive_connections,
+        "keepalive_expiry": keepalive_expiry,
+        "timeout": timeout,
+        "max_retries": max_retries,
+    }
+
+    with _lock:
+        POOL_SETTINGS.update({k: v for k, v in updates.items() if v is not None})
+
+        if _http_client is not None:
+            _http_client.close()
+
+        # The async client may be bound to a running loop, so it is left for garbage collection
+        _http_client = None
+        _http_async_client = None
+        _models.clear()
+        _embeddings.clear()
+
+
+def set_model_factory(factory: Optional[ModelFactory]) -> None:
+    """Build chat models with `factory(deployment_name, temperature, max_tokens)` instead of Azure OpenAI.
+
+    Used by the offline benchmarks to swap in a fake model; pass None to restore the default. Cached models are dropped.
+    """
+    global _model_factory
+
+    with _lock:
+        _model_factory = factory
+        _models.clear()
+
+
+def add_model_wrapper(wrapper: ModelWrapper) -> None:
+    """Wrap every chat model returned by `get_llm` with `wrapper(model, key)`; wrappers apply in registration order.
+
+    Cached models are dropped so the wrapper also applies to models that were already built.
+    """
+    with _lock:
+        _model_wrappers.append(wrapper)
+        _models.clear()
+
+
+def remove_model_wrapper(wrapper: ModelWrapper) -> None:
+    with _lock:
+        if wrapper in _model_wrappers:
+            _model_wrappers.remove(wrapper)
+        _models.clear()
+
+
+def get_llm(
+    deployment_name: str = DEFAULT_DEPLOYMENT,
+    temperature: Optional[float] = None,
+    max_tokens: Optional[int] = None,
+) -> "AzureChatOpenAI":
+    """Return the shared chat model for these settings, building it on first use.
+
+    `None` leaves the deployment default in place for temperature and max_tokens.
+    """
+    key: ModelKey = (deployment_name, temperature, max_tokens)
+
+    model = _models.get(key)
+
+    if model is not None:
+        return model
+
+    with _lock:
+        model = _models.get(key)
+
+        if model is None:
+            if _model_factory is not None:
+                model = _model_factory(deployment_name, temperature, max_tokens)
+            else:
+                model = _build_azure_model(deployment_name, temperature, max_tokens)
+
+            for wrapper in _model_wrappers:
+                model = wrapper(model, key)
+
+            _models[key] = model
+
+        return model
+
+
+def _build_azure_model(
+    deployment_name: str, temperature: Optional[float], max_tokens: Optional[int]
+) -> "AzureChatOpenAI":
+    # Imported here so importing the registry stays cheap until a model is actually needed
+    from langchain_openai import AzureChatOpenAI
+
+    kwargs: Dict[str, Any] = {}
+    if temperature is not None:
+        kwargs["temperature"] = temperature
+    if max_tokens is not None:
+        kwargs["max_tokens"] = max_tokens
+
+    return AzureChatOpenAI(
+        deployment_name=deployment_name,
+        http_client=get_http_client(),
+        http_async_client=get_async_http_client(),
+        max_retries=POOL_SETTINGS["max_retries"],
+        **kwargs,
+    )
+
+
+def get_embeddings(deployment: str = DEFAULT_EMBEDDING_DEPLOYMENT) -> "AzureOpenAIEmbeddings":
+    """Return the shared embeddings client for this deployment, building it on first use."""
+    with _lock:
+        embeddings = _embeddings.get(deployment)
+
+        if embeddings is None:
+            from langchain_openai import AzureOpenAIEmbeddings
+
+            embeddings = AzureOpenAIEmbeddings(
+                azure_deployment=deployment,
+                http_client=get_http_client(),
+                http_async_client=get_async_http_client(),
+            )
+            _embeddings[deployment] = embeddings
+
+        return embeddings
@@ -0,0 +1,556 @@
+"""
+Process-wide rate limiting for chat model calls.
+Every model returned by `get_llm` is wrapped so calls to the same deployment share one `DeploymentLimiter`:
+- token buckets budget requests per minute and estimated tokens per minute (prompt estimate plus max_tokens,
+  reconciled with the reported usage once the call returns);
+- the number of calls in flight adapts AIMD-style: +1 per window of successful calls, halved on a 429, and every
+  caller waits out the Retry-After before the limiter dispatches again;
+- waiting calls are admitted round-robin across tools, so one busy tool cannot starve the others. A call is labelled
+  by the "tool" metadata of `metrics_config`; streaming calls, which langchain makes without a run manager, fall back
+  to the agent of the enclosing `agent_scope`.
+All retries happen here instead of in the OpenAI client: 429s so that all callers back off together rather than each
+retrying on its own schedule, and transient failures (timeouts, connection errors, 5xx) with exponential backoff, up to
+LLM_CLIENT_MAX_RETRIES times as the client would have.
+
+Configure with LLM_RATE_LIMIT_ENABLED, LLM_RPM_LIMIT / LLM_TPM_LIMIT (0 = unbounded) and per-deployment overrides in
+LLM_RATE_LIMITS, e.g. '{"gpt-4o": {"rpm": 300, "tpm": 50000}}'.
+"""
+
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, AsyncIterator, Callable, Deque, Dict, Iterator, List, Optional
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+
+from tools.cassette import CassetteChatModel
+from tools.instrumentation import current_agent, record_event
+from tools.llm import ModelKey, add_model_wrapper, configure_pool, remove_model_wrapper
+
+RATE_LIMIT_SETTINGS: Dict[str, Any] = {
+    "enabled": os.getenv("LLM_RATE_LIMIT_ENABLED", "1") == "1",
+    "rpm": int(os.getenv("LLM_RPM_LIMIT", "0")),
+    "tpm": int(os.getenv("LLM_TPM_LIMIT", "0")),
+    "deployments": json.loads(os.getenv("LLM_RATE_LIMITS", "{}")),
+    # Azure enforces per-minute quotas over short windows, so the buckets only hold this many seconds of quota
+    "burst_seconds": float(os.getenv("LLM_RATE_LIMIT_BURST_SECONDS", "10")),
+    "initial_concurrency": float(os.getenv("LLM_INITIAL_CONCURRENCY", "8")),
+    "max_concurrency": float(os.getenv("LLM_MAX_CONCURRENCY", "32")),
+    "decrease_factor": float(os.getenv("LLM_CONCURRENCY_DECREASE", "0.5")),
+    "max_retries": int(os.getenv("LLM_RATE_LIMIT_MAX_RETRIES", "5")),
+    # Retries of transient failures, which the OpenAI client would otherwise have made itself
+    "transient_retries": int(os.getenv("LLM_CLIENT_MAX_RETRIES", "2")),
+    "default_backoff": float(os.getenv("LLM_RATE_LIMIT_BACKOFF_SECONDS", "1")),
+}
+
+# Used for the token estimate when a model has no max_tokens setting
+DEFAULT_COMPLETION_TOKENS = 1000
+
+
+class TokenBucket:
+    """Reservation-based token bucket; a reservation may drive the level negative and returns the wait it implies."""
+
+    def __init__(self, per_minute: float, burst_seconds: float):
+        self.rate = per_minute / 60
+        self.capacity = max(1.0, self.rate * burst_seconds)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount: float) -> float:
+        with self._lock:
+            self._refill()
+            self.level -= min(amount, self.capacity)
+
+            return max(0.0, -self.level / self.rate)
+
+    def refund(self, amount: float) -> None:
+        """Return (or, when negative, additionally charge) tokens once the real usage is known."""
+        with self._lock:
+            self._refill()
+            self.level = min(self.capacity, self.level + amount)
+
+
+class _Waiter:
+    __slots__ = ("tool", "wake", "granted")
+
+    def __init__(self, tool: str, wake: Callable[[], None]):
+        self.tool = tool
+        self.wake = wake
+        self.granted = False
+
+
+def _resolve(future: "asyncio.Future[None]") -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+class DeploymentLimiter:
+    """Admission control for one deployment, shared by sync and async callers."""
+
+    def __init__(self, name: str, rpm: int = 0, tpm: int = 0, settings: Optional[Dict[str, Any]] = None):
+        settings = settings or RATE_LIMIT_SETTINGS
+        self.name = name
+        self.settings = settings
+        self.requests = TokenBucket(rpm, settings["burst_seconds"]) if rpm else None
+        self.tokens = TokenBucket(tpm, settings["burst_seconds"]) if tpm else None
+        self.limit = settings["initial_concurrency"]
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.last_decrease = 0.0
+        self.throttled = 0
+        self.completed = 0
+        self._queues: "OrderedDict[str, Deque[_Waiter]]" = OrderedDict()
+        self._timer: Optional[threading.Timer] = None
+        self._lock = threading.Lock()
+
+    # Admission
+
+    def _enqueue_locked(self, waiter: _Waiter) -> None:
+        self._queues.setdefault(waiter.tool, deque()).append(waiter)
+        self._dispatch_locked()
+
+    def _dispatch_locked(self) -> None:
+        delay = self.paused_until - time.monotonic()
+
+        if delay > 0:
+            if self._queues and self._timer is None:
+                self._timer = threading.Timer(delay, self._resume)
+                self._timer.daemon = True
+                self._timer.start()
+            return
+
+        while self._queues and self.in_flight < int(self.limit):
+            # Round-robin across tools: serve the first tool's oldest caller, then move that tool to the back
+            tool, queue = next(iter(self._queues.items()))
+            waiter = queue.popleft()
+
+            if queue:
+                self._queues.move_to_end(tool)
+            else:
+                del self._queues[tool]
+
+            waiter.granted = True
+            self.in_flight += 1
+            waiter.wake()
+
+    def _resume(self) -> None:
+        with self._lock:
+            self._timer = None
+            self._dispatch_locked()
+
+    def _withdraw_locked(self, waiter: _Waiter) -> None:
+        if waiter.granted:
+            self.in_flight -= 1
+            self._dispatch_locked()
+            return
+
+        queue = self._queues.get(waiter.tool)
+
+        if queue is not None and waiter in queue:
+            queue.remove(waiter)
+            if not queue:
+                del self._queues[waiter.tool]
+
+    def acquire(self, tool: str) -> None:
+        event = threading.Event()
+
+        with self._lock:
+            self._enqueue_locked(_Waiter(tool, event.set))
+
+        event.wait()
+
+    async def aacquire(self, tool: str) -> None:
+        loop = asyncio.get_running_loop()
+        future: "asyncio.Future[None]" = loop.create_future()
+        waiter = _Waiter(tool, lambda: loop.call_soon_threadsafe(_resolve, future))
+
+        with self._lock:
+            self._enqueue_locked(waiter)
+
+        try:
+            await future
+        except asyncio.CancelledError:
+            with self._lock:
+                self._withdraw_locked(waiter)
+            raise
+
+    def release(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
+            self._dispatch_locked()
+
+    # Quota
+
+    def reserve(self, estimated_tokens: int) -> float:
+        """Charge one request and the estimated tokens; return how long the caller must wait before sending."""
+        delay = self.requests.reserve(1) if self.requests else 0.0
+
+        if self.tokens:
+            delay = max(delay, self.tokens.reserve(estimated_tokens))
+
+        return delay
+
+    def reconcile(self, estimated_tokens: int, actual_tokens: Optional[int]) -> None:
+        if self.tokens and actual_tokens:
+            self.tokens.refund(estimated_tokens - actual_tokens)
+
+    # Feedback
+
+    def on_success(self) -> None:
+        with self._lock:
+            self.completed += 1
+            self.limit = min(self.settings["max_concurrency"], self.limit + 1 / self.limit)
+            self._dispatch_locked()
+
+    def on_rate_limited(self, retry_after: float, started: float) -> None:
+        with self._lock:
+            self.throttled += 1
+            now = time.monotonic()
+            self.paused_until = max(self.paused_until, now + retry_after)
+
+            # One decrease per congestion event: calls already in flight when we last backed off don't count again
+            if started >= self.last_decrease:
+                self.limit = max(1.0, self.limit * self.settings["decrease_factor"])
+                self.last_decrease = now
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "deployment": self.name,
+                "concurrency_limit": round(self.limit, 2),
+                "in_flight": self.in_flight,
+                "queued": {tool: len(queue) for tool, queue in self._queues.items()},
+                "throttled": self.throttled,
+                "completed": self.completed,
+                "paused_for_s": round(max(0.0, self.paused_until - time.monotonic()), 2),
+            }
+
+
+_limiters: Dict[str, DeploymentLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(deployment_name: str) -> DeploymentLimiter:
+    with _limiters_lock:
+        limiter = _limiters.get(deployment_name)
+
+        if limiter is None:
+            quota = RATE_LIMIT_SETTINGS["deployments"].get(deployment_name, {})
+            limiter = DeploymentLimiter(
+                deployment_name,
+                rpm=quota.get("rpm", RATE_LIMIT_SETTINGS["rpm"]),
+                tpm=quota.get("tpm", RATE_LIMIT_SETTINGS["tpm"]),
+            )
+            _limiters[deployment_name] = limiter
+
+        return limiter
+
+
+def limiter_stats() -> List[Dict[str, Any]]:
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+
+    return [limiter.stats() for limiter in limiters]
+
+
+def retry_after_seconds(error: BaseException, attempt: int) -> Optional[float]:
+    """Seconds to wait before retrying a 429, or None when `error` is not a rate-limit response."""
+    response = getattr(error, "response", None)
+    status = getattr(error, "status_code", None) or getattr(response, "status_code", None)
+
+    if status != 429 and type(error).__name__ != "RateLimitError":
+        return None
+
+    headers = getattr(response, "headers", None) or {}
+
+    for header, scale in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+        try:
+            return float(headers[header]) * scale
+        except (KeyError, TypeError, ValueError):
+            continue
+
+    return RATE_LIMIT_SETTINGS["default_backoff"] * 2**attempt
+
+
+# Retried like the OpenAI client does: request timeouts, lock conflicts and server errors
+TRANSIENT_STATUS_CODES = {408, 409}
+TRANSIENT_ERRORS = {"APIConnectionError", "APITimeoutError", "InternalServerError"}
+
+
+def is_transient(error: BaseException) -> bool:
+    response = getattr(error, "response", None)
+    status = getattr(error, "status_code", None) or getattr(response, "status_code", None)
+
+    if isinstance(status, int) and (status >= 500 or status in TRANSIENT_STATUS_CODES):
+        return True
+
+    return type(error).__name__ in TRANSIENT_ERRORS
+
+
+def estimate_tokens(messages: List[BaseMessage], max_tokens: Optional[int]) -> int:
+    prompt = sum(len(str(message.content)) for message in messages) // 4
+
+    return prompt + (max_tokens or DEFAULT_COMPLETION_TOKENS)
+
+
+def _actual_tokens(result: ChatResult) -> Optional[int]:
+    usage = (result.llm_output or {}).get("token_usage") or {}
+
+    return usage.get("total_tokens") or (usage.get("prompt_tokens", 0) + usage.get("completion_tokens", 0)) or None
+
+
+def _chunk_tokens(chunk: ChatGenerationChunk) -> int:
+    usage = getattr(chunk.message, "usage_metadata", None) or {}
+
+    return usage.get("total_tokens") or usage.get("input_tokens", 0) + usage.get("output_tokens", 0)
+
+
+def _streamed_tokens(messages: List[BaseMessage], reported_tokens: int, streamed_chars: int) -> int:
+    """Usage the stream reported (summed over its chunks), else the prompt estimate plus the streamed text."""
+    if reported_tokens:
+        return reported_tokens
+
+    return sum(len(str(message.content)) for message in messages) // 4 + streamed_chars // 4
+
+
+def _tool(run_manager: Any) -> str:
+    return (getattr(run_manager, "metadata", None) or {}).get("tool") or current_agent() or "default"
+
+
+class RateLimitedChatModel(BaseChatModel):
+    """Chat model that sends every call to the wrapped model through its deployment's `DeploymentLimiter`."""
+
+    inner: BaseChatModel
+    limiter: Any
+    key: ModelKey
+
+    @property
+    def _llm_type(self) -> str:
+        return "rate_limited"
+
+    def _retry_delay(self, error: BaseException, attempt: int, started: float, tool: str) -> Optional[float]:
+        """Seconds this caller should wait before retrying `error`, or None when it must be raised.
+
+        A 429 pauses the whole limiter, so the caller itself need not wait; a transient failure only backs off the
+        caller that hit it.
+        """
+        retry_after = retry_after_seconds(error, attempt)
+
+        if retry_after is not None:
+            if attempt >= RATE_LIMIT_SETTINGS["max_retries"]:
+                return None
+
+            self.limiter.on_rate_limited(retry_after, started)
+            record_event(
+                tool, "rate_limit", "rate_limited", attempt, deployment=self.key[0], retry_after_s=retry_after
+            )
+
+            return 0.0
+
+        if is_transient(error) and attempt < RATE_LIMIT_SETTINGS["transient_retries"]:
+            backoff = RATE_LIMIT_SETTINGS["default_backoff"] * 2**attempt
+            record_event(tool, "rate_limit", "retry", attempt, deployment=self.key[0], error=type(error).__name__)
+
+            return backoff
+
+        return None
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        tool = _tool(run_manager)
+        estimate = estimate_tokens(messages, self.key[2])
+        attempt = 0
+
+        backoff: Optional[float] = 0.0
+
+        while True:
+            if backoff:
+                time.sleep(backoff)
+
+            self.limiter.acquire(tool)
+            started = time.monotonic()
+            try:
+                time.sleep(self.limiter.reserve(estimate))
+                result = self.inner._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+            except Exception as e:
+                backoff = self._retry_delay(e, attempt, started, tool)
+                if backoff is None:
+                    raise
+                attempt += 1
+                continue
+            finally:
+                self.limiter.release()
+
+            self.limiter.on_success()
+            self.limiter.reconcile(estimate, _actual_tokens(result))
+
+            return result
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        tool = _tool(run_manager)
+        estimate = estimate_tokens(messages, self.key[2])
+        attempt = 0
+
+        backoff: Optional[float] = 0.0
+
+        while True:
+            if backoff:
+                await asyncio.sleep(backoff)
+
+            await self.limiter.aacquire(tool)
+            started = time.monotonic()
+            try:
+                await asyncio.sleep(self.limiter.reserve(estimate))
+                result = await self.inner._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+            except Exception as e:
+                backoff = self._retry_delay(e, attempt, started, tool)
+                if backoff is None:
+                    raise
+                attempt += 1
+                continue
+            finally:
+                self.limiter.release()
+
+            self.limiter.on_success()
+            self.limiter.reconcile(estimate, _actual_tokens(result))
+
+            return result
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        tool = _tool(run_manager)
+        estimate = estimate_tokens(messages, self.key[2])
+        attempt = 0
+
+        backoff: Optional[float] = 0.0
+
+        while True:
+            if backoff:
+                time.sleep(backoff)
+
+            self.limiter.acquire(tool)
+            started = time.monotonic()
+            streamed = False
+            reported_tokens = streamed_chars = 0
+            try:
+                time.sleep(self.limiter.reserve(estimate))
+                for chunk in self.inner._stream(messages, stop=stop, run_manager=run_manager, **kwargs):
+                    streamed = True
+                    reported_tokens += _chunk_tokens(chunk)
+                    streamed_chars += len(chunk.text)
+                    yield chunk
+            except Exception as e:
+                # Only a call rejected before its first chunk can be retried transparently
+                backoff = None if streamed else self._retry_delay(e, attempt, started, tool)
+                if backoff is None:
+                    raise
+                attempt += 1
+                continue
+            finally:
+                self.limiter.release()
+
+            self.limiter.on_success()
+            self.limiter.reconcile(estimate, _streamed_tokens(messages, reported_tokens, streamed_chars))
+
+            return
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        tool = _tool(run_manager)
+        estimate = estimate_tokens(messages, self.key[2])
+        attempt = 0
+
+        backoff: Optional[float] = 0.0
+
+        while True:
+            if backoff:
+                await asyncio.sleep(backoff)
+
+            await self.limiter.aacquire(tool)
+            started = time.monotonic()
+            streamed = False
+            reported_tokens = streamed_chars = 0
+            try:
+                await asyncio.sleep(self.limiter.reserve(estimate))
+                async for chunk in self.inner._astream(messages, stop=stop, run_manager=run_manager, **kwargs):
+                    streamed = True
+                    reported_tokens += _chunk_tokens(chunk)
+                    streamed_chars += len(chunk.text)
+                    yield chunk
+            except Exception as e:
+                backoff = None if streamed else self._retry_delay(e, attempt, started, tool)
+                if backoff is None:
+                    raise
+                attempt += 1
+                continue
+            finally:
+                self.limiter.release()
+
+            self.limiter.on_success()
+            self.limiter.reconcile(estimate, _streamed_tokens(messages, reported_tokens, streamed_chars))
+
+            return
+
+
+def _wrap(model: BaseChatModel, key: ModelKey) -> BaseChatModel:
+    # Replay-only cassette models never reach Azure, so their calls take no budget
+    if isinstance(model, CassetteChatModel) and model.inner is None:
+        return model
+
+    return RateLimitedChatModel(inner=model, limiter=get_limiter(key[0]), key=key)
+
+
+def install_rate_limiter() -> None:
+    """Route every `get_llm` model through the shared limiters.
+
+    The OpenAI client's own retries are turned off; `RateLimitedChatModel` retries 429s and transient failures instead.
+    """
+    remove_model_wrapper(_wrap)
+    configure_pool(max_retries=0)
+    add_model_wrapper(_wrap)
+
+
+def uninstall_rate_limiter() -> None:
+    remove_model_wrapper(_wrap)
+
+
+def install_rate_limiter_from_env() -> bool:
+    if not RATE_LIMIT_SETTINGS["enabled"]:
+        return False
+
+    install_rate_limiter()
+
+    return True
@@ -0,0 +1,44 @@
+"""
+Lazy name -> object registry backed by "module:attribute" import paths.
+"""
+
+import importlib
+import threading
+from typing import Any, Dict, Iterator, Mapping
+
+
+class LazyRegistry(Mapping[str, Any]):
+    """Read-only mapping that imports each entry's module the first time the entry is looked up."""
+
+    def __init__(self, paths: Mapping[str, str]):
+        self._paths: Dict[str, str] = dict(paths)
+        self._loaded: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, name: str) -> Any:
+        if name in self._loaded:
+            return self._loaded[name]
+
+        path = self._paths[name]
+        module_name, _, attribute = path.partition(":")
+
+        with self._lock:
+            if name not in self._loaded:
+                self._loaded[name] = getattr(importlib.import_module(module_name), attribute or name)
+
+        return self._loaded[name]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._paths)
+
+    def __len__(self) -> int:
+        return len(self._paths)
+
+    def __contains__(self, name: object) -> bool:
+        return name in self._paths
+
+    def import_path(self, name: str) -> str:
+        return self._paths[name]
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._loaded
@@ -0,0 +1,290 @@
+"""
+Deterministic Markdown rendering for agent outputs.
+Renders the known tool output schemas locally so no LLM round-trip is needed to format them.
+"""
+
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+from tools.utils import _strip_fences_and_labels
+
+
+IDEA_ENHANCEMENT_FIELDS: List[Tuple[str, str]] = [
+    ("elevated_organization", "Organization"),
+    ("elevated_description", "Description"),
+    ("improvement_suggestions", "Improvement suggestions"),
+    ("alternative_suggestions", "Alternative suggestions"),
+    ("validation_or_evidence", "Validation / evidence"),
+    ("leverage_points", "Leverage points"),
+]
+
+DEVELOPED_IDEA_FIELDS: List[Tuple[str, str]] = [
+    ("impact_focus", "Impact focus"),
+    ("unique_method", "Unique method"),
+    ("resources_needed", "Resources needed"),
+    ("first_90_days", "First 90 days"),
+    ("milestones", "Milestones"),
+    ("success_metrics", "Success metrics"),
+    ("risks_and_mitigations", "Risks and mitigations"),
+]
+
+NARRATIVE_ANGLE_FIELDS: List[Tuple[str, str]] = [
+    ("positioning", "Positioning"),
+    ("essay_concept", "Essay concept"),
+    ("anchor_scene", "Anchor scene"),
+    ("unexpected_twist", "Unexpected twist"),
+    ("natural_major_fit", "Natural major fit"),
+]
+
+MAIN_ESSAY_IDEA_FIELDS: List[Tuple[str, str]] = [
+    ("theme", "Theme"),
+    ("hook", "Hook"),
+    ("challenge", "Challenge"),
+    ("journey", "Journey"),
+    ("growth", "Growth"),
+    ("impact", "Impact"),
+    ("future_connection", "Future connection"),
+    ("key_activities", "Key activities"),
+    ("unique_angle", "Unique angle"),
+    ("authenticity_factors", "Authenticity factors"),
+]
+
+
+def parse_json_output(text: str) -> Optional[Any]:
+    """Parse a tool's string output as JSON, returning None when it is not JSON."""
+    stripped = _strip_fences_and_labels(text)
+
+    if not stripped or stripped[0] not in "{[":
+        return None
+
+    try:
+        return json.loads(stripped)
+    except json.JSONDecodeError:
+        return None
+
+
+def _text(value: Any) -> str:
+    # Tools are asked to encode line breaks as a literal "\n" inside single-line strings
+    return str(value).replace("\\n", "\n").strip()
+
+
+def _field_lines(item: Dict[str, Any], fields: List[Tuple[str, str]]) -> List[str]:
+    lines: List[str] = []
+
+    for key, label in fields:
+        value = item.get(key)
+
+        if value in (None, "", [], {}):
+            continue
+
+        if isinstance(value, list):
+            lines.append(f"- **{label}:**")
+            lines.extend(f"  - {_text(v)}" for v in value)
+        else:
+            # Keep multi-line values inside the bullet with Markdown hard line breaks
+            text = _text(value).replace("\n", "  \n  ")
+            lines.append(f"- **{label}:** {text}")
+
+    return lines
+
+
+def _commitment_line(item: Dict[str, Any]) -> Optional[str]:
+    hours = item.get("hours_per_week")
+    weeks = item.get("weeks_per_year")
+    grades = item.get("participation_grades") or []
+
+    parts = []
+    if hours is not None:
+        parts.append(f"{hours:g} hrs/week" if isinstance(hours, (int, float)) else f"{hours} hrs/week")
+    if weeks is not None:
+        parts.append(f"{weeks} weeks/year")
+    if grades:
+        parts.append(f"Grades {', '.join(str(g) for g in grades)}")
+
+    return f"- **Commitment:** {', '.join(parts)}" if parts else None
+
+
+def render_activities_blueprint(data: Dict[str, Any]) -> str:
+    lines = ["## Activities Blueprint", ""]
+
+    for entry in data.get("categories", []):
+        lines.append(
+            f"- **{entry.get('category', 'Uncategorized')}:** "
+            f"{entry.get('existing', 0)} existing, {entry.get('missing', 0)} missing"
+        )
+
+    lines.extend(["", f"**Total activities:** {data.get('total', '')}"])
+
+    return "\n".join(lines)
+
+
+def render_activity_ideas(data: Dict[str, Any]) -> str:
+    lines = ["## Activity Ideas", ""]
+
+    if data.get("student_theme"):
+        lines.append(f"- **Student theme:** {_text(data['student_theme'])}")
+    if data.get("future_goals_summary"):
+        lines.append(f"- **Future goals:** {_text(data['future_goals_summary'])}")
+
+    for category in data.get("categories", []):
+        lines.extend(["", f"### {category.get('category', 'Uncategorized')}"])
+
+        for i, enhancement in enumerate(category.get("existing_enhancements", []), start=1):
+            title = enhancement.get("elevated_title") or f"Existing activity {i}"
+            lines.extend(["", f"#### Existing: {_text(title)}"])
+            lines.extend(_field_lines(enhancement, IDEA_ENHANCEMENT_FIELDS))
+            commitment = _commitment_line(enhancement)
+            if commitment:
+                lines.append(commitment)
+
+        for idea in category.get("developed_missing_ideas", []):
+            lines.extend(["", f"#### New: {_text(idea.get('idea_name', 'Untitled idea'))}"])
+            lines.extend(_field_lines(idea, DEVELOPED_IDEA_FIELDS))
+            commitment = _commitment_line(idea)
+            if commitment:
+                lines.append(commitment)
+
+    if data.get("top_priorities"):
+        lines.extend(["", "### Top Priorities"])
+        lines.extend(f"{i}. {_text(p)}" for i, p in enumerate(data["top_priorities"], start=1))
+
+    return "\n".join(lines)
+
+
+def render_formatted_activities(data: Dict[str, Any]) -> str:
+    lines = ["## Activity List"]
+
+    for i, activity in enumerate(data.get("activities", []), start=1):
+        lines.extend(
+            [
+                "",
+                f"### {i}. {_text(activity.get('position', ''))}",
+                f"*{_text(activity.get('organization', ''))}*",
+                "",
+                _text(activity.get("description", "")),
+            ]
+        )
+        commitment = _commitment_line(activity.get("commitment") or {})
+        if commitment:
+            lines.extend(["", commitment])
+
+    return "\n".join(lines)
+
+
+def render_activity_list(data: Dict[str, Any]) -> str:
+    sections = []
+
+    if "activities_blueprint" in data:
+        sections.append(render_activities_blueprint(data["activities_blueprint"]))
+    if "activity_ideas" in data:
+        sections.append(render_activity_ideas(data["activity_ideas"]))
+    if "formatted_activity_list" in data:
+        sections.append(render_formatted_activities(data["formatted_activity_list"]))
+
+    return "\n\n---\n\n".join(sections)
+
+
+def render_narrative_angles(data: Dict[str, Any]) -> str:
+    lines = ["## Narrative Angles"]
+
+    for i, angle in enumerate(data.get("narrative_angles", []), start=1):
+        lines.extend(["", f"### {i}. {_text(angle.get('title', 'Untitled angle'))}"])
+        lines.extend(_field_lines(angle, NARRATIVE_ANGLE_FIELDS))
+
+        initiative = angle.get("signature_initiative") or {}
+        if initiative:
+            lines.append(
+                f"- **Signature initiative:** {_text(initiative.get('name', ''))} — "
+                f"{_text(initiative.get('description', ''))}"
+            )
+
+    return "\n".join(lines)
+
+
+def render_main_essay_ideas(data: Dict[str, Any]) -> str:
+    lines = ["## Main Essay Ideas"]
+
+    for i, idea in enumerate(data.get("main_essay_ideas", []), start=1):
+        lines.extend(["", f"### {i}. {_text(idea.get('title', 'Untitled essay'))}"])
+        lines.extend(_field_lines(idea, MAIN_ESSAY_IDEA_FIELDS))
+
+    return "\n".join(lines)
+
+
+def render_markdown(data: Any) -> Optional[str]:
+    """Render a known agent output shape as Markdown, or return None for unknown shapes."""
+    if hasattr(data, "dict"):
+        data = data.dict()
+
+    if not isinstance(data, dict):
+        return None
+
+    # create_activity_list errors carry the run_id whose finished stages a retry resumes from
+    if "error" in data:
+        if data.get("run_id"):
+            return (
+                f"**Error:** {_text(data['error'])} "
+                f"(run_id: {data['run_id']}; send the same request again to resume from the finished stages)"
+            )
+        return f"**Error:** {_text(data['error'])}"
+    if {"activities_blueprint", "activity_ideas", "formatted_activity_list"} & set(data):
+        return render_activity_list(data)
+    if "narrative_angles" in data:
+        return render_narrative_angles(data)
+    if "main_essay_ideas" in data:
+        return render_main_essay_ideas(data)
+    if "activities" in data:
+        return render_formatted_activities(data)
+
+    categories = data.get("categories")
+    if isinstance(categories, list):
+        if "total" in data:
+            return render_activities_blueprint(data)
+        return render_activity_ideas(data)
+
+    return None
+
+
+def _humanize(key: str) -> str:
+    return str(key).replace("_", " ").strip().capitalize()
+
+
+def render_generic_markdown(data: Any, level: int = 2) -> str:
+    """Render arbitrary JSON as headings and bullet lists without changing its content."""
+    if isinstance(data, dict):
+        lines: List[str] = []
+
+        for key, value in data.items():
+            nested = isinstance(value, dict) or (
+                isinstance(value, list) and any(isinstance(v, (dict, list)) for v in value)
+            )
+
+            if nested and value:
+                lines.extend(["", f"{'#' * min(level, 6)} {_humanize(key)}", render_generic_markdown(value, level + 1)])
+            elif isinstance(value, list):
+                lines.append(f"- **{_humanize(key)}:**")
+                lines.extend(f"  - {_text(v)}" for v in value)
+            else:
+                lines.append(f"- **{_humanize(key)}:** {_text(value)}")
+
+        return "\n".join(lines).strip()
+
+    if isinstance(data, list):
+        return "\n\n".join(
+            render_generic_markdown(item, level) if isinstance(item, (dict, list)) else f"- {_text(item)}"
+            for item in data
+        )
+
+    return _text(data)
+
+
+def json_text_to_markdown(text: str) -> str:
+    """Render a tool's string output as Markdown; non-JSON text is returned unchanged."""
+    data = parse_json_output(text)
+
+    if data is None:
+        return text
+
+    rendered = render_markdown(data)
+
+    return rendered if rendered is not None else render_generic_markdown(data)
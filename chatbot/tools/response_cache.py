@@ -0,0 +1,169 @@
+"""
+Persistent, content-addressed cache for agent tool responses.
+Entries live in SQLite and are keyed on the agent, a canonical profile hash, the normalized recent messages,
+the tool's prompt version and its model settings.
+"""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from langchain_core.messages import BaseMessage
+
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), ".cache", "responses.db")
+
+CACHE_SETTINGS: Dict[str, Any] = {
+    "enabled": os.getenv("RESPONSE_CACHE_ENABLED", "1") == "1",
+    "path": os.getenv("RESPONSE_CACHE_PATH", DEFAULT_CACHE_PATH),
+    "max_entries": int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "2000")),
+    "ttl_seconds": float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", str(7 * 24 * 3600))),
+}
+
+
+def _canonical_json(value: Any) -> str:
+    return json.dumps(value, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+def profile_hash(user_profile: Optional[Dict[str, Any]]) -> str:
+    return hashlib.sha256(_canonical_json(user_profile).encode("utf-8")).hexdigest()
+
+
+def normalize_messages(recent_messages: List[BaseMessage]) -> List[List[str]]:
+    return [[msg.type, re.sub(r"\s+", " ", str(msg.content)).strip()] for msg in recent_messages]
+
+
+def history_hash(messages: List[BaseMessage]) -> str:
+    return hashlib.sha256(_canonical_json(normalize_messages(messages)).encode("utf-8")).hexdigest()
+
+
+def make_cache_key(
+    agent_name: str,
+    user_profile: Optional[Dict[str, Any]],
+    recent_messages: List[BaseMessage],
+    prompt_version: str,
+    model_settings: Dict[str, Any],
+) -> str:
+    payload = {
+        "agent": agent_name,
+        "profile": profile_hash(user_profile),
+        "messages": normalize_messages(recent_messages),
+        "prompt_version": prompt_version,
+        "model": model_settings,
+    }
+
+    return hashlib.sha256(_canonical_json(payload).encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """SQLite-backed string cache with TTL expiry and least-recently-used eviction."""
+
+    def __init__(self, path: str, max_entries: int = 2000, ttl_seconds: float = 7 * 24 * 3600):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)")
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+
+        with self._lock:
+            row = self._conn.execute("SELECT value, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+
+            if row is not None and now - row[1] > self.ttl_seconds:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                self.evictions += 1
+                row = None
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+
+            return row[0]
+
+    def set(self, key: str, value: str) -> None:
+        now = time.time()
+
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, created_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, value, now, now),
+            )
+
+            overflow = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0] - self.max_entries
+
+            if overflow > 0:
+                self._conn.execute(
+                    "DELETE FROM responses WHERE key IN "
+                    "(SELECT key FROM responses ORDER BY last_access ASC LIMIT ?)",
+                    (overflow,),
+                )
+                self.evictions += overflow
+
+            self._conn.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+        lookups = self.hits + self.misses
+
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": entries,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+_cache: Optional[ResponseCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """Return the process-wide response cache, or None when caching is disabled."""
+    global _cache
+
+    if not CACHE_SETTINGS["enabled"]:
+        return None
+
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache(
+                CACHE_SETTINGS["path"],
+                max_entries=CACHE_SETTINGS["max_entries"],
+                ttl_seconds=CACHE_SETTINGS["ttl_seconds"],
+            )
+
+        return _cache
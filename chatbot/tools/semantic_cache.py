@@ -0,0 +1,191 @@
+"""
+Semantic response cache for near-duplicate agent requests.
+Responses are stored per (agent, profile hash, prompt version, hash of the earlier turns) bucket next to the embedding
+of the latest user message; a new message reuses a response when its cosine similarity to a stored message clears the
+threshold.
+
+ada-002 similarities sit in a narrow band (unrelated requests often score above 0.8), so the threshold must be set
+from labelled data. Calibrate it on paraphrase and near-miss pairs, from the chatbot directory, with:
+
+    python -m tools.semantic_cache calibrate ../benchmarks/semantic_cache_pairs.jsonl
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from tools.llm import get_embeddings
+
+
+SEMANTIC_CACHE_SETTINGS: Dict[str, Any] = {
+    "enabled": os.getenv("SEMANTIC_CACHE_ENABLED", "1") == "1",
+    # Conservative until calibrated on your own traffic (see `calibrate`)
+    "threshold": float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.985")),
+    "max_entries_per_bucket": int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "256")),
+}
+
+# (agent, profile hash, prompt version, hash of every message before the latest one)
+BucketKey = Tuple[str, str, str, str]
+
+
+def _normalize(vector: Any) -> np.ndarray:
+    v = np.asarray(vector, dtype=np.float32)
+    norm = float(np.linalg.norm(v))
+
+    return v / norm if norm else v
+
+
+class _Bucket:
+    """Fixed-capacity ring of unit vectors and their responses; the oldest entry is overwritten when full."""
+
+    def __init__(self, dim: int, capacity: int):
+        self.vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self.responses: List[Optional[str]] = [None] * capacity
+        self.size = 0
+        self.next = 0
+
+    def add(self, vector: np.ndarray, response: str) -> None:
+        self.vectors[self.next] = vector
+        self.responses[self.next] = response
+        self.next = (self.next + 1) % len(self.responses)
+        self.size = min(self.size + 1, len(self.responses))
+
+    def top1(self, vector: np.ndarray) -> Tuple[float, Optional[str]]:
+        if self.size == 0:
+            return -1.0, None
+
+        scores = self.vectors[: self.size] @ vector
+        best = int(np.argmax(scores))
+
+        return float(scores[best]), self.responses[best]
+
+
+class SemanticCache:
+    def __init__(self, threshold: float = 0.985, max_entries_per_bucket: int = 256):
+        self.threshold = threshold
+        self.max_entries_per_bucket = max_entries_per_bucket
+        self.lookups = 0
+        self.hits = 0
+        self._buckets: Dict[BucketKey, _Bucket] = {}
+        self._lock = threading.Lock()
+
+    def embed(self, text: str) -> np.ndarray:
+        return _normalize(get_embeddings().embed_query(text))
+
+    async def aembed(self, text: str) -> np.ndarray:
+        return _normalize(await get_embeddings().aembed_query(text))
+
+    def lookup(self, bucket_key: BucketKey, vector: np.ndarray) -> Optional[str]:
+        """Return the response stored for the most similar message in the bucket, if it clears the threshold."""
+        with self._lock:
+            self.lookups += 1
+            bucket = self._buckets.get(bucket_key)
+
+            if bucket is None:
+                return None
+
+            score, response = bucket.top1(vector)
+
+            if response is None or score < self.threshold:
+                return None
+
+            self.hits += 1
+
+            return response
+
+    def store(self, bucket_key: BucketKey, vector: np.ndarray, response: str) -> None:
+        with self._lock:
+            bucket = self._buckets.get(bucket_key)
+
+            if bucket is None:
+                bucket = _Bucket(vector.shape[0], self.max_entries_per_bucket)
+                self._buckets[bucket_key] = bucket
+
+            bucket.add(vector, response)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._buckets.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = sum(bucket.size for bucket in self._buckets.values())
+
+        return {
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "hit_rate": self.hits / self.lookups if self.lookups else 0.0,
+            "buckets": len(self._buckets),
+            "entries": entries,
+        }
+
+
+_cache: Optional[SemanticCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_semantic_cache() -> Optional[SemanticCache]:
+    """Return the process-wide semantic cache, or None when it is disabled."""
+    global _cache
+
+    if not SEMANTIC_CACHE_SETTINGS["enabled"]:
+        return None
+
+    with _cache_lock:
+        if _cache is None:
+            _cache = SemanticCache(
+                threshold=SEMANTIC_CACHE_SETTINGS["threshold"],
+                max_entries_per_bucket=SEMANTIC_CACHE_SETTINGS["max_entries_per_bucket"],
+            )
+
+        return _cache
+
+
+def calibrate(pairs: List[Dict[str, Any]], margin: float = 0.002) -> Dict[str, Any]:
+    """Pick the lowest threshold that rejects every near-miss pair and report how many paraphrases it still accepts.
+
+    Each pair is {"a": text, "b": text, "same": bool}; "same" pairs are paraphrases that may share a response,
+    the others differ in something that changes the answer (a key word, a number, the task).
+    """
+    texts = list(dict.fromkeys(text for pair in pairs for text in (pair["a"], pair["b"])))
+    vectors = dict(zip(texts, (_normalize(v) for v in get_embeddings().embed_documents(texts))))
+    scored = [(float(vectors[pair["a"]] @ vectors[pair["b"]]), bool(pair["same"]), pair) for pair in pairs]
+
+    same = [score for score, is_same, _ in scored if is_same]
+    near_misses = [score for score, is_same, _ in scored if not is_same]
+    threshold = min(1.0, max(near_misses, default=0.0) + margin)
+
+    return {
+        "threshold": round(threshold, 4),
+        "paraphrase_recall": sum(score >= threshold for score in same) / len(same) if same else 0.0,
+        "paraphrase_min": round(min(same), 4) if same else None,
+        "near_miss_max": round(max(near_misses), 4) if near_misses else None,
+        "hardest_near_misses": [
+            {"score": round(score, 4), "a": pair["a"], "b": pair["b"]}
+            for score, _, pair in sorted((s for s in scored if not s[1]), key=lambda s: -s[0])[:5]
+        ],
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Calibrate the semantic cache threshold on labelled pairs.")
+    parser.add_argument("command", choices=["calibrate"])
+    parser.add_argument("pairs", help='JSONL of {"a": ..., "b": ..., "same": true|false}')
+    parser.add_argument("--margin", type=float, default=0.002, help="Added above the highest near-miss score")
+    args = parser.parse_args(argv)
+
+    with open(args.pairs, encoding="utf-8") as f:
+        pairs = [json.loads(line) for line in f if line.strip()]
+
+    print(json.dumps(calibrate(pairs, args.margin), indent=2))
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,190 @@
+"""
+Request coalescing ("single flight") for the async path.
+Concurrent calls with the same canonical key share one in-flight task: the first caller starts it, later callers wait
+for its result instead of repeating the work. Used for whole agent invocations (a double-submitted
+`@create_activity_list` runs its pipeline once) and for individual chat model calls with an identical prompt.
+"""
+
+import asyncio
+import threading
+from collections import defaultdict
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple, TypeVar
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from tools.cassette import prompt_hash
+from tools.llm import ModelKey, add_model_wrapper, remove_model_wrapper
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """Share one task per key among concurrent callers, counting how many callers waited on another's call."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.leaders = 0
+        self.coalesced = 0
+        self.max_waiters = 0
+        self._calls: Dict[str, Tuple[asyncio.AbstractEventLoop, "asyncio.Future[Any]"]] = {}
+        self._waiters: Dict[str, int] = defaultdict(int)
+        self._lock = threading.Lock()
+
+    async def do(self, key: str, factory: Callable[[], Awaitable[T]]) -> Tuple[T, bool]:
+        """Return the result of `factory()` for `key` and whether it was shared with an earlier caller.
+
+        The shared task is shielded, so a waiter that is cancelled does not cancel the call for everyone else.
+        """
+        loop = asyncio.get_running_loop()
+
+        with self._lock:
+            current = self._calls.get(key)
+            shared = current is not None and current[0] is loop
+
+            if shared:
+                call = current[1]
+                self.coalesced += 1
+                self._waiters[key] += 1
+                self.max_waiters = max(self.max_waiters, self._waiters[key])
+            else:
+                call = asyncio.ensure_future(factory())
+                self.leaders += 1
+                self._calls[key] = (loop, call)
+                call.add_done_callback(lambda done: self._forget(key, done))
+
+        try:
+            return await asyncio.shield(call), shared
+        finally:
+            if shared:
+                with self._lock:
+                    self._waiters[key] -= 1
+                    if not self._waiters[key]:
+                        del self._waiters[key]
+
+    def _forget(self, key: str, call: "asyncio.Future[Any]") -> None:
+        with self._lock:
+            if key in self._calls and self._calls[key][1] is call:
+                del self._calls[key]
+
+        if not call.cancelled():
+            # Mark the exception as retrieved when every caller has gone away
+            call.exception()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "name": self.name,
+                "in_flight": len(self._calls),
+                "waiting": sum(self._waiters.values()),
+                "leaders": self.leaders,
+                "coalesced": self.coalesced,
+                "max_waiters": self.max_waiters,
+            }
+
+
+_groups: Dict[str, SingleFlight] = {}
+_groups_lock = threading.Lock()
+
+
+def get_single_flight(name: str) -> SingleFlight:
+    with _groups_lock:
+        if name not in _groups:
+            _groups[name] = SingleFlight(name)
+
+        return _groups[name]
+
+
+def single_flight_stats() -> List[Dict[str, Any]]:
+    with _groups_lock:
+        groups = list(_groups.values())
+
+    return [group.stats() for group in groups]
+
+
+def _follower_result(result: ChatResult) -> ChatResult:
+    # Waiters report the shared response without its token usage, so metrics count the tokens once
+    generations = [
+        ChatGeneration(message=g.message.copy(update={"usage_metadata": None}), generation_info=g.generation_info)
+        for g in result.generations
+    ]
+
+    llm_output = {**(result.llm_output or {}), "token_usage": {}, "coalesced": True}
+
+    return ChatResult(generations=generations, llm_output=llm_output)
+
+
+class CoalescingChatModel(BaseChatModel):
+    """Chat model that coalesces concurrent async calls with an identical prompt into one call to the wrapped model.
+
+    Sync and streaming calls pass straight through.
+    """
+
+    inner: BaseChatModel
+    key: ModelKey
+
+    @property
+    def _llm_type(self) -> str:
+        return "coalescing"
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        return self.inner._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        if kwargs:
+            # Tool or response-format bindings are not part of the key; don't guess
+            return await self.inner._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+        result, shared = await get_single_flight("llm").do(
+            prompt_hash(self.key, messages, stop),
+            lambda: self.inner._agenerate(messages, stop=stop, run_manager=run_manager),
+        )
+
+        return _follower_result(result) if shared else result
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        yield from self.inner._stream(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        async for chunk in self.inner._astream(messages, stop=stop, run_manager=run_manager, **kwargs):
+            yield chunk
+
+
+def _wrap(model: BaseChatModel, key: ModelKey) -> BaseChatModel:
+    return CoalescingChatModel(inner=model, key=key)
+
+
+def install_llm_coalescing() -> None:
+    """Coalesce identical concurrent chat model calls made through `get_llm`."""
+    remove_model_wrapper(_wrap)
+    add_model_wrapper(_wrap)
+
+
+def uninstall_llm_coalescing() -> None:
+    remove_model_wrapper(_wrap)
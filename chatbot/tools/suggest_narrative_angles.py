@@ -3,20 +3,25 @@ Narrative angles generation tool for college application strategy.
 Generates 3-5 narrative angles based on user context.
 """
 
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterator
 from langchain_core.runnables import Runnable
-from langchain_openai import AzureChatOpenAI
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.prompts import ChatPromptTemplate
 from pydantic import BaseModel, Field
 from langchain_core.tools import tool
 
-from tools.utils import create_conversation_context, create_user_context
+from tools.grounding import agrounding_context, grounding_version
+from tools.instrumentation import metrics_config
+from tools.llm import get_llm
+from tools.utils import create_conversation_context, create_user_context, run_sync
 
 from langchain_core.messages import BaseMessage
 
 
-llm = AzureChatOpenAI(deployment_name="gpt-4o")
+LLM_SETTINGS = {"deployment_name": "gpt-4o"}
+
+# Bump whenever the prompt or output schema changes; part of the response cache key
+PROMPT_VERSION = "3" + grounding_version()
 
 
 def create_narrative_angles_prompt_template() -> ChatPromptTemplate:
@@ -58,7 +63,7 @@ def create_narrative_angles_prompt_template() -> ChatPromptTemplate:
       ]
     }}
 
-    {user_profile_context}
+    {user_profile_context}{retrieved_examples}
     """
 
     user_prompt = """{conversation_context}
@@ -80,21 +85,47 @@ class NarrativeAnglesInput(BaseModel):
     recent_messages: List[BaseMessage] = Field(..., description="Recent conversation messages")
 
 
+def _build_chain() -> Runnable:
+    prompt: ChatPromptTemplate = create_narrative_angles_prompt_template()
+
+    return prompt | get_llm(**LLM_SETTINGS) | StrOutputParser()
+
+
+def _build_inputs(user_profile: Optional[Dict[str, Any]], recent_messages: List[BaseMessage]) -> Dict[str, Any]:
+    return {
+        "conversation_context": create_conversation_context(recent_messages[:-1], "suggest_narrative_angles"),
+        "user_profile_context": create_user_context(user_profile, "suggest_narrative_angles"),
+        "user_query": recent_messages[-1].content,
+        "retrieved_examples": "",
+    }
+
+
+async def _abuild_inputs(user_profile: Optional[Dict[str, Any]], recent_messages: List[BaseMessage]) -> Dict[str, Any]:
+    inputs = _build_inputs(user_profile, recent_messages)
+    query = f"{inputs['user_profile_context']}\n{inputs['user_query']}"
+    inputs["retrieved_examples"] = await agrounding_context(user_profile, query, kind="narrative")
+
+    return inputs
+
+
 @tool("suggest_narrative_angles", args_schema=NarrativeAnglesInput, return_direct=False)
 def suggest_narrative_angles(user_profile: Optional[Dict[str, Any]], recent_messages: List[BaseMessage]) -> str:
     """Generate unique narrative angles for college application strategy based on user context."""
-    conversation_context = create_conversation_context(recent_messages[:-1])
+    return run_sync(asuggest_narrative_angles(user_profile, recent_messages))
 
-    user_profile_context = create_user_context(user_profile)
 
-    prompt: ChatPromptTemplate = create_narrative_angles_prompt_template()
+async def asuggest_narrative_angles(user_profile: Optional[Dict[str, Any]], recent_messages: List[BaseMessage]) -> str:
+    """Async variant of `suggest_narrative_angles`."""
+    inputs = await _abuild_inputs(user_profile, recent_messages)
+    return await _build_chain().ainvoke(inputs, config=metrics_config("suggest_narrative_angles", "generate"))
+
+
+suggest_narrative_angles.coroutine = asuggest_narrative_angles
 
-    chain: Runnable = prompt | llm | StrOutputParser()
 
-    return chain.invoke(
-        {
-            "conversation_context": conversation_context,
-            "user_profile_context": user_profile_context,
-            "user_query": recent_messages[-1].content,
-        }
-    )
+def stream_suggest_narrative_angles(
+    user_profile: Optional[Dict[str, Any]], recent_messages: List[BaseMessage]
+) -> Iterator[str]:
+    """Yield the narrative angles JSON as text chunks while the LLM generates it."""
+    inputs = run_sync(_abuild_inputs(user_profile, recent_messages))
+    yield from _build_chain().stream(inputs, config=metrics_config("suggest_narrative_angles", "generate"))
@@ -0,0 +1,92 @@
+"""
+Local, meaning-preserving shortening of activity-list fields.
+Rules are applied from least to most lossy and stop as soon as the text fits, so a field that is a few characters over
+its limit only loses whitespace or filler words.
+"""
+
+import re
+from typing import List, Optional, Tuple
+
+
+_FILLER: List[Tuple[re.Pattern, str]] = [
+    (re.compile(r"\bin order to\b", re.I), "to"),
+    (re.compile(r"\ba (?:wide )?(?:variety|range|number) of\b", re.I), "many"),
+    (re.compile(r"\b(?:successfully|effectively|actively|really|very|various|several)\s+", re.I), ""),
+    (re.compile(r"\b(?:which|that) (?:was|were|is|are)\s+", re.I), ""),
+    (re.compile(r"\bas well as\b", re.I), "and"),
+    (re.compile(r"\bmore than\b", re.I), "over"),
+    # Only before a number: "around 200 students" -> "~200 students", but "cleanups around the city" stays
+    (re.compile(r"\b(?:approximately|around)\s+(?=\d)", re.I), "~"),
+]
+
+# Only abbreviations an admissions reader would recognise
+_ABBREVIATIONS: List[Tuple[re.Pattern, str]] = [
+    (re.compile(r"\band\b", re.I), "&"),
+    (re.compile(r"\bwith\b", re.I), "w/"),
+    (re.compile(r"\bpercent\b", re.I), "%"),
+    (re.compile(r"\bnumber\b", re.I), "#"),
+    (re.compile(r"\binternational\b", re.I), "Int'l"),
+    (re.compile(r"\bnational\b", re.I), "Nat'l"),
+    (re.compile(r"\bgovernment\b", re.I), "Gov't"),
+    (re.compile(r"\buniversity\b", re.I), "Univ."),
+    (re.compile(r"\borgani[sz]ation\b", re.I), "Org."),
+    (re.compile(r"\bassociation\b", re.I), "Assoc."),
+    (re.compile(r"\bdepartment\b", re.I), "Dept."),
+    (re.compile(r"\bmanagement\b", re.I), "mgmt"),
+    (re.compile(r"\bincluding\b", re.I), "incl."),
+    (re.compile(r"\bhours\b", re.I), "hrs"),
+    (re.compile(r"(?<=\d)\s*thousand\b", re.I), "K"),
+]
+
+_ARTICLES = re.compile(r"\b(?:the|a|an)\s+", re.I)
+
+
+def _squeeze(text: str) -> str:
+    text = re.sub(r"\s+", " ", text).strip()
+    return re.sub(r"\s+([,;:.!?%])", r"\1", text)
+
+
+def _apply(text: str, rules: List[Tuple[re.Pattern, str]], limit: int) -> str:
+    for pattern, replacement in rules:
+        if len(text) <= limit:
+            break
+        text = _squeeze(pattern.sub(replacement, text))
+
+    return text
+
+
+def _compress(text: str, limit: int) -> str:
+    text = re.sub(r"\s+", " ", text).strip()
+
+    if len(text) <= limit:
+        return text
+
+    text = _apply(text, _FILLER, limit)
+    text = _apply(text, _ABBREVIATIONS, limit)
+
+    if len(text) > limit:
+        text = _squeeze(_ARTICLES.sub("", text))
+
+    return text
+
+
+def compress_to_limit(text: str, limit: int) -> Optional[str]:
+    """Shorten `text` to at most `limit` characters without cutting content, or return None if that is impossible."""
+    text = _compress(text, limit)
+
+    return text if len(text) <= limit else None
+
+
+def truncate_to_limit(text: str, limit: int) -> str:
+    """Last resort: compress, then cut at the last word boundary that fits."""
+    text = _compress(text, limit)
+
+    if len(text) <= limit:
+        return text
+
+    cut = text[:limit]
+
+    if " " in cut:
+        cut = cut[: cut.rfind(" ")]
+
+    return cut.rstrip(" ,;:&-")
@@ -1,18 +1,77 @@
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, AsyncIterator, Awaitable, Iterator, Tuple, TypeVar
+import asyncio
+import contextvars
 import json
+import threading
 from langchain_core.messages import BaseMessage
 
-
-def create_conversation_context(recent_messages: List[BaseMessage]) -> str:
+from tools.context import CONTEXT_TOKEN_BUDGETS, DEFAULT_CONTEXT_TOKEN_BUDGET, budget_conversation
+
+T = TypeVar("T")
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+_IDENTITY_FIELDS = (
+    "student_profile.name",
+    "student_profile.gender",
+    "student_profile.birth_country",
+    "student_profile.cultural_background",
+    "student_profile.languages",
+    "student_profile.socioeconomic_indicators",
+    "student_profile.geographic_context.birth_place",
+)
+
+_GOAL_FIELDS = (
+    "academic_profile.future_plans",
+    "university_specific_questions.top_academic_majors_interest",
+)
+
+# Profile sections each tool needs in its prompt, as dotted paths. Tools not listed receive the whole profile.
+PROFILE_PROJECTIONS: Dict[str, Tuple[str, ...]] = {
+    "format_activity_list": ("activity_profile.activities", "academic_profile.future_plans"),
+    "create_activities_blueprint": (*_GOAL_FIELDS, "academic_profile.Honors", "activity_profile"),
+    "create_activity_ideas": (
+        *_IDENTITY_FIELDS,
+        *_GOAL_FIELDS,
+        "academic_profile.Honors",
+        "activity_profile",
+        "personal_statement.essay_analysis",
+    ),
+    "create_future_plan": (
+        *_IDENTITY_FIELDS,
+        *_GOAL_FIELDS,
+        "academic_profile.Honors",
+        "activity_profile.activities",
+        "personal_statement.essay_analysis",
+    ),
+    "suggest_narrative_angles": (
+        *_IDENTITY_FIELDS,
+        *_GOAL_FIELDS,
+        "academic_profile",
+        "activity_profile.activities",
+        "personal_statement",
+    ),
+    "generate_main_essay_ideas": (
+        *_IDENTITY_FIELDS,
+        *_GOAL_FIELDS,
+        "academic_profile.Honors",
+        "activity_profile.activities",
+        "personal_statement",
+    ),
+}
+
+
+def create_conversation_context(recent_messages: List[BaseMessage], tool_name: Optional[str] = None) -> str:
     conversation_context = ""
 
     if recent_messages and len(recent_messages) > 0:
         conversation_context = "RECENT CONVERSATION CONTEXT:\n"
 
-        for msg in recent_messages:
-            role = "User" if hasattr(msg, "type") and msg.type == "human" else "Assistant"
+        token_budget = CONTEXT_TOKEN_BUDGETS.get(tool_name, DEFAULT_CONTEXT_TOKEN_BUDGET)
 
-            conversation_context += f"{role}: {msg.content}\n"
+        for line in budget_conversation(recent_messages, token_budget):
+            conversation_context += f"{line}\n"
 
         conversation_context += (
             "\n\nEXTRACT ANY IMPORTANT INFORMATION FROM THE CONVERSATION THAT IS RELEVANT TO THE CURRENT TASK.\n\n"
@@ -21,11 +80,66 @@ def create_conversation_context(recent_messages: List[BaseMessage]) -> str:
     return conversation_context
 
 
-def create_user_context(user_profile: Optional[Dict[str, Any]]) -> str:
+def project_profile(user_profile: Dict[str, Any], paths: Tuple[str, ...]) -> Dict[str, Any]:
+    """Copy only the given dotted paths of the profile, keeping their nesting."""
+    projected: Dict[str, Any] = {}
+
+    for path in paths:
+        keys = path.split(".")
+        value: Any = user_profile
+
+        for key in keys:
+            if not isinstance(value, dict) or key not in value:
+                break
+            value = value[key]
+        else:
+            target = projected
+            for key in keys[:-1]:
+                target = target.setdefault(key, {})
+            target[keys[-1]] = value
+
+    return projected
+
+
+def strip_empty(value: Any) -> Any:
+    """Recursively drop None, empty strings and empty containers."""
+    if isinstance(value, dict):
+        cleaned = {k: strip_empty(v) for k, v in value.items()}
+        return {k: v for k, v in cleaned.items() if v not in (None, "", [], {})}
+
+    if isinstance(value, list):
+        cleaned_items = [strip_empty(v) for v in value]
+        return [v for v in cleaned_items if v not in (None, "", [], {})]
+
+    return value
+
+
+def compact_json(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+def prompt_json(value: Any) -> str:
+    """Serialize structured stage output (a Pydantic model or plain data) for a prompt; text is passed through."""
+    if value is None:
+        return ""
+
+    if isinstance(value, str):
+        return value
+
+    if hasattr(value, "dict"):
+        value = value.dict()
+
+    return compact_json(strip_empty(value))
+
+
+def create_user_context(user_profile: Optional[Dict[str, Any]], tool_name: Optional[str] = None) -> str:
     user_profile_context = ""
 
     if user_profile is not None:
-        user_profile_context = f"\nSTUDENT PROFILE & CONTEXT: {json.dumps(user_profile, ensure_ascii=False)}"
+        if tool_name in PROFILE_PROJECTIONS:
+            user_profile = project_profile(user_profile, PROFILE_PROJECTIONS[tool_name])
+
+        user_profile_context = f"\nSTUDENT PROFILE & CONTEXT: {compact_json(strip_empty(user_profile))}"
 
     return user_profile_context
 
@@ -48,3 +162,62 @@ def _strip_fences_and_labels(s: str) -> str:
         s = s[5:]
 
     return s.strip()
+
+
+def _background_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="chatbot-async", daemon=True).start()
+
+    return _loop
+
+
+async def _in_context(awaitable: Awaitable[T], context: contextvars.Context) -> T:
+    # Tasks on the background loop start from that thread's context; carry the caller's values over.
+    # Also turns the awaitables of async generators into the coroutine run_coroutine_threadsafe requires.
+    for var, value in context.items():
+        var.set(value)
+
+    return await awaitable
+
+
+def on_background_loop() -> bool:
+    """True when called on the shared background loop, e.g. from sync code inside one of its coroutines."""
+    try:
+        return asyncio.get_running_loop() is _loop
+    except RuntimeError:
+        return False
+
+
+def run_sync(coro: Awaitable[T]) -> T:
+    """Run a coroutine to completion from synchronous code.
+
+    All sync wrappers share one long-lived background event loop, so async HTTP connections are reused across
+    calls and the wrappers also work when the caller already has a running loop. The caller's context variables
+    (e.g. the instrumentation agent label) are visible inside the coroutine. Raises RuntimeError when called on the
+    background loop itself, which would otherwise block waiting on itself.
+    """
+    if on_background_loop():
+        if asyncio.iscoroutine(coro):
+            coro.close()
+        raise RuntimeError("run_sync called on the shared background loop; await the coroutine instead")
+
+    return asyncio.run_coroutine_threadsafe(_in_context(coro, contextvars.copy_context()), _background_loop()).result()
+
+
+def iterate_sync(agen: AsyncIterator[T]) -> Iterator[T]:
+    """Consume an async generator from synchronous code on the shared background loop.
+
+    Closing the returned iterator early (e.g. a consumer aborting the request) also closes the async generator.
+    """
+    try:
+        while True:
+            try:
+                yield run_sync(agen.__anext__())
+            except StopAsyncIteration:
+                return
+    finally:
+        run_sync(agen.aclose())
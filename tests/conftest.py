@@ -0,0 +1,26 @@
+import os
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Keep tests off the on-disk caches, the metrics file and client-side throttling
+os.environ["RESPONSE_CACHE_ENABLED"] = "0"
+os.environ["PIPELINE_CHECKPOINTS_ENABLED"] = "0"
+os.environ["LLM_METRICS_PATH"] = ""
+os.environ["LLM_RATE_LIMIT_ENABLED"] = "0"
+os.environ["LLM_COALESCING_ENABLED"] = "0"
+
+sys.path.insert(0, os.path.join(REPO_ROOT, "chatbot"))
+sys.path.insert(0, os.path.join(REPO_ROOT, "benchmarks"))
+
+import pytest  # noqa: E402
+
+from fake_llm import LatencyModel, fake_model_factory  # noqa: E402
+from tools.llm import set_model_factory  # noqa: E402
+
+
+@pytest.fixture
+def fake_llm():
+    set_model_factory(fake_model_factory(LatencyModel(ttft_ms=0, per_token_ms=0, distribution="fixed")))
+    yield
+    set_model_factory(None)
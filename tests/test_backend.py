@@ -0,0 +1,40 @@
+import numpy as np
+from langchain_core.messages import HumanMessage
+
+import backend
+from tools import semantic_cache
+from tools.semantic_cache import SemanticCache
+from tools.utils import run_sync
+from user_data import DUMMY_USER_DATA
+
+PARAPHRASES = {
+    "Suggest narrative angles for my application": [1.0, 0.0],
+    "Can you suggest some narrative angles for my application?": [1.0, 0.001],
+}
+
+
+def _frontend_history(query):
+    # frontend.py puts the query in the chat history and then appends it again
+    return [HumanMessage(content=query), HumanMessage(content=query)]
+
+
+def test_paraphrase_hits_semantic_cache_with_frontend_history(fake_llm, monkeypatch):
+    cache = SemanticCache(threshold=0.99)
+    monkeypatch.setattr(semantic_cache, "_cache", cache)
+
+    async def aembed(text):
+        return semantic_cache._normalize(np.array(PARAPHRASES[text]))
+
+    monkeypatch.setattr(cache, "aembed", aembed)
+
+    first, second = PARAPHRASES
+    original = run_sync(
+        backend.ainvoke_agent_tool("suggest_narrative_angles", _frontend_history(first), DUMMY_USER_DATA)
+    )
+    reused = run_sync(
+        backend.ainvoke_agent_tool("suggest_narrative_angles", _frontend_history(second), DUMMY_USER_DATA)
+    )
+
+    assert not original.startswith("Error")
+    assert reused == original
+    assert cache.stats()["hits"] == 1
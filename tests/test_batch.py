@@ -0,0 +1,45 @@
+import json
+
+from langchain_core.messages import HumanMessage
+
+import backend
+from batch import DEFAULT_QUERIES, run_batch
+from tools.response_cache import ResponseCache
+
+AGENT = "suggest_narrative_angles"
+PROFILE = {"student_profile": {"name": "Test Student"}}
+
+
+def _records(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_response_starting_with_error_text_is_recorded_ok(tmp_path, monkeypatch):
+    cache = ResponseCache(str(tmp_path / "responses.sqlite"))
+    messages = [HumanMessage(content=DEFAULT_QUERIES[AGENT])]
+    cache.set(backend._agent_cache_key(AGENT, messages, PROFILE), "Error calling home: a story about family")
+    monkeypatch.setattr(backend, "get_response_cache", lambda: cache)
+    monkeypatch.setattr(backend, "get_semantic_cache", lambda: None)
+
+    output = tmp_path / "batch.jsonl"
+    summary = run_batch([("p1", PROFILE)], [AGENT], str(output), progress=False)
+
+    assert summary["ok"] == 1
+    assert _records(output)[0]["result"] == "Error calling home: a story about family"
+
+
+def test_failing_agent_is_recorded_with_its_error(tmp_path, monkeypatch):
+    def fail(*args, **kwargs):
+        raise RuntimeError("model unavailable")
+
+    monkeypatch.setattr(backend, "get_semantic_cache", lambda: None)
+    monkeypatch.setattr(backend.AGENT_TOOLS[AGENT], "coroutine", fail)
+
+    output = tmp_path / "batch.jsonl"
+    summary = run_batch([("p1", PROFILE)], [AGENT], str(output), progress=False)
+    record = _records(output)[0]
+
+    assert summary["failed"] == 1
+    assert not record["ok"]
+    assert "model unavailable" in record["error"]
@@ -0,0 +1,35 @@
+from fake_llm import FakeChatModel, LatencyModel
+from langchain_core.messages import AIMessageChunk, HumanMessage
+from langchain_core.outputs import ChatGenerationChunk
+
+from tools.cassette import Cassette, CassetteChatModel
+
+KEY = ("fake", None, None)
+MESSAGES = [HumanMessage(content="Suggest narrative angles for my application")]
+
+
+class UsageReportingChatModel(FakeChatModel):
+    """Streams like FakeChatModel, then reports usage in a final empty chunk as Azure OpenAI does."""
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        yield from super()._stream(messages, stop, run_manager, **kwargs)
+        usage = {"input_tokens": 30, "output_tokens": 12, "total_tokens": 42}
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=usage))
+
+
+def _collect(model):
+    message = None
+    for chunk in model.stream(MESSAGES):
+        message = chunk if message is None else message + chunk
+    return message
+
+
+def test_streamed_recording_keeps_usage_for_replay(tmp_path):
+    path = str(tmp_path / "cassette.jsonl.gz")
+    live = UsageReportingChatModel(latency=LatencyModel(ttft_ms=0, per_token_ms=0, distribution="fixed"))
+
+    recorded = _collect(CassetteChatModel(inner=live, cassette=Cassette(path), key=KEY, mode="record"))
+    replayed = _collect(CassetteChatModel(cassette=Cassette(path), key=KEY, mode="replay"))
+
+    assert replayed.content == recorded.content
+    assert replayed.usage_metadata == {"input_tokens": 30, "output_tokens": 12, "total_tokens": 42}
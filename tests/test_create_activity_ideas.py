@@ -0,0 +1,42 @@
+import asyncio
+import time
+
+import pytest
+from langchain_core.messages import HumanMessage
+
+from tools import utils
+from tools.blueprint_engine import compute_blueprint
+from tools.create_activities_blueprint import ActivitiesBlueprintOutput
+from tools.create_activity_ideas import generate_activity_ideas
+from user_data import DUMMY_USER_DATA
+
+
+def test_sync_call_on_background_loop_raises_without_blocking_it(fake_llm):
+    blueprint = ActivitiesBlueprintOutput(**compute_blueprint(DUMMY_USER_DATA))
+    loop = utils._background_loop()
+    ticks = []
+
+    async def heartbeat():
+        while True:
+            ticks.append(time.monotonic())
+            await asyncio.sleep(0.01)
+
+    async def call_sync():
+        # A sync tool call made from a coroutine that already runs on the shared loop
+        return generate_activity_ideas(
+            DUMMY_USER_DATA, [HumanMessage(content="Suggest activity ideas")], blueprint, fan_out=True
+        )
+
+    beating = asyncio.run_coroutine_threadsafe(heartbeat(), loop)
+
+    try:
+        with pytest.raises(RuntimeError, match="background loop"):
+            asyncio.run_coroutine_threadsafe(call_sync(), loop).result(timeout=10)
+
+        # The loop keeps serving other coroutines afterwards
+        seen = len(ticks)
+        time.sleep(0.1)
+        assert len(ticks) > seen
+        assert max(b - a for a, b in zip(ticks, ticks[1:])) < 1
+    finally:
+        beating.cancel()
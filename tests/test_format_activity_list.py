@@ -0,0 +1,32 @@
+import json
+
+from fake_llm import FakeChatModel, LatencyModel, canned_output
+from langchain_core.messages import HumanMessage
+
+from tools.format_activity_list import stream_format_activity_list
+from tools.llm import set_model_factory
+from user_data import DUMMY_USER_DATA
+
+
+class MalformedOnceChatModel(FakeChatModel):
+    """Answers the first call with prose instead of JSON and every later one with formatted activities."""
+
+    def _prepare(self, messages, run_manager):
+        _, first, per_token, prompt_tokens = super()._prepare(messages, run_manager)
+
+        # Streaming calls get no run manager, so the tool label cannot pick the canned output here
+        text = "Sorry, here are the activities." if self.calls == 1 else canned_output("format_activity_list")
+
+        return text, first, per_token, prompt_tokens
+
+
+def test_stream_regenerates_a_malformed_completion():
+    latency = LatencyModel(ttft_ms=0, per_token_ms=0, distribution="fixed")
+    set_model_factory(lambda deployment_name, temperature, max_tokens: MalformedOnceChatModel(latency=latency))
+
+    try:
+        chunks = list(stream_format_activity_list(DUMMY_USER_DATA, [HumanMessage(content="Format my activities")]))
+    finally:
+        set_model_factory(None)
+
+    assert json.loads("".join(chunks))["activities"]
@@ -0,0 +1,33 @@
+from langchain_core.messages import HumanMessage
+
+from tools import application_index, chunk_index, grounding
+from tools.suggest_narrative_angles import _abuild_inputs, create_narrative_angles_prompt_template
+from tools.utils import run_sync
+from user_data import DUMMY_USER_DATA
+
+MESSAGES = [HumanMessage(content="Suggest narrative angles for my application")]
+
+
+async def _similar_applications(user_profile, k=None, college=None):
+    return [{"filename": "harvard_1.json", "college": "Harvard University", "score": 0.9}]
+
+
+async def _relevant_chunks(query, kind=None, k=None, **filters):
+    assert kind == "narrative"
+    return [{"college": "Harvard University", "title": "Application narrative", "text": "Tidepools  taught\nme."}]
+
+
+def test_narrative_angles_prompt_is_grounded_when_enabled(monkeypatch):
+    monkeypatch.setitem(grounding.GROUNDING_SETTINGS, "enabled", True)
+    monkeypatch.setattr(application_index, "asimilar_applications", _similar_applications)
+    monkeypatch.setattr(chunk_index, "arelevant_chunks", _relevant_chunks)
+
+    inputs = run_sync(_abuild_inputs(DUMMY_USER_DATA, MESSAGES))
+    prompt = create_narrative_angles_prompt_template().format(**inputs)
+
+    assert "Most similar admitted applicants: Harvard University" in prompt
+    assert "- Harvard University, Application narrative: Tidepools taught me." in prompt
+
+
+def test_grounding_is_off_by_default():
+    assert run_sync(_abuild_inputs(DUMMY_USER_DATA, MESSAGES))["retrieved_examples"] == ""
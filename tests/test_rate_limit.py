@@ -0,0 +1,47 @@
+import asyncio
+
+from fake_llm import FakeChatModel, LatencyModel
+from langchain_core.messages import AIMessageChunk, HumanMessage
+from langchain_core.outputs import ChatGenerationChunk
+
+from tools.rate_limit import DeploymentLimiter, RateLimitedChatModel, estimate_tokens
+
+LATENCY = LatencyModel(ttft_ms=0, per_token_ms=0, distribution="fixed")
+KEY = ("fake", None, 500)
+PROMPT = "Suggest narrative angles for my application"
+
+
+class UsageReportingChatModel(FakeChatModel):
+    """Streams like FakeChatModel, then reports usage in a final empty chunk as Azure OpenAI does."""
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        yield from super()._stream(messages, stop, run_manager, **kwargs)
+        usage = {"input_tokens": 30, "output_tokens": 12, "total_tokens": 42}
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=usage))
+
+
+def _limited(inner, monkeypatch):
+    limiter = DeploymentLimiter("fake", tpm=60_000)
+    reconciled = []
+    monkeypatch.setattr(limiter, "reconcile", lambda estimated, actual: reconciled.append((estimated, actual)))
+
+    return RateLimitedChatModel(inner=inner, limiter=limiter, key=KEY), reconciled
+
+
+def test_stream_reconciles_reported_usage(monkeypatch):
+    model, reconciled = _limited(UsageReportingChatModel(latency=LATENCY), monkeypatch)
+
+    list(model.stream([HumanMessage(content=PROMPT)]))
+
+    assert reconciled == [(estimate_tokens([HumanMessage(content=PROMPT)], KEY[2]), 42)]
+
+
+def test_astream_without_usage_reconciles_streamed_text(monkeypatch):
+    model, reconciled = _limited(FakeChatModel(latency=LATENCY), monkeypatch)
+
+    async def collect():
+        return "".join([chunk.content async for chunk in model.astream([HumanMessage(content=PROMPT)])])
+
+    text = asyncio.run(collect())
+
+    assert reconciled == [(estimate_tokens([HumanMessage(content=PROMPT)], KEY[2]), len(PROMPT) // 4 + len(text) // 4)]